@@ -0,0 +1,203 @@
+"""
+Account directory for SecureBank Pro
+An in-memory index of every account number, so existence checks (transfer
+destinations, collision checks when generating new numbers) rarely need
+SQLite. Standard ACC######### numbers are kept as integers in a sorted
+array, anything else in a small set, and a Bloom filter in front rejects
+most unknown numbers without even a binary search. The directory is built
+from `accounts` at startup, updated on create, and is authoritative: before
+reporting a miss it catches up on rows added to `accounts` since it last
+looked, by any writer or process, with one range query past a rowid
+watermark (accounts are never deleted, so rowids only grow).
+"""
+
+import bisect
+import hashlib
+import math
+import sqlite3
+import sys
+import threading
+from array import array
+
+_directories = {}
+_directories_lock = threading.Lock()
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter using double hashing over one blake2b digest"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(capacity, 1024)
+        self.error_rate = error_rate
+        self.size = int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class AccountDirectory:
+    """Sorted integer index plus Bloom filter over all account numbers"""
+
+    def __init__(self, db_path="bank_system.db", error_rate=0.01):
+        self.db_path = db_path
+        self.error_rate = error_rate
+        self.numbers = array("q")
+        self.other_numbers = set()
+        self.bloom = BloomFilter(0, error_rate)
+        self.last_rowid = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _as_int(account_number):
+        """Numeric part of an ACC######### number, or None for any other format"""
+        if len(account_number) == 12 and account_number.startswith("ACC") and account_number[3:].isdigit():
+            return int(account_number[3:])
+        return None
+
+    def __len__(self):
+        return len(self.numbers) + len(self.other_numbers)
+
+    def load(self):
+        """Build the directory from the accounts table"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            rows = conn.execute("SELECT rowid, account_number FROM accounts").fetchall()
+        finally:
+            conn.close()
+        self.build([account_number for _, account_number in rows], max((rowid for rowid, _ in rows), default=0))
+
+    def build(self, account_numbers, last_rowid=0):
+        """Replace the directory contents with the given account numbers"""
+        numbers = array("q")
+        other_numbers = set()
+        bloom = BloomFilter(len(account_numbers) * 2, self.error_rate)
+        for account_number in account_numbers:
+            value = self._as_int(account_number)
+            if value is None:
+                other_numbers.add(account_number)
+            else:
+                numbers.append(value)
+            bloom.add(account_number)
+        numbers = array("q", sorted(numbers))
+
+        with self._lock:
+            self.numbers, self.other_numbers, self.bloom = numbers, other_numbers, bloom
+            self.last_rowid = last_rowid
+
+    def add(self, account_number):
+        with self._lock:
+            self._add(account_number)
+
+    def _add(self, account_number):
+        value = self._as_int(account_number)
+        if value is None:
+            self.other_numbers.add(account_number)
+        else:
+            index = bisect.bisect_left(self.numbers, value)
+            if index == len(self.numbers) or self.numbers[index] != value:
+                self.numbers.insert(index, value)
+        if len(self) > self.bloom.capacity:
+            # Past capacity the false positive rate climbs, so start a bigger filter
+            self._rebuild_bloom()
+        else:
+            self.bloom.add(account_number)
+
+    def _rebuild_bloom(self):
+        bloom = BloomFilter(len(self) * 2, self.error_rate)
+        for value in self.numbers:
+            bloom.add(f"ACC{value:09d}")
+        for account_number in self.other_numbers:
+            bloom.add(account_number)
+        self.bloom = bloom
+
+    def _lookup(self, account_number):
+        if account_number not in self.bloom:
+            return False
+        value = self._as_int(account_number)
+        if value is None:
+            return account_number in self.other_numbers
+        index = bisect.bisect_left(self.numbers, value)
+        return index < len(self.numbers) and self.numbers[index] == value
+
+    def catch_up(self):
+        """Add accounts inserted since the last load or catch-up; returns how many were found"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            rows = conn.execute(
+                "SELECT rowid, account_number FROM accounts WHERE rowid > ? ORDER BY rowid", (self.last_rowid,)
+            ).fetchall()
+        finally:
+            conn.close()
+
+        with self._lock:
+            for rowid, account_number in rows:
+                self._add(account_number)
+                self.last_rowid = max(self.last_rowid, rowid)
+        return len(rows)
+
+    def contains(self, account_number, verify_misses=True):
+        """True if the account exists; a miss costs one catch-up query, skipped if verify_misses is False"""
+        with self._lock:
+            if self._lookup(account_number):
+                return True
+        if not verify_misses or not self.catch_up():
+            return False
+        with self._lock:
+            return self._lookup(account_number)
+
+    def memory_bytes(self):
+        """Approximate memory held by the index, the overflow set and the filter"""
+        other = sys.getsizeof(self.other_numbers) + sum(sys.getsizeof(n) for n in self.other_numbers)
+        return {
+            "sorted_index": self.numbers.buffer_info()[1] * self.numbers.itemsize,
+            "other_numbers": other,
+            "bloom_filter": len(self.bloom.bits),
+        }
+
+    def memory_per_million(self):
+        """Bytes per million accounts at the current size"""
+        total = sum(self.memory_bytes().values())
+        return total / max(len(self), 1) * 1_000_000
+
+
+def get_account_directory(db_path="bank_system.db"):
+    """Process-wide directory for a database, loaded on first use"""
+    with _directories_lock:
+        directory = _directories.get(db_path)
+        if directory is None:
+            directory = AccountDirectory(db_path)
+            directory.load()
+            _directories[db_path] = directory
+        return directory
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    directory = AccountDirectory()
+    count = 1_000_000
+    account_numbers = [f"ACC{value}" for value in random.sample(range(100000000, 1000000000), count)]
+    started = time.perf_counter()
+    directory.build(account_numbers)
+    print(f"Built directory of {count:,} accounts in {time.perf_counter() - started:.1f}s")
+    print(f"Memory: {directory.memory_bytes()} ({directory.memory_per_million() / 1024 ** 2:.1f} MB per million accounts)")
+
+    probes = [f"ACC{random.randint(100000000, 999999999)}" for _ in range(100000)]
+    started = time.perf_counter()
+    for probe in probes:
+        directory.contains(probe, verify_misses=False)
+    elapsed = time.perf_counter() - started
+    print(f"{len(probes):,} lookups in {elapsed:.2f}s ({elapsed / len(probes) * 1e6:.1f} µs each)")
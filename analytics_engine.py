@@ -0,0 +1,232 @@
+"""
+Columnar analytics for SecureBank Pro
+Copies the `transactions` table into Parquet files (only rows added since
+the last sync) and answers the analytics page's trend, type breakdown and
+monthly income/spending questions with DuckDB over those files, instead of
+looping over rows in Python. New rows are read from the replica snapshot
+when one is attached, so rendering analytics does not open the primary.
+Several processes (Streamlit workers, batch jobs) may share one store: a
+sync holds a lock file for the whole store, and queries run side by side
+on the part files that exist when they start, with only compaction, which
+deletes parts, waiting for them to finish. The locks are SQLite's own file
+locks on two small lock databases, so they hold across processes. The app
+falls back to its pandas code path when duckdb/pyarrow are not installed.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+try:
+    import duckdb
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    ANALYTICS_AVAILABLE = True
+except ImportError:
+    ANALYTICS_AVAILABLE = False
+
+INCOME_TYPES = ("deposit", "transfer_in")
+SPENDING_TYPES = ("withdrawal", "transfer_out")
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+class FileLock:
+    """Many readers or one writer across processes, using SQLite's locking on a lock database
+
+    Readers hold a shared lock through a read transaction; a writer takes an
+    exclusive one, which waits for readers to finish and holds off new ones.
+    """
+
+    def __init__(self, path, timeout=300.0):
+        self.path = path
+        self.timeout = timeout
+
+    @contextmanager
+    def _transaction(self, begin, read=False):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        try:
+            conn.execute(begin)
+            if read:
+                # A deferred transaction only takes its shared lock on the first read
+                conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            yield
+        finally:
+            conn.rollback()
+            conn.close()
+
+    def reading(self):
+        return self._transaction("BEGIN", read=True)
+
+    def writing(self):
+        return self._transaction("BEGIN EXCLUSIVE")
+
+
+class ColumnarAnalytics:
+    """Incremental Parquet copy of the ledger queried with DuckDB"""
+
+    def __init__(self, db_path="bank_system.db", store_dir=None, batch_size=200000, max_parts=32, replica=None):
+        self.db_path = db_path
+        self.replica = replica
+        self.store_dir = store_dir or f"{os.path.splitext(db_path)[0]}_analytics"
+        self.batch_size = batch_size
+        self.max_parts = max_parts
+        self.watermark_path = os.path.join(self.store_dir, "watermark.json")
+        os.makedirs(self.store_dir, exist_ok=True)
+        # One sync (and compaction) at a time, in any process
+        self._sync_lock = FileLock(os.path.join(self.store_dir, "sync.lock"))
+        # Queries read part files under the shared side; deleting parts takes the exclusive side
+        self._parts_lock = FileLock(os.path.join(self.store_dir, "parts.lock"))
+
+    def _read_watermark(self):
+        if not os.path.exists(self.watermark_path):
+            return 0
+        with open(self.watermark_path, encoding="utf-8") as f:
+            return json.load(f)["last_id"]
+
+    def _write_watermark(self, last_id):
+        temp_path = f"{self.watermark_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"last_id": last_id}, f)
+        os.replace(temp_path, self.watermark_path)
+
+    def sync(self):
+        """Append ledger rows newer than the watermark as new Parquet parts"""
+        with self._sync_lock.writing():
+            last_id = self._read_watermark()
+            # The snapshot may be behind the primary; rows it lacks are picked up by a later sync
+            conn = self.replica.connect() if self.replica else sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, account_number, transaction_type, amount, balance_after, description, timestamp
+                FROM transactions WHERE id > ? ORDER BY id
+            ''', (last_id,))
+
+            synced = 0
+            try:
+                while True:
+                    rows = cursor.fetchmany(self.batch_size)
+                    if not rows:
+                        break
+                    ids, accounts, types, amounts, balances, descriptions, timestamps = zip(*rows)
+                    table = pa.table({
+                        "id": pa.array(ids, pa.int64()),
+                        "account_number": pa.array(accounts, pa.string()),
+                        "transaction_type": pa.array(types, pa.string()),
+                        "amount": pa.array(amounts, pa.float64()),
+                        "balance_after": pa.array(balances, pa.float64()),
+                        "description": pa.array(descriptions, pa.string()),
+                        "timestamp": pa.array([str(t) for t in timestamps], pa.string()).cast(pa.timestamp("us")),
+                    })
+                    path = os.path.join(self.store_dir, f"part-{ids[0]:012d}-{ids[-1]:012d}.parquet")
+                    # Renamed into place, so a query never lists a half-written part
+                    pq.write_table(table, f"{path}.tmp")
+                    os.replace(f"{path}.tmp", path)
+                    # Only move the watermark once the part is on disk
+                    self._write_watermark(ids[-1])
+                    synced += len(rows)
+            finally:
+                conn.close()
+
+            if len(self._parts()) > self.max_parts:
+                self._compact()
+            return synced
+
+    def _parts(self):
+        return sorted(name for name in os.listdir(self.store_dir) if name.endswith(".parquet"))
+
+    def _compact(self):
+        """Merge all parts into one file so frequent small syncs do not slow queries down"""
+        parts = self._parts()
+        first_id = parts[0].split("-")[1]
+        last_id = parts[-1].split("-")[2].split(".")[0]
+        # Parts are never modified, so merging them does not get in the way of queries
+        merged = pq.read_table([os.path.join(self.store_dir, name) for name in parts])
+        temp_path = os.path.join(self.store_dir, "compacting.tmp")
+        pq.write_table(merged, temp_path)
+        with self._parts_lock.writing():
+            for name in parts:
+                os.remove(os.path.join(self.store_dir, name))
+            os.replace(temp_path, os.path.join(self.store_dir, f"part-{first_id}-{last_id}.parquet"))
+
+    def _query(self, sql, params):
+        with self._parts_lock.reading():
+            parts = self._parts()
+            if not parts:
+                return None
+            # The parts listed now; a sync adding parts meanwhile does not change this query's input
+            sources = ", ".join(
+                "'" + os.path.join(self.store_dir, name).replace("\\", "/").replace("'", "''") + "'"
+                for name in parts
+            )
+            conn = duckdb.connect()
+            try:
+                conn.execute(f"CREATE VIEW ledger AS SELECT * FROM read_parquet([{sources}])")
+                return conn.execute(sql, params).df()
+            finally:
+                conn.close()
+
+    def _account_filter(self, account_numbers, since=None):
+        condition = f"account_number IN ({','.join('?' * len(account_numbers))})"
+        params = list(account_numbers)
+        if since is not None:
+            condition += " AND timestamp >= ?"
+            params.append(since)
+        return condition, params
+
+    def daily_volume(self, account_numbers, since=None):
+        """Total amount moved per day"""
+        condition, params = self._account_filter(account_numbers, since)
+        return self._query(f'''
+            SELECT CAST(timestamp AS DATE) AS "Date", SUM(amount) AS "Amount"
+            FROM ledger WHERE {condition}
+            GROUP BY 1 ORDER BY 1
+        ''', params)
+
+    def type_breakdown(self, account_numbers, since=None):
+        """Count and total per transaction type"""
+        condition, params = self._account_filter(account_numbers, since)
+        return self._query(f'''
+            SELECT transaction_type AS "Transaction Type", COUNT(*) AS "Count", SUM(amount) AS "Total Amount"
+            FROM ledger WHERE {condition}
+            GROUP BY 1 ORDER BY 1
+        ''', params)
+
+    def balance_history(self, account_number, since=None):
+        """Balance after every transaction on one account"""
+        condition, params = self._account_filter([account_number], since)
+        return self._query(f'''
+            SELECT timestamp AS "Time", balance_after AS "Balance"
+            FROM ledger WHERE {condition}
+            ORDER BY timestamp, id
+        ''', params)
+
+    def monthly_flows(self, account_numbers):
+        """Income and spending per calendar month"""
+        condition, params = self._account_filter(account_numbers)
+        return self._query(f'''
+            SELECT date_trunc('month', timestamp) AS "Month",
+                   SUM(CASE WHEN transaction_type IN {INCOME_TYPES} THEN amount ELSE 0 END) AS "Income",
+                   SUM(CASE WHEN transaction_type IN {SPENDING_TYPES} THEN amount ELSE 0 END) AS "Spending"
+            FROM ledger WHERE {condition}
+            GROUP BY 1 ORDER BY 1
+        ''', params)
+
+
+def get_analytics_engine(db_path="bank_system.db", replica=None):
+    """Process-wide analytics engine, or None when duckdb/pyarrow are missing
+
+    With a replica, syncs read new ledger rows from its snapshot.
+    """
+    if not ANALYTICS_AVAILABLE:
+        return None
+    with _engines_lock:
+        engine = _engines.get(db_path)
+        if engine is None:
+            engine = _engines[db_path] = ColumnarAnalytics(db_path, replica=replica)
+        elif replica is not None:
+            engine.replica = replica
+        return engine
@@ -0,0 +1,94 @@
+"""
+Arrow result sets for SecureBank Pro
+Builds pyarrow tables straight from a sqlite3 cursor, one batch of rows
+and one column at a time, so long histories reach Streamlit, pandas and
+Plotly without a list of row tuples, a DataFrame of Python objects and a
+per-row formatting pass in between. Timestamps come out as timestamp
+columns and money as decimal(18, 2) columns; display formatting is left
+to Streamlit's column configuration.
+"""
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+DEFAULT_BATCH_SIZE = 10000
+
+if ARROW_AVAILABLE:
+    MONEY = pa.decimal128(18, 2)
+    TIMESTAMP = pa.timestamp("us")
+
+    # Column layouts of the ledger queries in BankDatabase, in SELECT order
+    TRANSACTION_SCHEMA = pa.schema([
+        ("transaction_type", pa.string()),
+        ("amount", MONEY),
+        ("balance_after", MONEY),
+        ("description", pa.string()),
+        ("timestamp", TIMESTAMP),
+        ("reference_number", pa.string()),
+    ])
+    SEARCH_SCHEMA = pa.schema([("account_number", pa.string())] + list(TRANSACTION_SCHEMA))
+else:
+    TRANSACTION_SCHEMA = SEARCH_SCHEMA = None
+
+
+def _require_arrow():
+    if not ARROW_AVAILABLE:
+        raise RuntimeError("Arrow result sets need pyarrow, which is not installed")
+
+
+def _column(values, data_type):
+    """One Arrow array from a column of SQLite values"""
+    if pa.types.is_timestamp(data_type):
+        # SQLite keeps timestamps as text; Arrow parses the whole column in one cast
+        return pa.array(values, pa.string()).cast(data_type)
+    if pa.types.is_decimal(data_type):
+        # Amounts are stored as REAL; the cast rounds each to the decimal's scale
+        return pa.array(values, pa.float64()).cast(data_type)
+    return pa.array(values, data_type)
+
+
+def cursor_batches(cursor, schema, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield record batches of the cursor's remaining rows, filled column-wise `batch_size` rows at a time"""
+    _require_arrow()
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        arrays = [_column(values, field.type) for values, field in zip(zip(*rows), schema)]
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def cursor_to_arrow(cursor, schema, batch_size=DEFAULT_BATCH_SIZE):
+    """Table of the cursor's remaining rows"""
+    _require_arrow()
+    return pa.Table.from_batches(list(cursor_batches(cursor, schema, batch_size)), schema=schema)
+
+
+def empty_table(schema):
+    """Table with the schema and no rows, for queries answered without touching the database"""
+    _require_arrow()
+    return schema.empty_table()
+
+
+def newest_rows(tables, schema, limit):
+    """The `limit` newest rows over several tables of the schema, by their timestamp column"""
+    if not tables:
+        return empty_table(schema)
+    return pa.concat_tables(tables).sort_by([("timestamp", "descending")]).slice(0, limit)
+
+
+def to_pandas(table):
+    """Arrow-backed DataFrame over the table's buffers (decimals stay decimals)"""
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def to_chart_frame(table):
+    """DataFrame for Plotly: money as float64 and timestamps as datetime64, converted column-wise"""
+    columns = [column.cast(pa.float64()) if pa.types.is_decimal(column.type) else column
+               for column in table.columns]
+    return pa.table(columns, names=table.column_names).to_pandas()
@@ -0,0 +1,273 @@
+"""
+Online backup and point-in-time restore for SecureBank Pro
+Base backups are taken with SQLite's online backup API in a single step
+from one read transaction; the database runs in WAL mode, so writers carry
+on during the copy (a page-stepped copy restarts on every write and never
+finishes under load). A probe takes and releases the write lock while the
+copy runs, and its slowest attempt is reported as the backup's maximum
+write stall. Between base backups the
+change stream from the CDC outbox is archived as numbered segment files
+(the archiver is a CDC subscriber, so outbox pruning never drops
+unarchived changes). A restore copies the newest base backup taken before
+the target time and replays archived changes up to that time.
+
+The change stream carries users, accounts and ledger rows, so those are
+restored exactly, each ledger row with its own timestamp and category.
+The event log is not in the stream: a restore appends the events the
+replayed rows imply and rebuilds the projections from the log.
+Idempotency keys come from the base backup only, so a client retrying a
+request made after it is not recognised as a replay.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from cdc import CDCPublisher
+from event_log import ProjectionRunner, ACCOUNT_OPENED, DEPOSITED, WITHDRAWN
+
+ARCHIVER_NAME = "backup-archiver"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+STALL_PROBE_INTERVAL = 0.01
+CREDIT_TYPES = ("deposit", "transfer_in")
+
+
+def _utc_now():
+    return datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+def _append_event_at(cursor, event_type, account_number, payload, created_at):
+    cursor.execute(
+        "INSERT INTO events (event_type, account_number, payload, created_at) VALUES (?, ?, ?, ?)",
+        (event_type, account_number, json.dumps(payload), created_at)
+    )
+
+
+class SegmentArchiveSink:
+    """CDC sink writing every delivered batch to its own fsynced segment file"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def deliver(self, changes):
+        first, last = changes[0]["offset"], changes[-1]["offset"]
+        path = os.path.join(self.directory, f"changes-{first:012d}-{last:012d}.jsonl")
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for change in changes:
+                f.write(json.dumps(change) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+
+class BackupManager:
+    """Takes base backups, archives change segments and restores to a point in time"""
+
+    def __init__(self, db_path="bank_system.db", backup_dir="backups"):
+        self.db_path = db_path
+        self.backup_dir = backup_dir
+        self.manifest_path = os.path.join(backup_dir, "manifest.json")
+        os.makedirs(backup_dir, exist_ok=True)
+
+        self.publisher = CDCPublisher(db_path, batch_size=5000)
+        self.publisher.subscribe(ARCHIVER_NAME, SegmentArchiveSink(backup_dir))
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return []
+        with open(self.manifest_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_manifest(self, manifest):
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(temp_path, self.manifest_path)
+
+    def _probe_write_stalls(self, done, stalls):
+        """Time taking and releasing the write lock until `done` is set"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            while not done.is_set():
+                started = time.perf_counter()
+                conn.execute("BEGIN IMMEDIATE")
+                conn.rollback()
+                stalls.append(time.perf_counter() - started)
+                done.wait(STALL_PROBE_INTERVAL)
+        finally:
+            conn.close()
+
+    def take_base_backup(self):
+        """Single-step online copy of the database; returns the manifest entry"""
+        started_at = _utc_now()
+        path = os.path.join(self.backup_dir, f"base-{started_at.replace(' ', 'T').replace(':', '')}.db")
+        stalls = []
+        done = threading.Event()
+        probe = threading.Thread(target=self._probe_write_stalls, args=(done, stalls),
+                                 name="backup-stall-probe", daemon=True)
+
+        started = time.perf_counter()
+        source = sqlite3.connect(self.db_path, timeout=30)
+        destination = sqlite3.connect(path)
+        try:
+            probe.start()
+            source.backup(destination)
+            done.set()
+            probe.join()
+            # The copy is consistent, so its outbox high-water mark says where replay starts
+            outbox_id = destination.execute("SELECT COALESCE(MAX(id), 0) FROM cdc_outbox").fetchone()[0]
+            # The snapshot is from some moment during the copy; its end is a safe upper bound
+            taken_at = _utc_now()
+        finally:
+            done.set()
+            destination.close()
+            source.close()
+
+        entry = {
+            "file": os.path.basename(path),
+            "taken_at": taken_at,
+            "outbox_id": outbox_id,
+            "duration_seconds": round(time.perf_counter() - started, 3),
+            "max_write_stall_ms": round(max(stalls, default=0.0) * 1000, 3),
+            "size_bytes": os.path.getsize(path),
+        }
+        manifest = self._load_manifest()
+        manifest.append(entry)
+        self._save_manifest(manifest)
+        return entry
+
+    def archive_changes(self):
+        """Write outbox changes since the last archive run to segment files"""
+        return self.publisher.run_once().get(ARCHIVER_NAME, 0)
+
+    def _segments(self):
+        names = sorted(n for n in os.listdir(self.backup_dir) if n.startswith("changes-") and n.endswith(".jsonl"))
+        for name in names:
+            _, first, last = name[:-len(".jsonl")].split("-")
+            yield int(first), int(last), os.path.join(self.backup_dir, name)
+
+    def _archived_changes(self, after_offset):
+        """Archived changes past an outbox offset, in commit order"""
+        for first, last, path in self._segments():
+            if last <= after_offset:
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    change = json.loads(line)
+                    if change["offset"] > after_offset:
+                        yield change
+
+    def restore(self, target_time, output_path):
+        """Rebuild the database as of `target_time` (UTC, 'YYYY-MM-DD HH:MM:SS') into output_path"""
+        if isinstance(target_time, datetime):
+            target_time = target_time.astimezone(timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+        candidates = [entry for entry in self._load_manifest() if entry["taken_at"] <= target_time]
+        if not candidates:
+            raise ValueError(f"No base backup was taken before {target_time}")
+        base = candidates[-1]
+
+        source = sqlite3.connect(os.path.join(self.backup_dir, base["file"]))
+        restored = sqlite3.connect(output_path)
+        source.backup(restored)
+        source.close()
+
+        replayed = 0
+        cursor = restored.cursor()
+        try:
+            for change in self._archived_changes(base["outbox_id"]):
+                if change["committed_at"] > target_time:
+                    break
+                self._apply_change(cursor, change)
+                replayed += 1
+            restored.commit()
+        finally:
+            restored.close()
+
+        # Replayed rows appended events without touching the projections
+        ProjectionRunner(output_path).rebuild()
+        return base, replayed
+
+    def _apply_change(self, cursor, change):
+        row = change["row"]
+        if change["table"] == "users":
+            cursor.execute('''
+                INSERT OR IGNORE INTO users (id, username, password_hash, email, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (row["id"], row["username"], row["password_hash"].encode("utf-8"), row["email"],
+                  change["committed_at"]))
+        elif change["table"] == "accounts":
+            cursor.execute('''
+                INSERT OR IGNORE INTO accounts
+                (account_number, user_id, account_type, balance, account_holder_name, phone_number, address, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (row["account_number"], row["user_id"], row["account_type"], row["balance"],
+                  row["account_holder_name"], row["phone_number"], row["address"], change["committed_at"]))
+            if cursor.rowcount:
+                _append_event_at(cursor, ACCOUNT_OPENED, row["account_number"], {
+                    "user_id": row["user_id"], "account_type": row["account_type"],
+                    "holder_name": row["account_holder_name"], "initial_deposit": row["balance"]
+                }, change["committed_at"])
+        elif change["table"] == "transactions":
+            # Changes archived before ledger rows carried their own timestamp fall back to the commit time
+            timestamp = row.get("timestamp") or change["committed_at"]
+            cursor.execute('''
+                INSERT OR IGNORE INTO transactions
+                (id, account_number, transaction_type, amount, balance_after, description, timestamp,
+                 reference_number, category, received_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (row["id"], row["account_number"], row["transaction_type"], row["amount"],
+                  row["balance_after"], row["description"], timestamp, row["reference_number"],
+                  row.get("category"), row.get("received_at")))
+            if not cursor.rowcount:
+                return
+            cursor.execute("UPDATE accounts SET balance = ? WHERE account_number = ?",
+                           (row["balance_after"], row["account_number"]))
+            # An initial deposit is logged before its account, whose AccountOpened event carries it
+            if cursor.rowcount:
+                event_type = DEPOSITED if row["transaction_type"] in CREDIT_TYPES else WITHDRAWN
+                _append_event_at(cursor, event_type, row["account_number"], {
+                    "amount": row["amount"], "balance_after": row["balance_after"],
+                    "reference": row["reference_number"]
+                }, timestamp)
+
+    def benchmark_restore(self, output_path, target_time=None, scale_to_bytes=20 * 1024 ** 3):
+        """Time a restore and extrapolate the recovery time to a database of scale_to_bytes"""
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        started = time.perf_counter()
+        base, replayed = self.restore(target_time or _utc_now(), output_path)
+        elapsed = time.perf_counter() - started
+        size = os.path.getsize(output_path)
+        return {
+            "base_backup": base["file"],
+            "replayed_changes": replayed,
+            "restored_bytes": size,
+            "restore_seconds": round(elapsed, 3),
+            "throughput_mb_s": round(size / elapsed / 1024 ** 2, 1) if elapsed else None,
+            "estimated_seconds_for_target_size": round(elapsed * scale_to_bytes / size, 1) if size else None,
+        }
+
+
+if __name__ == "__main__":
+    manager = BackupManager()
+    command = sys.argv[1] if len(sys.argv) > 1 else "base"
+
+    if command == "base":
+        entry = manager.take_base_backup()
+        print(f"Base backup {entry['file']} in {entry['duration_seconds']}s, "
+              f"max write stall {entry['max_write_stall_ms']} ms")
+    elif command == "archive":
+        print(f"Archived {manager.archive_changes()} changes")
+    elif command == "restore" and len(sys.argv) == 4:
+        base, replayed = manager.restore(sys.argv[2], sys.argv[3])
+        print(f"Restored from {base['file']} and replayed {replayed} changes into {sys.argv[3]}")
+    elif command == "bench":
+        print(manager.benchmark_restore("restore_benchmark.db"))
+    else:
+        print("Usage: python backup.py base | archive | restore '<YYYY-MM-DD HH:MM:SS>' <output.db> | bench")
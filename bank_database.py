@@ -0,0 +1,919 @@
+"""
+Database layer for SecureBank Pro
+Wraps the SQLite database used by the Streamlit app so it can also be used
+from scripts and background jobs without starting the web interface.
+"""
+
+import sqlite3
+import bcrypt
+import json
+import uuid
+import os
+import random
+import time
+from idempotency import (init_idempotency_table, request_fingerprint, lookup_result, store_result,
+                         purge_expired_keys, PURGE_INTERVAL_SECONDS)
+from event_log import (init_event_log, append_event, append_events, ProjectionRunner,
+                       ACCOUNT_OPENED, DEPOSITED, WITHDRAWN, TRANSFER_POSTED)
+from cdc import init_outbox, publish_change, publish_changes, notify_committed
+from fraud_rules import FraudRulesEngine
+from metrics import instrument_methods, observe, inc
+from replica import get_replica_manager
+from account_directory import get_account_directory
+from categorizer import get_categorizer
+from arrow_results import TRANSACTION_SCHEMA, SEARCH_SCHEMA, cursor_to_arrow, empty_table
+from striping import (init_striping_tables, init_stripe_tables, stripe_paths, stripe_index, stripe_reference,
+                      post_stripe_credit, PendingCreditCache, DEFAULT_STRIPES, MAX_STRIPES,
+                      PENDING_CACHE_SECONDS)
+
+@instrument_methods("bank_db_call_seconds")
+class BankDatabase:
+    def __init__(self, db_path="bank_system.db"):
+        self.db_path = db_path
+        self.replica = None
+        self._directory = None
+        self._striped = {}
+        self._striped_loaded_at = None
+        self.pending_credits = PendingCreditCache()
+        self._keys_purged_at = time.monotonic()
+        self.init_database()
+        self.purge_expired_idempotency_keys()
+        self.fraud_engine = FraudRulesEngine(history_loader=self._load_debit_history)
+    
+    def enable_replica(self, max_staleness=30.0):
+        """Serve snapshot reads (analytics, search, exports) from a read replica"""
+        self.replica = get_replica_manager(self.db_path, max_staleness)
+    
+    @property
+    def directory(self):
+        """In-memory account directory, loaded on first use (batch jobs never pay for it)"""
+        if self._directory is None:
+            self._directory = get_account_directory(self.db_path)
+        return self._directory
+    
+    def _read_connection(self, snapshot=False):
+        """Connection for a read; snapshot reads may be served by the replica"""
+        if snapshot and self.replica:
+            return self.replica.connect()
+        return sqlite3.connect(self.db_path)
+    
+    def _begin_write(self, cursor):
+        """Take the database write lock, recording how long we waited for it"""
+        started = time.perf_counter()
+        cursor.execute("BEGIN IMMEDIATE")
+        observe("bank_db_lock_wait_seconds", time.perf_counter() - started)
+    
+    def _commit(self, conn):
+        """Commit and count it; every PURGE_INTERVAL_SECONDS also purge expired idempotency keys"""
+        started = time.perf_counter()
+        conn.commit()
+        observe("bank_db_commit_seconds", time.perf_counter() - started)
+        inc("bank_db_commits_total")
+        
+        # One database object lives as long as its server process, so __init__ alone purges only once
+        if time.monotonic() - self._keys_purged_at > PURGE_INTERVAL_SECONDS:
+            self._keys_purged_at = time.monotonic()
+            try:
+                self.purge_expired_idempotency_keys()
+            except sqlite3.Error:
+                # The caller's write is already committed; a busy database just delays the purge
+                inc("idempotency_purge_errors_total")
+    
+    def init_database(self):
+        """Initialize the database with required tables"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        # WAL lets replica snapshots and base backups copy from one read transaction
+        # without blocking writers (the mode is stored in the file)
+        cursor.execute("PRAGMA journal_mode=WAL")
+        
+        # Users table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                email TEXT UNIQUE NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Accounts table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS accounts (
+                account_number TEXT PRIMARY KEY,
+                user_id INTEGER,
+                account_type TEXT NOT NULL,
+                balance REAL DEFAULT 0.0,
+                account_holder_name TEXT NOT NULL,
+                phone_number TEXT,
+                address TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                status TEXT DEFAULT 'active',
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+        
+        # Transactions table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS transactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                account_number TEXT,
+                transaction_type TEXT NOT NULL,
+                amount REAL NOT NULL,
+                balance_after REAL NOT NULL,
+                description TEXT,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                reference_number TEXT UNIQUE,
+                FOREIGN KEY (account_number) REFERENCES accounts (account_number)
+            )
+        ''')
+        
+        # Spend category, set on insert; older ledgers get it from categorizer.backfill_categories
+        cursor.execute("PRAGMA table_info(transactions)")
+        if "category" not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE transactions ADD COLUMN category TEXT")
+        # When a swept stripe credit was originally made; its row is posted at sweep time
+        cursor.execute("PRAGMA table_info(transactions)")
+        if "received_at" not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE transactions ADD COLUMN received_at TIMESTAMP")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_category ON transactions (category)")
+        
+        # Per-account history in time order (rowid is the implicit last column, so ties keep insert order)
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_transactions_account_time
+            ON transactions (account_number, timestamp)
+        ''')
+        
+        # Idempotency keys for deposits, withdrawals and transfers
+        init_idempotency_table(cursor)
+        
+        # Append-only event log, written alongside every balance change
+        init_event_log(cursor)
+        
+        # Change data capture outbox for downstream consumers
+        init_outbox(cursor)
+        
+        # Hot accounts whose credits are spread over stripe files
+        init_striping_tables(cursor)
+        
+        self._commit(conn)
+        conn.close()
+    
+    def purge_expired_idempotency_keys(self):
+        """Remove idempotency keys whose TTL has passed"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        removed = purge_expired_keys(cursor)
+        self._commit(conn)
+        conn.close()
+        
+        # Striped deposits keep their keys in the stripe file they were written to
+        for _, path in self._existing_stripe_paths():
+            conn = sqlite3.connect(path)
+            removed += purge_expired_keys(conn.cursor())
+            self._commit(conn)
+            conn.close()
+        return removed
+    
+    def _load_debit_history(self, account_number, limit):
+        """Recent withdrawals and outgoing transfers, oldest first, for the fraud engine"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT payload, strftime('%s', created_at) FROM events
+            WHERE account_number = ? AND event_type IN (?, ?)
+            ORDER BY seq DESC LIMIT ?
+        ''', (account_number, WITHDRAWN, TRANSFER_POSTED, limit))
+        rows = cursor.fetchall()
+        conn.close()
+        
+        history = []
+        for payload, created_at in reversed(rows):
+            payload = json.loads(payload)
+            history.append((float(created_at), payload["amount"], payload.get("to_account")))
+        return history
+    
+    def update_projections(self):
+        """Apply new events to the balance, daily stats and search projections"""
+        return ProjectionRunner(self.db_path).catch_up()
+    
+    def register_user(self, username, password, email):
+        """Register a new user"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        try:
+            password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+            cursor.execute(
+                "INSERT INTO users (username, password_hash, email) VALUES (?, ?, ?)",
+                (username, password_hash, email)
+            )
+            publish_change(cursor, "users", "insert", {
+                "id": cursor.lastrowid, "username": username,
+                "password_hash": password_hash.decode('utf-8'), "email": email
+            })
+            self._commit(conn)
+            notify_committed()
+            return True, "User registered successfully!"
+        except sqlite3.IntegrityError:
+            return False, "Username or email already exists!"
+        finally:
+            conn.close()
+    
+    def authenticate_user(self, username, password):
+        """Authenticate user login"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT id, password_hash FROM users WHERE username = ?", (username,))
+        result = cursor.fetchone()
+        conn.close()
+        
+        if result and bcrypt.checkpw(password.encode('utf-8'), result[1]):
+            return True, result[0]
+        return False, None
+    
+    def create_account(self, user_id, account_type, name, phone, address, initial_deposit=0, account_number=None):
+        """Create a new bank account (the number is generated unless a router already picked one)"""
+        account_number = account_number or self.generate_account_number()
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('''
+                INSERT INTO accounts 
+                (account_number, user_id, account_type, balance, account_holder_name, phone_number, address)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (account_number, user_id, account_type, initial_deposit, name, phone, address))
+            
+            if initial_deposit > 0:
+                self.add_transaction(account_number, "deposit", initial_deposit, initial_deposit, 
+                                   "Initial deposit", cursor)
+            
+            append_event(cursor, ACCOUNT_OPENED, account_number, {
+                "user_id": user_id, "account_type": account_type,
+                "holder_name": name, "initial_deposit": initial_deposit
+            })
+            publish_change(cursor, "accounts", "insert", {
+                "account_number": account_number, "user_id": user_id,
+                "account_type": account_type, "balance": initial_deposit,
+                "account_holder_name": name, "phone_number": phone, "address": address
+            })
+            
+            self._commit(conn)
+            notify_committed()
+            self.directory.add(account_number)
+            return True, account_number
+        except Exception as e:
+            conn.rollback()
+            return False, str(e)
+        finally:
+            conn.close()
+    
+    def generate_account_number(self):
+        """Generate a unique account number"""
+        # The primary key still rejects a number opened elsewhere since the last catch-up
+        while True:
+            account_number = f"ACC{random.randint(100000000, 999999999)}"
+            if not self.directory.contains(account_number, verify_misses=False):
+                return account_number
+    
+    def get_user_accounts(self, user_id):
+        """Get all accounts for a user"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT account_number, account_type, balance, account_holder_name, 
+                   phone_number, address, created_at, status
+            FROM accounts WHERE user_id = ?
+        ''', (user_id,))
+        
+        accounts = cursor.fetchall()
+        conn.close()
+        return [self._with_pending_credits(account) for account in accounts]
+    
+    def get_account_details(self, account_number):
+        """Get account details"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT account_number, account_type, balance, account_holder_name, 
+                   phone_number, address, created_at, status
+            FROM accounts WHERE account_number = ?
+        ''', (account_number,))
+        
+        account = cursor.fetchone()
+        conn.close()
+        return self._with_pending_credits(account)
+    
+    def update_balance(self, account_number, new_balance):
+        """Update account balance"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            "UPDATE accounts SET balance = ? WHERE account_number = ?",
+            (new_balance, account_number)
+        )
+        self._commit(conn)
+        conn.close()
+    
+    def add_transaction(self, account_number, transaction_type, amount, balance_after, description, cursor=None):
+        """Add a transaction record"""
+        reference_number = f"TXN{uuid.uuid4().hex[:10].upper()}"
+        
+        if cursor:
+            self._insert_transaction(cursor, account_number, transaction_type, amount, 
+                                     balance_after, description, reference_number)
+        else:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            self._insert_transaction(cursor, account_number, transaction_type, amount, 
+                                     balance_after, description, reference_number)
+            self._commit(conn)
+            conn.close()
+            notify_committed()
+        
+        return reference_number
+    
+    def _insert_transaction(self, cursor, account_number, transaction_type, amount, balance_after, 
+                            description, reference_number, received_at=None):
+        """Insert a ledger row and its change record in the caller's transaction"""
+        category = get_categorizer().categorize(description, transaction_type)
+        cursor.execute('''
+            INSERT INTO transactions 
+            (account_number, transaction_type, amount, balance_after, description, reference_number, category,
+             received_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            RETURNING id, timestamp
+        ''', (account_number, transaction_type, amount, balance_after, description, reference_number, category,
+              received_at))
+        transaction_id, timestamp = cursor.fetchone()
+        publish_change(cursor, "transactions", "insert", {
+            "id": transaction_id, "account_number": account_number,
+            "transaction_type": transaction_type, "amount": amount,
+            "balance_after": balance_after, "description": description,
+            "reference_number": reference_number, "category": category,
+            "timestamp": timestamp, "received_at": received_at
+        })
+    
+    def bulk_credit(self, credits, description, cursor):
+        """Credit many accounts in the caller's transaction; credits is a list of (account_number, amount)"""
+        return self._bulk_post(credits, description, cursor, "deposit", DEPOSITED, 1)
+    
+    def bulk_debit(self, debits, description, cursor):
+        """Debit many accounts in the caller's transaction, unchecked (balances may go negative)"""
+        return self._bulk_post(debits, description, cursor, "withdrawal", WITHDRAWN, -1)
+    
+    def _bulk_post(self, postings, description, cursor, transaction_type, event_type, sign):
+        """Post (account_number, amount) rows of one type with a few statements; returns their references"""
+        if not postings:
+            return []
+        
+        # Balances are read under the caller's write lock, so they cannot change underneath us
+        balances = {}
+        account_numbers = [account_number for account_number, _ in postings]
+        for start in range(0, len(account_numbers), 500):
+            chunk = account_numbers[start:start + 500]
+            cursor.execute(
+                f"SELECT account_number, balance FROM accounts WHERE account_number IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            balances.update(cursor.fetchall())
+        
+        cursor.execute("SELECT COALESCE(MAX(id), 0), CURRENT_TIMESTAMP FROM transactions")
+        last_id, timestamp = cursor.fetchone()
+        next_id = last_id + 1
+        
+        references = self._unique_references(cursor, len(postings))
+        category = get_categorizer().categorize(description, transaction_type)
+        rows = []
+        for offset, ((account_number, amount), reference_number) in enumerate(zip(postings, references)):
+            balance_after = balances[account_number] + sign * amount
+            balances[account_number] = balance_after
+            rows.append({
+                "id": next_id + offset, "account_number": account_number,
+                "transaction_type": transaction_type, "amount": amount,
+                "balance_after": balance_after, "description": description,
+                "reference_number": reference_number, "category": category, "timestamp": timestamp
+            })
+        
+        cursor.executemany("UPDATE accounts SET balance = balance + ? WHERE account_number = ?",
+                           [(sign * amount, account_number) for account_number, amount in postings])
+        cursor.executemany('''
+            INSERT INTO transactions 
+            (id, account_number, transaction_type, amount, balance_after, description, reference_number, category,
+             timestamp)
+            VALUES (:id, :account_number, :transaction_type, :amount, :balance_after, :description,
+                    :reference_number, :category, :timestamp)
+        ''', rows)
+        publish_changes(cursor, "transactions", "insert", rows)
+        append_events(cursor, [
+            (event_type, row["account_number"], {
+                "amount": row["amount"], "balance_after": row["balance_after"],
+                "reference": row["reference_number"]
+            })
+            for row in rows
+        ])
+        return [row["reference_number"] for row in rows]
+    
+    def _unique_references(self, cursor, count):
+        """Reference numbers for a bulk insert, free of clashes within the batch and the ledger"""
+        # Ten hex digits clash often enough at millions of rows, so check before inserting
+        references = set()
+        while len(references) < count:
+            candidates = {f"TXN{uuid.uuid4().hex[:10].upper()}" for _ in range(count - len(references))}
+            candidates -= references
+            batch = list(candidates)
+            for start in range(0, len(batch), 500):
+                chunk = batch[start:start + 500]
+                cursor.execute(
+                    f"SELECT reference_number FROM transactions WHERE reference_number IN ({','.join('?' * len(chunk))})",
+                    chunk
+                )
+                candidates.difference_update(row[0] for row in cursor.fetchall())
+            references.update(candidates)
+        return list(references)
+    
+    def get_transactions(self, account_number, limit=50, snapshot=False, as_arrow=False):
+        """Get transaction history for an account (a pyarrow table with as_arrow)"""
+        conn = self._read_connection(snapshot)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT transaction_type, amount, balance_after, description, timestamp, reference_number
+            FROM transactions 
+            WHERE account_number = ? 
+            ORDER BY timestamp DESC 
+            LIMIT ?
+        ''', (account_number, limit))
+        
+        if as_arrow:
+            transactions = cursor_to_arrow(cursor, TRANSACTION_SCHEMA)
+        else:
+            transactions = cursor.fetchall()
+        conn.close()
+        return transactions
+    
+    def search_transactions(self, account_numbers, transaction_type=None, date_from=None, date_to=None,
+                            min_amount=None, max_amount=None, limit=500, snapshot=True, as_arrow=False):
+        """Search transactions of the given accounts; dates are inclusive (a pyarrow table with as_arrow)"""
+        if not account_numbers:
+            return empty_table(SEARCH_SCHEMA) if as_arrow else []
+        
+        conditions = [f"account_number IN ({','.join('?' * len(account_numbers))})"]
+        params = list(account_numbers)
+        if transaction_type:
+            conditions.append("transaction_type = ?")
+            params.append(transaction_type)
+        if date_from:
+            conditions.append("timestamp >= ?")
+            params.append(str(date_from))
+        if date_to:
+            conditions.append("timestamp < date(?, '+1 day')")
+            params.append(str(date_to))
+        if min_amount is not None:
+            conditions.append("amount >= ?")
+            params.append(min_amount)
+        if max_amount is not None:
+            conditions.append("amount <= ?")
+            params.append(max_amount)
+        
+        conn = self._read_connection(snapshot)
+        cursor = conn.cursor()
+        
+        cursor.execute(f'''
+            SELECT account_number, transaction_type, amount, balance_after, description, timestamp, reference_number
+            FROM transactions 
+            WHERE {" AND ".join(conditions)}
+            ORDER BY timestamp DESC 
+            LIMIT ?
+        ''', params + [limit])
+        
+        if as_arrow:
+            transactions = cursor_to_arrow(cursor, SEARCH_SCHEMA)
+        else:
+            transactions = cursor.fetchall()
+        conn.close()
+        return transactions
+    
+    def spending_by_category(self, account_numbers, since=None, snapshot=True):
+        """Count and total of withdrawals and outgoing transfers per spend category"""
+        if not account_numbers:
+            return []
+        
+        conditions = [f"account_number IN ({','.join('?' * len(account_numbers))})",
+                      "transaction_type IN ('withdrawal', 'transfer_out')"]
+        params = list(account_numbers)
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(str(since))
+        
+        conn = self._read_connection(snapshot)
+        cursor = conn.cursor()
+        
+        cursor.execute(f'''
+            SELECT COALESCE(category, 'Uncategorized'), COUNT(*), SUM(amount)
+            FROM transactions 
+            WHERE {" AND ".join(conditions)}
+            GROUP BY 1 
+            ORDER BY 3 DESC
+        ''', params)
+        
+        categories = cursor.fetchall()
+        conn.close()
+        return categories
+    
+    def balance_at(self, account_number, at, snapshot=False):
+        """Balance of an account at a UTC timestamp (0.0 before its first transaction)"""
+        return self.balances_at(at, [account_number], snapshot).get(account_number, 0.0)
+    
+    def balances_at(self, at, account_numbers=None, snapshot=False):
+        """Balances of many accounts (all if None) at one UTC timestamp, in a single query"""
+        if hasattr(at, "strftime"):
+            at = at.strftime("%Y-%m-%d %H:%M:%S")
+        
+        # Every ledger row records balance_after, so the last row at or before `at`
+        # is the balance then: one seek on idx_transactions_account_time per account
+        query = '''
+            SELECT a.account_number, COALESCE((
+                SELECT t.balance_after FROM transactions t
+                WHERE t.account_number = a.account_number AND t.timestamp <= ?
+                ORDER BY t.timestamp DESC, t.id DESC LIMIT 1
+            ), 0.0)
+            FROM accounts a
+        '''
+        params = [at]
+        if account_numbers is not None:
+            query += " WHERE a.account_number IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(list(account_numbers)))
+        
+        conn = self._read_connection(snapshot)
+        try:
+            return dict(conn.execute(query, params).fetchall())
+        finally:
+            conn.close()
+    
+    def enable_striping(self, account_number, stripe_count=DEFAULT_STRIPES):
+        """Spread an account's incoming deposits over stripe_count stripe files"""
+        if not 1 <= stripe_count <= MAX_STRIPES:
+            return False, f"Stripe count must be between 1 and {MAX_STRIPES}"
+        if not self.get_account_details(account_number):
+            return False, "Account not found"
+        
+        for path in stripe_paths(self.db_path)[:stripe_count]:
+            conn = sqlite3.connect(path)
+            init_stripe_tables(conn.cursor())
+            self._commit(conn)
+            conn.close()
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT OR REPLACE INTO striped_accounts (account_number, stripe_count) VALUES (?, ?)",
+            (account_number, stripe_count)
+        )
+        self._commit(conn)
+        conn.close()
+        self._striped_loaded_at = None
+        return True, f"{account_number} now takes deposits on {stripe_count} stripes"
+    
+    def disable_striping(self, account_number):
+        """Stop striping an account and fold its pending credits into the ledger"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM striped_accounts WHERE account_number = ?", (account_number,))
+        self._commit(conn)
+        conn.close()
+        self._striped_loaded_at = None
+        return self.sweep_stripes(account_number)
+    
+    def stripe_count(self, account_number):
+        """Number of stripes of an account, 0 if it is not striped (flags are re-read every second)"""
+        if self._striped_loaded_at is None or time.monotonic() - self._striped_loaded_at > PENDING_CACHE_SECONDS:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                self._striped = dict(conn.execute("SELECT account_number, stripe_count FROM striped_accounts"))
+            except sqlite3.OperationalError:
+                # Busy database: either deposit path is correct, so keep the previous flags
+                pass
+            finally:
+                conn.close()
+            self._striped_loaded_at = time.monotonic()
+        return self._striped.get(account_number, 0)
+    
+    def _existing_stripe_paths(self):
+        """(stripe, path) of the stripe files created so far"""
+        return [(stripe, path) for stripe, path in enumerate(stripe_paths(self.db_path)) if os.path.exists(path)]
+    
+    def _load_pending_credits(self, account_number):
+        """Total of an account's credits still waiting in stripe files"""
+        total = 0.0
+        for _, path in self._existing_stripe_paths():
+            conn = sqlite3.connect(path)
+            total += conn.execute(
+                "SELECT COALESCE(SUM(amount), 0) FROM stripe_credits WHERE account_number = ?", (account_number,)
+            ).fetchone()[0]
+            conn.close()
+        return total
+    
+    def _with_pending_credits(self, account):
+        """Account row with unswept stripe credits added to its balance"""
+        if not account or not self.stripe_count(account[0]):
+            return account
+        pending = self.pending_credits.get(account[0], self._load_pending_credits)
+        return account[:2] + (account[2] + pending,) + account[3:]
+    
+    def _deposit_to_stripe(self, account_number, amount, description, idempotency_key, stripe_count):
+        """Deposit into a striped account, locking only the stripe file the credit lands on"""
+        # Keyed deposits hash on the key, so a retry finds its stored result on the same stripe
+        stripe = stripe_index(idempotency_key or uuid.uuid4().hex, stripe_count)
+        conn = sqlite3.connect(stripe_paths(self.db_path)[stripe])
+        cursor = conn.cursor()
+        
+        try:
+            self._begin_write(cursor)
+            fingerprint = request_fingerprint(account_number, float(amount))
+            if idempotency_key:
+                previous = lookup_result(cursor, idempotency_key, "deposit", fingerprint)
+                if previous:
+                    return previous
+            
+            ref_num = post_stripe_credit(cursor, stripe, account_number, "deposit", amount, description)
+            result = (True, ref_num)
+            if idempotency_key:
+                store_result(cursor, idempotency_key, "deposit", fingerprint, result)
+            
+            self._commit(conn)
+            self.pending_credits.add(account_number, amount)
+            return result
+        except Exception as e:
+            conn.rollback()
+            return False, str(e)
+        finally:
+            conn.close()
+    
+    def sweep_stripes(self, account_number=None):
+        """Move pending stripe credits (of one account, or all) into balances and the ledger
+        
+        Credits are posted at sweep time in the order they were made, keeping
+        the time each was made in received_at: balance_after follows ledger
+        order, so back-dated rows would make balance_at wrong for the time
+        between the credit and the sweep. They are removed from the attached
+        stripe files in the same transaction. In WAL mode SQLite commits each
+        file on its own, the database first, so a crash can leave swept
+        credits in a stripe; the next sweep finds their references already
+        in the ledger and only deletes them.
+        Returns the number of credits swept.
+        """
+        stripes = self._existing_stripe_paths()
+        if not stripes:
+            return 0
+        
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        cursor = conn.cursor()
+        
+        try:
+            for stripe, path in stripes:
+                cursor.execute(f"ATTACH DATABASE ? AS stripe{stripe}", (path,))
+            # BEGIN IMMEDIATE locks the database and every attached stripe, database first
+            self._begin_write(cursor)
+            
+            credits = []
+            for stripe, _ in stripes:
+                query = f'''
+                    SELECT created_at, {stripe}, id, account_number, transaction_type, amount, description
+                    FROM stripe{stripe}.stripe_credits
+                '''
+                params = ()
+                if account_number is not None:
+                    query += " WHERE account_number = ?"
+                    params = (account_number,)
+                cursor.execute(query, params)
+                credits.extend(cursor.fetchall())
+            
+            if not credits:
+                conn.rollback()
+                return 0
+            credits.sort()
+            
+            references = [stripe_reference(stripe, credit_id) for _, stripe, credit_id, _, _, _, _ in credits]
+            posted = set()
+            for start in range(0, len(references), 500):
+                chunk = references[start:start + 500]
+                cursor.execute(
+                    f"SELECT reference_number FROM transactions WHERE reference_number IN ({','.join('?' * len(chunk))})",
+                    chunk
+                )
+                posted.update(row[0] for row in cursor.fetchall())
+            unposted = [credit for credit, reference in zip(credits, references) if reference not in posted]
+            
+            balances = {}
+            for _, _, _, credited_account, _, _, _ in unposted:
+                if credited_account not in balances:
+                    cursor.execute("SELECT balance FROM accounts WHERE account_number = ?", (credited_account,))
+                    balances[credited_account] = cursor.fetchone()[0]
+            
+            events = []
+            for created_at, stripe, credit_id, credited_account, transaction_type, amount, description in unposted:
+                balances[credited_account] += amount
+                reference = stripe_reference(stripe, credit_id)
+                self._insert_transaction(cursor, credited_account, transaction_type, amount,
+                                         balances[credited_account], description, reference, created_at)
+                events.append((DEPOSITED, credited_account, {
+                    "amount": amount, "balance_after": balances[credited_account], "reference": reference
+                }))
+            append_events(cursor, events)
+            cursor.executemany("UPDATE accounts SET balance = ? WHERE account_number = ?",
+                               [(balance, credited_account) for credited_account, balance in balances.items()])
+            
+            swept_ids = {}
+            for _, stripe, credit_id, _, _, _, _ in credits:
+                swept_ids.setdefault(stripe, []).append((credit_id,))
+            for stripe, ids in swept_ids.items():
+                cursor.executemany(f"DELETE FROM stripe{stripe}.stripe_credits WHERE id = ?", ids)
+            
+            self._commit(conn)
+            notify_committed()
+            for credited_account in {credit[3] for credit in credits}:
+                self.pending_credits.invalidate(credited_account)
+            return len(unposted)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    
+    def deposit(self, account_number, amount, description="Cash deposit", idempotency_key=None):
+        """Deposit money into an account"""
+        stripe_count = self.stripe_count(account_number)
+        if stripe_count:
+            return self._deposit_to_stripe(account_number, amount, description, idempotency_key, stripe_count)
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        try:
+            # Take the write lock up front so the replay check and the update see the same state
+            self._begin_write(cursor)
+            fingerprint = request_fingerprint(account_number, float(amount))
+            if idempotency_key:
+                previous = lookup_result(cursor, idempotency_key, "deposit", fingerprint)
+                if previous:
+                    return previous
+            
+            cursor.execute("SELECT balance FROM accounts WHERE account_number = ?", (account_number,))
+            account = cursor.fetchone()
+            
+            if not account:
+                return False, "Account not found"
+            
+            new_balance = account[0] + amount
+            cursor.execute("UPDATE accounts SET balance = ? WHERE account_number = ?", 
+                         (new_balance, account_number))
+            ref_num = self.add_transaction(account_number, "deposit", amount, new_balance, 
+                                         description, cursor)
+            append_event(cursor, DEPOSITED, account_number, {
+                "amount": amount, "balance_after": new_balance, "reference": ref_num
+            })
+            
+            result = (True, ref_num)
+            if idempotency_key:
+                store_result(cursor, idempotency_key, "deposit", fingerprint, result)
+            
+            self._commit(conn)
+            notify_committed()
+            return result
+            
+        except Exception as e:
+            conn.rollback()
+            return False, str(e)
+        finally:
+            conn.close()
+    
+    def withdraw(self, account_number, amount, description="Cash withdrawal", idempotency_key=None):
+        """Withdraw money from an account"""
+        # Debits only spend consolidated money: pending stripe credits are swept in first
+        if self.stripe_count(account_number):
+            self.sweep_stripes(account_number)
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        try:
+            self._begin_write(cursor)
+            fingerprint = request_fingerprint(account_number, float(amount))
+            if idempotency_key:
+                previous = lookup_result(cursor, idempotency_key, "withdrawal", fingerprint)
+                if previous:
+                    return previous
+            
+            cursor.execute("SELECT balance FROM accounts WHERE account_number = ?", (account_number,))
+            account = cursor.fetchone()
+            
+            if not account or account[0] < amount:
+                return False, "Insufficient balance!"
+            
+            allowed, reason = self.fraud_engine.check(account_number, amount)
+            if not allowed:
+                return False, reason
+            
+            new_balance = account[0] - amount
+            cursor.execute("UPDATE accounts SET balance = ? WHERE account_number = ?", 
+                         (new_balance, account_number))
+            ref_num = self.add_transaction(account_number, "withdrawal", amount, new_balance, 
+                                         description, cursor)
+            append_event(cursor, WITHDRAWN, account_number, {
+                "amount": amount, "balance_after": new_balance, "reference": ref_num
+            })
+            
+            result = (True, ref_num)
+            if idempotency_key:
+                store_result(cursor, idempotency_key, "withdrawal", fingerprint, result)
+            
+            self._commit(conn)
+            notify_committed()
+            self.fraud_engine.record(account_number, amount)
+            return result
+            
+        except Exception as e:
+            conn.rollback()
+            return False, str(e)
+        finally:
+            conn.close()
+    
+    def transfer_money(self, from_account, to_account, amount, idempotency_key=None):
+        """Transfer money between accounts"""
+        # Mistyped destinations are rejected from memory, before taking the write lock
+        if not self.directory.contains(to_account):
+            return False, "Destination account not found"
+        if self.stripe_count(from_account):
+            self.sweep_stripes(from_account)
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        try:
+            self._begin_write(cursor)
+            fingerprint = request_fingerprint(from_account, to_account, float(amount))
+            if idempotency_key:
+                previous = lookup_result(cursor, idempotency_key, "transfer", fingerprint)
+                if previous:
+                    return previous
+            
+            # Get source account details
+            cursor.execute("SELECT balance FROM accounts WHERE account_number = ?", (from_account,))
+            source_balance = cursor.fetchone()
+            
+            if not source_balance or source_balance[0] < amount:
+                return False, "Insufficient balance or invalid source account"
+            
+            allowed, reason = self.fraud_engine.check(from_account, amount, beneficiary=to_account)
+            if not allowed:
+                return False, reason
+            
+            # Perform the transfer; the directory already vouched for the destination, so it is
+            # credited without being looked up again
+            new_source_balance = source_balance[0] - amount
+            cursor.execute("UPDATE accounts SET balance = ? WHERE account_number = ?", 
+                         (new_source_balance, from_account))
+            cursor.execute("UPDATE accounts SET balance = balance + ? WHERE account_number = ? RETURNING balance",
+                         (amount, to_account))
+            dest_balance = cursor.fetchone()
+            
+            if not dest_balance:
+                conn.rollback()
+                return False, "Destination account not found"
+            new_dest_balance = dest_balance[0]
+            
+            # Add transaction records
+            ref_num = self.add_transaction(from_account, "transfer_out", amount, new_source_balance, 
+                                         f"Transfer to {to_account}", cursor)
+            self.add_transaction(to_account, "transfer_in", amount, new_dest_balance, 
+                               f"Transfer from {from_account}", cursor)
+            append_event(cursor, TRANSFER_POSTED, from_account, {
+                "from_account": from_account, "to_account": to_account, "amount": amount,
+                "from_balance_after": new_source_balance, "to_balance_after": new_dest_balance,
+                "reference": ref_num
+            })
+            
+            result = (True, f"Transfer successful! Reference: {ref_num}")
+            if idempotency_key:
+                store_result(cursor, idempotency_key, "transfer", fingerprint, result)
+            
+            self._commit(conn)
+            notify_committed()
+            self.fraud_engine.record(from_account, amount, beneficiary=to_account)
+            return result
+            
+        except Exception as e:
+            conn.rollback()
+            return False, str(e)
+        finally:
+            conn.close()
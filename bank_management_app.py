@@ -2,13 +2,19 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-import sqlite3
-import bcrypt
+import pyarrow as pa
 import json
+import os
 import uuid
 from datetime import datetime, timedelta
-import random
 from pathlib import Path
+from bank_database import BankDatabase
+from sharding import ShardedBankDatabase
+from analytics_engine import get_analytics_engine
+from downsampling import aggregate_series, downsample
+from arrow_results import to_chart_frame, to_pandas
+from job_queue import get_job_queue, EXPORT_DIR, QUEUED, RUNNING, SUCCEEDED, FAILED
+import metrics
 
 # Page configuration
 st.set_page_config(
@@ -88,249 +94,69 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-class BankDatabase:
-    def __init__(self):
-        self.db_path = "bank_system.db"
-        self.init_database()
-    
-    def init_database(self):
-        """Initialize the database with required tables"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Users table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Accounts table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS accounts (
-                account_number TEXT PRIMARY KEY,
-                user_id INTEGER,
-                account_type TEXT NOT NULL,
-                balance REAL DEFAULT 0.0,
-                account_holder_name TEXT NOT NULL,
-                phone_number TEXT,
-                address TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                status TEXT DEFAULT 'active',
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        
-        # Transactions table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS transactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                account_number TEXT,
-                transaction_type TEXT NOT NULL,
-                amount REAL NOT NULL,
-                balance_after REAL NOT NULL,
-                description TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                reference_number TEXT UNIQUE,
-                FOREIGN KEY (account_number) REFERENCES accounts (account_number)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-    
-    def register_user(self, username, password, email):
-        """Register a new user"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        try:
-            password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-            cursor.execute(
-                "INSERT INTO users (username, password_hash, email) VALUES (?, ?, ?)",
-                (username, password_hash, email)
-            )
-            conn.commit()
-            return True, "User registered successfully!"
-        except sqlite3.IntegrityError:
-            return False, "Username or email already exists!"
-        finally:
-            conn.close()
-    
-    def authenticate_user(self, username, password):
-        """Authenticate user login"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT id, password_hash FROM users WHERE username = ?", (username,))
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result and bcrypt.checkpw(password.encode('utf-8'), result[1]):
-            return True, result[0]
-        return False, None
-    
-    def create_account(self, user_id, account_type, name, phone, address, initial_deposit=0):
-        """Create a new bank account"""
-        account_number = self.generate_account_number()
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute('''
-                INSERT INTO accounts 
-                (account_number, user_id, account_type, balance, account_holder_name, phone_number, address)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (account_number, user_id, account_type, initial_deposit, name, phone, address))
-            
-            if initial_deposit > 0:
-                self.add_transaction(account_number, "deposit", initial_deposit, initial_deposit, 
-                                   "Initial deposit", cursor)
-            
-            conn.commit()
-            return True, account_number
-        except Exception as e:
-            conn.rollback()
-            return False, str(e)
-        finally:
-            conn.close()
-    
-    def generate_account_number(self):
-        """Generate a unique account number"""
-        return f"ACC{random.randint(100000000, 999999999)}"
-    
-    def get_user_accounts(self, user_id):
-        """Get all accounts for a user"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT account_number, account_type, balance, account_holder_name, 
-                   phone_number, address, created_at, status
-            FROM accounts WHERE user_id = ?
-        ''', (user_id,))
-        
-        accounts = cursor.fetchall()
-        conn.close()
-        return accounts
-    
-    def get_account_details(self, account_number):
-        """Get account details"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT account_number, account_type, balance, account_holder_name, 
-                   phone_number, address, created_at, status
-            FROM accounts WHERE account_number = ?
-        ''', (account_number,))
-        
-        account = cursor.fetchone()
-        conn.close()
-        return account
-    
-    def update_balance(self, account_number, new_balance):
-        """Update account balance"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "UPDATE accounts SET balance = ? WHERE account_number = ?",
-            (new_balance, account_number)
-        )
-        conn.commit()
-        conn.close()
-    
-    def add_transaction(self, account_number, transaction_type, amount, balance_after, description, cursor=None):
-        """Add a transaction record"""
-        reference_number = f"TXN{uuid.uuid4().hex[:10].upper()}"
-        
-        if cursor:
-            cursor.execute('''
-                INSERT INTO transactions 
-                (account_number, transaction_type, amount, balance_after, description, reference_number)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (account_number, transaction_type, amount, balance_after, description, reference_number))
-        else:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO transactions 
-                (account_number, transaction_type, amount, balance_after, description, reference_number)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (account_number, transaction_type, amount, balance_after, description, reference_number))
-            conn.commit()
-            conn.close()
-        
-        return reference_number
-    
-    def get_transactions(self, account_number, limit=50):
-        """Get transaction history for an account"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT transaction_type, amount, balance_after, description, timestamp, reference_number
-            FROM transactions 
-            WHERE account_number = ? 
-            ORDER BY timestamp DESC 
-            LIMIT ?
-        ''', (account_number, limit))
-        
-        transactions = cursor.fetchall()
-        conn.close()
-        return transactions
-    
-    def transfer_money(self, from_account, to_account, amount):
-        """Transfer money between accounts"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        try:
-            # Get source account details
-            cursor.execute("SELECT balance FROM accounts WHERE account_number = ?", (from_account,))
-            source_balance = cursor.fetchone()
-            
-            if not source_balance or source_balance[0] < amount:
-                return False, "Insufficient balance or invalid source account"
-            
-            # Check if destination account exists
-            cursor.execute("SELECT balance FROM accounts WHERE account_number = ?", (to_account,))
-            dest_balance = cursor.fetchone()
-            
-            if not dest_balance:
-                return False, "Destination account not found"
-            
-            # Perform the transfer
-            new_source_balance = source_balance[0] - amount
-            new_dest_balance = dest_balance[0] + amount
-            
-            cursor.execute("UPDATE accounts SET balance = ? WHERE account_number = ?", 
-                         (new_source_balance, from_account))
-            cursor.execute("UPDATE accounts SET balance = ? WHERE account_number = ?", 
-                         (new_dest_balance, to_account))
-            
-            # Add transaction records
-            ref_num = self.add_transaction(from_account, "transfer_out", amount, new_source_balance, 
-                                         f"Transfer to {to_account}", cursor)
-            self.add_transaction(to_account, "transfer_in", amount, new_dest_balance, 
-                               f"Transfer from {from_account}", cursor)
-            
-            conn.commit()
-            return True, f"Transfer successful! Reference: {ref_num}"
-            
-        except Exception as e:
-            conn.rollback()
-            return False, str(e)
-        finally:
-            conn.close()
+@st.cache_resource
+def get_database(db_path, shards=None, replica_staleness=None):
+    """One database object per server process; building it runs migrations and purges, too slow per rerun"""
+    if shards:
+        database = ShardedBankDatabase(db_path, int(shards))
+    else:
+        database = BankDatabase(db_path)
+    database.enable_replica(float(replica_staleness or 30.0))
+    return database
+
+# Initialize database (BANK_DB_PATH points the app at another file, e.g. for load tests;
+# BANK_SHARDS=N spreads accounts over N SQLite files next to it; BANK_REPLICA_STALENESS
+# is how many seconds old analytics, search and export snapshots may be, 30 by default)
+db = get_database(os.environ.get("BANK_DB_PATH", "bank_system.db"), os.environ.get("BANK_SHARDS"),
+                  os.environ.get("BANK_REPLICA_STALENESS"))
+metrics.start_from_env()
+
+# A widget inside a fragment reruns only that fragment (st.fragment from Streamlit 1.37,
+# st.experimental_fragment from 1.33); on older versions fragments are plain functions
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
 
-# Initialize database
-db = BankDatabase()
+# Analytics trend ranges in days (None = all history)
+TREND_RANGES = {"Last 30 days": 30, "Last 90 days": 90, "Last year": 365, "All time": None}
+
+# Exports are read into the page only when asked for, and only up to this size
+EXPORT_DOWNLOAD_LIMIT_BYTES = 50 * 1024 * 1024
+
+# Display names of ledger columns; money and dates are formatted by the grid, not per row in Python
+TRANSACTION_LABELS = {
+    'account_number': 'Account Number', 'account_holder': 'Account Holder', 'transaction_type': 'Type',
+    'amount': 'Amount', 'balance_after': 'Balance After', 'description': 'Description',
+    'timestamp': 'Date', 'reference_number': 'Reference'
+}
+TRANSACTION_COLUMN_CONFIG = {
+    'Amount': st.column_config.NumberColumn(format="₹%.2f"),
+    'Balance After': st.column_config.NumberColumn(format="₹%.2f"),
+    'Date': st.column_config.DatetimeColumn(format="YYYY-MM-DD HH:mm")
+}
+
+def label_transactions(table):
+    """Arrow ledger table with its display column names"""
+    return table.rename_columns([TRANSACTION_LABELS[name] for name in table.column_names])
+
+def load_accounts_transactions(accounts, limit):
+    """Newest `limit` transactions of each account in one Arrow table, tagged with the account"""
+    tables = []
+    for account in accounts:
+        transactions = db.get_transactions(account[0], limit, as_arrow=True)
+        transactions = transactions.add_column(0, 'account_holder', pa.repeat(account[3], transactions.num_rows))
+        transactions = transactions.add_column(0, 'account_number', pa.repeat(account[0], transactions.num_rows))
+        tables.append(transactions)
+    return pa.concat_tables(tables)
+
+def get_idempotency_key(form_name):
+    """Return the idempotency key for the pending submission of a form"""
+    state_key = f"idempotency_{form_name}"
+    if state_key not in st.session_state:
+        st.session_state[state_key] = uuid.uuid4().hex
+    return st.session_state[state_key]
+
+def reset_idempotency_key(form_name):
+    """Start a fresh idempotency key once a submission has gone through"""
+    st.session_state.pop(f"idempotency_{form_name}", None)
 
 def main():
     # Initialize session state
@@ -354,6 +180,7 @@ def main():
     else:
         show_banking_dashboard()
 
+@metrics.timed("page_render_seconds", page="auth_page")
 def show_auth_page():
     """Display authentication page"""
     col1, col2, col3 = st.columns([1, 2, 1])
@@ -403,6 +230,7 @@ def show_auth_page():
                     else:
                         st.error("Please fill in all fields!")
 
+@metrics.timed("page_render_seconds", page="banking_dashboard")
 def show_banking_dashboard():
     """Display main banking dashboard"""
     # Sidebar
@@ -437,6 +265,7 @@ def show_banking_dashboard():
     elif menu_option == "⚙️ Settings":
         show_settings()
 
+@metrics.timed("page_render_seconds", page="dashboard")
 def show_dashboard():
     """Display dashboard overview"""
     st.header("🏠 Dashboard Overview")
@@ -488,41 +317,19 @@ def show_dashboard():
         
         st.markdown("---")
         
-        # Quick Actions
-        st.subheader("⚡ Quick Actions")
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            if st.button("💰 Make Deposit", use_container_width=True):
-                st.session_state.quick_action = "deposit"
-        
-        with col2:
-            if st.button("💸 Withdraw Money", use_container_width=True):
-                st.session_state.quick_action = "withdraw"
-        
-        with col3:
-            if st.button("🔄 Transfer Funds", use_container_width=True):
-                st.session_state.quick_action = "transfer"
-        
-        # Handle quick actions
-        if hasattr(st.session_state, 'quick_action'):
-            handle_quick_action(accounts)
+        show_quick_actions()
         
         # Recent transactions
         st.subheader("📋 Recent Transactions")
         if accounts:
-            recent_transactions = []
-            for account in accounts:
-                transactions = db.get_transactions(account[0], 5)
-                for txn in transactions:
-                    recent_transactions.append([
-                        account[0], txn[0], txn[1], txn[4], txn[5]
-                    ])
+            recent_transactions = load_accounts_transactions(accounts, 5).select([
+                'account_number', 'transaction_type', 'amount', 'timestamp', 'reference_number'
+            ])
             
-            if recent_transactions:
-                df = pd.DataFrame(recent_transactions, 
-                                columns=['Account', 'Type', 'Amount', 'Date', 'Reference'])
-                st.dataframe(df, use_container_width=True, hide_index=True)
+            if recent_transactions.num_rows:
+                table = recent_transactions.rename_columns(['Account', 'Type', 'Amount', 'Date', 'Reference'])
+                st.dataframe(table, use_container_width=True, hide_index=True,
+                             column_config=TRANSACTION_COLUMN_CONFIG)
             else:
                 st.info("No recent transactions found.")
         
@@ -531,6 +338,31 @@ def show_dashboard():
         if st.button("➕ Open Your First Account", use_container_width=True):
             show_new_account()
 
+@fragment
+@metrics.timed("fragment_render_seconds", fragment="quick_actions")
+def show_quick_actions():
+    """Quick action buttons and forms; using them reruns only this fragment"""
+    accounts = db.get_user_accounts(st.session_state.user_id)
+    
+    st.subheader("⚡ Quick Actions")
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        if st.button("💰 Make Deposit", use_container_width=True):
+            st.session_state.quick_action = "deposit"
+    
+    with col2:
+        if st.button("💸 Withdraw Money", use_container_width=True):
+            st.session_state.quick_action = "withdraw"
+    
+    with col3:
+        if st.button("🔄 Transfer Funds", use_container_width=True):
+            st.session_state.quick_action = "transfer"
+    
+    # Handle quick actions
+    if hasattr(st.session_state, 'quick_action'):
+        handle_quick_action(accounts)
+
 def handle_quick_action(accounts):
     """Handle quick actions from dashboard"""
     action = st.session_state.quick_action
@@ -544,14 +376,15 @@ def handle_quick_action(accounts):
             
             if st.form_submit_button("Deposit"):
                 account_number = selected_account.split(" - ")[0]
-                account = db.get_account_details(account_number)
-                if account:
-                    new_balance = account[2] + amount
-                    db.update_balance(account_number, new_balance)
-                    ref_num = db.add_transaction(account_number, "deposit", amount, new_balance, "Quick deposit")
-                    st.success(f"Deposit successful! Reference: {ref_num}")
+                success, result = db.deposit(account_number, amount, "Quick deposit",
+                                             idempotency_key=get_idempotency_key("quick_deposit"))
+                if success:
+                    reset_idempotency_key("quick_deposit")
+                    st.success(f"Deposit successful! Reference: {result}")
                     del st.session_state.quick_action
                     st.rerun()
+                else:
+                    st.error(result)
     
     elif action == "withdraw":
         st.subheader("💸 Quick Withdrawal")
@@ -562,17 +395,17 @@ def handle_quick_action(accounts):
             
             if st.form_submit_button("Withdraw"):
                 account_number = selected_account.split(" - ")[0]
-                account = db.get_account_details(account_number)
-                if account and account[2] >= amount:
-                    new_balance = account[2] - amount
-                    db.update_balance(account_number, new_balance)
-                    ref_num = db.add_transaction(account_number, "withdrawal", amount, new_balance, "Quick withdrawal")
-                    st.success(f"Withdrawal successful! Reference: {ref_num}")
+                success, result = db.withdraw(account_number, amount, "Quick withdrawal",
+                                              idempotency_key=get_idempotency_key("quick_withdraw"))
+                if success:
+                    reset_idempotency_key("quick_withdraw")
+                    st.success(f"Withdrawal successful! Reference: {result}")
                     del st.session_state.quick_action
                     st.rerun()
                 else:
-                    st.error("Insufficient balance!")
+                    st.error(result)
 
+@metrics.timed("page_render_seconds", page="accounts")
 def show_accounts():
     """Display user accounts"""
     st.header("💳 My Accounts")
@@ -593,20 +426,25 @@ def show_accounts():
             </div>
             """, unsafe_allow_html=True)
             
-            # Action buttons for each account
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                if st.button(f"💰 Deposit", key=f"dep_{account[0]}"):
-                    show_deposit_form(account[0])
-            with col2:
-                if st.button(f"💸 Withdraw", key=f"with_{account[0]}"):
-                    show_withdraw_form(account[0])
-            with col3:
-                if st.button(f"📋 Transactions", key=f"txn_{account[0]}"):
-                    show_account_transactions(account[0])
+            show_account_actions(account[0])
     else:
         st.info("No accounts found. Create your first account!")
 
+@fragment
+@metrics.timed("fragment_render_seconds", fragment="account_actions")
+def show_account_actions(account_number):
+    """Action buttons for one account card; each card reruns on its own"""
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if st.button(f"💰 Deposit", key=f"dep_{account_number}"):
+            show_deposit_form(account_number)
+    with col2:
+        if st.button(f"💸 Withdraw", key=f"with_{account_number}"):
+            show_withdraw_form(account_number)
+    with col3:
+        if st.button(f"📋 Transactions", key=f"txn_{account_number}"):
+            show_account_transactions(account_number)
+
 def show_deposit_form(account_number):
     """Show deposit form for specific account"""
     st.subheader(f"💰 Deposit to Account {account_number}")
@@ -616,14 +454,15 @@ def show_deposit_form(account_number):
         description = st.text_input("Description (Optional)", placeholder="Purpose of deposit")
         
         if st.form_submit_button("Deposit"):
-            account = db.get_account_details(account_number)
-            if account:
-                new_balance = account[2] + amount
-                db.update_balance(account_number, new_balance)
-                ref_num = db.add_transaction(account_number, "deposit", amount, new_balance, 
-                                           description or "Cash deposit")
-                st.success(f"Deposit successful! Reference: {ref_num}")
+            form_name = f"deposit_{account_number}"
+            success, result = db.deposit(account_number, amount, description or "Cash deposit",
+                                         idempotency_key=get_idempotency_key(form_name))
+            if success:
+                reset_idempotency_key(form_name)
+                st.success(f"Deposit successful! Reference: {result}")
                 st.rerun()
+            else:
+                st.error(result)
 
 def show_withdraw_form(account_number):
     """Show withdrawal form for specific account"""
@@ -638,36 +477,29 @@ def show_withdraw_form(account_number):
             description = st.text_input("Description (Optional)", placeholder="Purpose of withdrawal")
             
             if st.form_submit_button("Withdraw"):
-                if amount <= account[2]:
-                    new_balance = account[2] - amount
-                    db.update_balance(account_number, new_balance)
-                    ref_num = db.add_transaction(account_number, "withdrawal", amount, new_balance, 
-                                               description or "Cash withdrawal")
-                    st.success(f"Withdrawal successful! Reference: {ref_num}")
+                form_name = f"withdraw_{account_number}"
+                success, result = db.withdraw(account_number, amount, description or "Cash withdrawal",
+                                              idempotency_key=get_idempotency_key(form_name))
+                if success:
+                    reset_idempotency_key(form_name)
+                    st.success(f"Withdrawal successful! Reference: {result}")
                     st.rerun()
                 else:
-                    st.error("Insufficient balance!")
+                    st.error(result)
 
 def show_account_transactions(account_number):
     """Show transactions for specific account"""
     st.subheader(f"📋 Transaction History - {account_number}")
     
-    transactions = db.get_transactions(account_number, 100)
+    transactions = db.get_transactions(account_number, 100, as_arrow=True)
     
-    if transactions:
-        df = pd.DataFrame(transactions, columns=[
-            'Type', 'Amount', 'Balance After', 'Description', 'Date', 'Reference'
-        ])
-        
-        # Format the dataframe
-        df['Amount'] = df['Amount'].apply(lambda x: f"₹{x:,.2f}")
-        df['Balance After'] = df['Balance After'].apply(lambda x: f"₹{x:,.2f}")
-        df['Date'] = pd.to_datetime(df['Date']).dt.strftime('%Y-%m-%d %H:%M')
-        
-        st.dataframe(df, use_container_width=True, hide_index=True)
+    if transactions.num_rows:
+        st.dataframe(label_transactions(transactions), use_container_width=True, hide_index=True,
+                     column_config=TRANSACTION_COLUMN_CONFIG)
     else:
         st.info("No transactions found for this account.")
 
+@metrics.timed("page_render_seconds", page="transactions")
 def show_transactions():
     """Display transaction management page"""
     st.header("💰 Transaction Management")
@@ -678,50 +510,70 @@ def show_transactions():
         tab1, tab2 = st.tabs(["📋 Transaction History", "🔍 Search Transactions"])
         
         with tab1:
-            # Account selector
-            account_options = ["All Accounts"] + [f"{acc[0]} - {acc[3]}" for acc in accounts]
-            selected_account = st.selectbox("Select Account", account_options)
-            
-            if selected_account == "All Accounts":
-                all_transactions = []
-                for account in accounts:
-                    transactions = db.get_transactions(account[0], 50)
-                    for txn in transactions:
-                        all_transactions.append([
-                            account[0], account[3], txn[0], txn[1], txn[2], txn[3], txn[4], txn[5]
-                        ])
-                
-                if all_transactions:
-                    df = pd.DataFrame(all_transactions, columns=[
-                        'Account Number', 'Account Holder', 'Type', 'Amount', 'Balance After', 
-                        'Description', 'Date', 'Reference'
-                    ])
-                    df['Amount'] = df['Amount'].apply(lambda x: f"₹{x:,.2f}")
-                    df['Balance After'] = df['Balance After'].apply(lambda x: f"₹{x:,.2f}")
-                    st.dataframe(df, use_container_width=True, hide_index=True)
-            else:
-                account_number = selected_account.split(" - ")[0]
-                show_account_transactions(account_number)
+            show_transaction_history()
         
         with tab2:
-            st.subheader("🔍 Search Transactions")
-            
-            col1, col2 = st.columns(2)
-            with col1:
-                search_account = st.selectbox("Account", ["All"] + [acc[0] for acc in accounts])
-                transaction_type = st.selectbox("Type", ["All", "deposit", "withdrawal", "transfer_in", "transfer_out"])
-            
-            with col2:
-                date_from = st.date_input("From Date", value=datetime.now() - timedelta(days=30))
-                date_to = st.date_input("To Date", value=datetime.now())
-            
-            min_amount = st.number_input("Minimum Amount", min_value=0.0, value=0.0)
-            max_amount = st.number_input("Maximum Amount", min_value=0.0, value=100000.0)
-            
-            if st.button("Search"):
-                # Implement search logic here
-                st.info("Search functionality will be implemented based on the criteria above.")
+            show_transaction_search()
 
+@fragment
+@metrics.timed("fragment_render_seconds", fragment="transaction_history")
+def show_transaction_history():
+    """Transaction history with its account selector, rerunning on its own"""
+    accounts = db.get_user_accounts(st.session_state.user_id)
+    
+    # Account selector
+    account_options = ["All Accounts"] + [f"{acc[0]} - {acc[3]}" for acc in accounts]
+    selected_account = st.selectbox("Select Account", account_options)
+    
+    if selected_account == "All Accounts":
+        all_transactions = load_accounts_transactions(accounts, 50)
+        
+        if all_transactions.num_rows:
+            st.dataframe(label_transactions(all_transactions), use_container_width=True, hide_index=True,
+                         column_config=TRANSACTION_COLUMN_CONFIG)
+    else:
+        account_number = selected_account.split(" - ")[0]
+        show_account_transactions(account_number)
+
+@fragment
+@metrics.timed("fragment_render_seconds", fragment="transaction_search")
+def show_transaction_search():
+    """Transaction search form and results, rerunning on its own"""
+    accounts = db.get_user_accounts(st.session_state.user_id)
+    
+    st.subheader("🔍 Search Transactions")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        search_account = st.selectbox("Account", ["All"] + [acc[0] for acc in accounts])
+        transaction_type = st.selectbox("Type", ["All", "deposit", "withdrawal", "transfer_in", "transfer_out"])
+    
+    with col2:
+        date_from = st.date_input("From Date", value=datetime.now() - timedelta(days=30))
+        date_to = st.date_input("To Date", value=datetime.now())
+    
+    min_amount = st.number_input("Minimum Amount", min_value=0.0, value=0.0)
+    max_amount = st.number_input("Maximum Amount", min_value=0.0, value=100000.0)
+    
+    if st.button("Search"):
+        search_accounts = [acc[0] for acc in accounts] if search_account == "All" else [search_account]
+        results = db.search_transactions(
+            search_accounts,
+            transaction_type=None if transaction_type == "All" else transaction_type,
+            date_from=date_from, date_to=date_to,
+            min_amount=min_amount, max_amount=max_amount, as_arrow=True
+        )
+        
+        if results.num_rows:
+            table = label_transactions(results)
+            st.dataframe(table, use_container_width=True, hide_index=True,
+                         column_config=TRANSACTION_COLUMN_CONFIG)
+            st.download_button("📥 Export CSV", to_pandas(table).to_csv(index=False), 
+                               file_name="transactions.csv", mime="text/csv")
+        else:
+            st.info("No transactions match the search criteria.")
+
+@metrics.timed("page_render_seconds", page="transfer")
 def show_transfer():
     """Display money transfer page"""
     st.header("🔄 Transfer Money")
@@ -729,36 +581,47 @@ def show_transfer():
     accounts = db.get_user_accounts(st.session_state.user_id)
     
     if len(accounts) >= 1:
-        with st.form("transfer_form"):
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.subheader("From Account")
-                from_options = [f"{acc[0]} - {acc[3]} (₹{acc[2]:,.2f})" for acc in accounts]
-                from_account = st.selectbox("Select Source Account", from_options)
-                
-            with col2:
-                st.subheader("To Account")
-                to_account = st.text_input("Destination Account Number", placeholder="Enter account number")
+        show_transfer_form()
+    else:
+        st.info("You need at least one account to make transfers.")
+
+@fragment
+@metrics.timed("fragment_render_seconds", fragment="transfer_form")
+def show_transfer_form():
+    """Transfer form; submitting it reruns only this fragment until the transfer goes through"""
+    accounts = db.get_user_accounts(st.session_state.user_id)
+    
+    with st.form("transfer_form"):
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.subheader("From Account")
+            from_options = [f"{acc[0]} - {acc[3]} (₹{acc[2]:,.2f})" for acc in accounts]
+            from_account = st.selectbox("Select Source Account", from_options)
             
-            amount = st.number_input("Transfer Amount", min_value=1.0, step=1.0)
-            description = st.text_input("Description (Optional)", placeholder="Purpose of transfer")
+        with col2:
+            st.subheader("To Account")
+            to_account = st.text_input("Destination Account Number", placeholder="Enter account number")
+        
+        amount = st.number_input("Transfer Amount", min_value=1.0, step=1.0)
+        description = st.text_input("Description (Optional)", placeholder="Purpose of transfer")
+        
+        if st.form_submit_button("Transfer Money", use_container_width=True):
+            from_acc_number = from_account.split(" - ")[0]
             
-            if st.form_submit_button("Transfer Money", use_container_width=True):
-                from_acc_number = from_account.split(" - ")[0]
-                
-                if from_acc_number != to_account:
-                    success, message = db.transfer_money(from_acc_number, to_account, amount)
-                    if success:
-                        st.success(message)
-                        st.rerun()
-                    else:
-                        st.error(message)
+            if from_acc_number != to_account:
+                success, message = db.transfer_money(from_acc_number, to_account, amount,
+                                                     idempotency_key=get_idempotency_key("transfer"))
+                if success:
+                    reset_idempotency_key("transfer")
+                    st.success(message)
+                    st.rerun()
                 else:
-                    st.error("Cannot transfer to the same account!")
-    else:
-        st.info("You need at least one account to make transfers.")
+                    st.error(message)
+            else:
+                st.error("Cannot transfer to the same account!")
 
+@metrics.timed("page_render_seconds", page="new_account")
 def show_new_account():
     """Display new account creation page"""
     st.header("➕ Open New Account")
@@ -796,6 +659,7 @@ def show_new_account():
             else:
                 st.error("Please fill in all required fields and accept terms!")
 
+@metrics.timed("page_render_seconds", page="analytics")
 def show_analytics():
     """Display analytics and insights page"""
     st.header("📊 Analytics & Insights")
@@ -836,36 +700,23 @@ def show_analytics():
             st.plotly_chart(fig_bar, use_container_width=True)
         
         # Transaction trends
-        st.subheader("📈 Transaction Trends (Last 30 Days)")
+        st.subheader("📈 Transaction Trends")
         
-        # Collect transaction data
-        all_transactions = []
-        for account in accounts:
-            transactions = db.get_transactions(account[0], 100)
-            for txn in transactions:
-                txn_date = datetime.strptime(txn[4], '%Y-%m-%d %H:%M:%S')
-                if txn_date >= datetime.now() - timedelta(days=30):
-                    all_transactions.append({
-                        'Date': txn_date.date(),
-                        'Type': txn[0],
-                        'Amount': txn[1],
-                        'Account': account[0]
-                    })
-        
-        if all_transactions:
-            df_txn = pd.DataFrame(all_transactions)
-            
-            # Daily transaction volume
-            daily_volume = df_txn.groupby('Date')['Amount'].sum().reset_index()
-            fig_line = px.line(daily_volume, x='Date', y='Amount', 
-                             title="Daily Transaction Volume",
+        trend_range = st.selectbox("Range", list(TREND_RANGES), key="trend_range")
+        days = TREND_RANGES[trend_range]
+        since = datetime.now() - timedelta(days=days) if days else None
+        
+        daily_volume, type_summary, monthly_flows = load_transaction_trends(accounts, since)
+        
+        if daily_volume is not None and not daily_volume.empty:
+            # Day, week or month buckets depending on the range, so the chart stays small
+            volume, granularity = aggregate_series(daily_volume, 'Date', 'Amount',
+                                                   since, datetime.now() if since else None)
+            fig_line = px.line(volume, x='Date', y='Amount', 
+                             title=f"Transaction Volume per {granularity.title()}",
                              labels={'Amount': 'Amount (₹)'})
             st.plotly_chart(fig_line, use_container_width=True)
             
-            # Transaction type breakdown
-            type_summary = df_txn.groupby('Type')['Amount'].agg(['count', 'sum']).reset_index()
-            type_summary.columns = ['Transaction Type', 'Count', 'Total Amount']
-            
             col1, col2 = st.columns(2)
             with col1:
                 st.subheader("📊 Transaction Summary")
@@ -873,27 +724,95 @@ def show_analytics():
             
             with col2:
                 # Monthly spending pattern
-                if len(all_transactions) > 0:
-                    withdrawal_data = df_txn[df_txn['Type'].isin(['withdrawal', 'transfer_out'])]
-                    if not withdrawal_data.empty:
-                        monthly_spending = withdrawal_data.groupby(withdrawal_data['Date'].dt.to_period('M'))['Amount'].sum()
-                        st.metric("💸 Monthly Spending", f"₹{monthly_spending.iloc[-1]:,.2f}" if len(monthly_spending) > 0 else "₹0")
-                    
-                    deposit_data = df_txn[df_txn['Type'].isin(['deposit', 'transfer_in'])]
-                    if not deposit_data.empty:
-                        monthly_income = deposit_data.groupby(deposit_data['Date'].dt.to_period('M'))['Amount'].sum()
-                        st.metric("💰 Monthly Income", f"₹{monthly_income.iloc[-1]:,.2f}" if len(monthly_income) > 0 else "₹0")
+                if monthly_flows is not None and not monthly_flows.empty:
+                    latest_month = monthly_flows.iloc[-1]
+                    st.metric("💸 Monthly Spending", f"₹{latest_month['Spending']:,.2f}")
+                    st.metric("💰 Monthly Income", f"₹{latest_month['Income']:,.2f}")
+            
+            # Spending split by category (from the indexed category column)
+            categories = db.spending_by_category([acc[0] for acc in accounts], since)
+            if categories:
+                st.subheader("🧾 Spending by Category")
+                df_categories = pd.DataFrame(categories, columns=['Category', 'Count', 'Amount'])
+                fig_categories = px.bar(df_categories, x='Category', y='Amount', hover_data=['Count'],
+                                        labels={'Amount': 'Amount (₹)'})
+                st.plotly_chart(fig_categories, use_container_width=True)
+            
+            show_balance_history([acc[0] for acc in accounts], since)
         else:
-            st.info("No transactions in the last 30 days to analyze.")
+            st.info("No transactions in this range to analyze.")
     
     else:
         st.info("No accounts found to analyze.")
 
+@fragment
+@metrics.timed("fragment_render_seconds", fragment="balance_history")
+def show_balance_history(account_numbers, since):
+    """Running balance of one account, thinned to a fixed number of points; picking another reruns only this"""
+    st.subheader("💹 Balance History")
+    history_account = st.selectbox("Account", account_numbers, key="history_account")
+    history = load_balance_history(history_account, since)
+    if history is not None and not history.empty:
+        fig_balance = px.line(downsample(history, 'Time', 'Balance'), x='Time', y='Balance',
+                              labels={'Balance': 'Balance (₹)'})
+        st.plotly_chart(fig_balance, use_container_width=True)
+
+def load_transaction_trends(accounts, since=None):
+    """Daily volume and type breakdown since `since` (all history if None), plus monthly income/spending"""
+    account_numbers = [account[0] for account in accounts]
+    
+    # The Parquet copy mirrors one database file, so sharded ledgers take the per-account path
+    analytics = get_analytics_engine(db.db_path, db.replica) if not isinstance(db, ShardedBankDatabase) else None
+    if analytics:
+        # Vectorized path: DuckDB over the incrementally synced Parquet copy of the ledger
+        analytics.sync()
+        return (analytics.daily_volume(account_numbers, since),
+                analytics.type_breakdown(account_numbers, since),
+                analytics.monthly_flows(account_numbers))
+    
+    transactions = pa.concat_tables([db.get_transactions(account[0], 100, snapshot=True, as_arrow=True)
+                                     for account in accounts])
+    df_txn = to_chart_frame(transactions.select(['timestamp', 'transaction_type', 'amount']))
+    df_txn.columns = ['Date', 'Type', 'Amount']
+    if since is not None:
+        df_txn = df_txn[df_txn['Date'] >= since]
+    
+    if df_txn.empty:
+        return None, None, None
+    
+    df_txn['Date'] = df_txn['Date'].dt.normalize()
+    daily_volume = df_txn.groupby('Date')['Amount'].sum().reset_index()
+    
+    type_summary = df_txn.groupby('Type')['Amount'].agg(['count', 'sum']).reset_index()
+    type_summary.columns = ['Transaction Type', 'Count', 'Total Amount']
+    
+    df_txn['Month'] = pd.to_datetime(df_txn['Date']).dt.to_period('M').dt.to_timestamp()
+    df_txn['Income'] = df_txn['Amount'].where(df_txn['Type'].isin(['deposit', 'transfer_in']), 0)
+    df_txn['Spending'] = df_txn['Amount'].where(df_txn['Type'].isin(['withdrawal', 'transfer_out']), 0)
+    monthly_flows = df_txn.groupby('Month')[['Income', 'Spending']].sum().reset_index()
+    
+    return daily_volume, type_summary, monthly_flows
+
+def load_balance_history(account_number, since=None):
+    """Balance after each transaction on one account, oldest first"""
+    analytics = get_analytics_engine(db.db_path, db.replica) if not isinstance(db, ShardedBankDatabase) else None
+    if analytics:
+        return analytics.balance_history(account_number, since)
+    
+    transactions = db.get_transactions(account_number, 5000, snapshot=True, as_arrow=True)
+    history = to_chart_frame(transactions.select(['timestamp', 'balance_after']))
+    history.columns = ['Time', 'Balance']
+    history = history.iloc[::-1].reset_index(drop=True)
+    if since is not None:
+        history = history[history['Time'] >= since]
+    return history
+
+@metrics.timed("page_render_seconds", page="settings")
 def show_settings():
     """Display settings page"""
     st.header("⚙️ Settings")
     
-    tab1, tab2, tab3 = st.tabs(["👤 Profile", "🔐 Security", "🎨 Preferences"])
+    tab1, tab2, tab3, tab4 = st.tabs(["👤 Profile", "🔐 Security", "🎨 Preferences", "🧰 Background Jobs"])
     
     with tab1:
         st.subheader("Profile Information")
@@ -919,14 +838,86 @@ def show_settings():
         st.checkbox("Enable 2FA (Coming Soon)", disabled=True)
     
     with tab3:
-        st.subheader("App Preferences")
-        
-        theme = st.selectbox("Theme", ["Light", "Dark", "Auto"])
-        currency = st.selectbox("Currency", ["INR (₹)", "USD ($)", "EUR (€)"])
-        language = st.selectbox("Language", ["English", "Hindi", "Tamil", "Telugu"])
-        
-        if st.button("Save Preferences"):
-            st.success("Preferences saved!")
+        show_preferences()
+    
+    with tab4:
+        show_background_jobs()
+
+@fragment
+@metrics.timed("fragment_render_seconds", fragment="preferences")
+def show_preferences():
+    """App preference widgets, rerunning on their own"""
+    st.subheader("App Preferences")
+    
+    theme = st.selectbox("Theme", ["Light", "Dark", "Auto"])
+    currency = st.selectbox("Currency", ["INR (₹)", "USD ($)", "EUR (€)"])
+    language = st.selectbox("Language", ["English", "Hindi", "Tamil", "Telugu"])
+    
+    if st.button("Save Preferences"):
+        st.success("Preferences saved!")
+
+@fragment
+@metrics.timed("fragment_render_seconds", fragment="background_jobs")
+def show_background_jobs():
+    """Queue exports and reconciliations of the user's accounts and follow their progress"""
+    st.subheader("Background Jobs")
+    
+    # Job handlers open one database file, like the Parquet analytics copy
+    if isinstance(db, ShardedBankDatabase):
+        st.info("Background jobs are not available for sharded databases yet.")
+        return
+    
+    jobs = get_job_queue(db.db_path)
+    owner = str(st.session_state.user_id)
+    account_numbers = [account[0] for account in db.get_user_accounts(st.session_state.user_id)]
+    
+    # Jobs someone is waiting for go ahead of batch work queued from the command line
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if st.button("📥 Export My Transactions", use_container_width=True, disabled=not account_numbers):
+            path = os.path.join(EXPORT_DIR, f"transactions-{owner}-{uuid.uuid4().hex[:8]}.csv")
+            jobs.enqueue("export_transactions", {"account_numbers": account_numbers, "path": path},
+                         priority=10, owner=owner)
+    
+    with col2:
+        if st.button("🧮 Reconcile My Balances", use_container_width=True, disabled=not account_numbers):
+            jobs.enqueue("reconciliation", {"account_numbers": account_numbers}, priority=10, owner=owner)
+    
+    with col3:
+        st.button("🔄 Refresh", use_container_width=True)
+    
+    st.caption("Jobs run in the worker daemon (`python job_queue.py work`), not in this page.")
+    
+    for job in jobs.recent(owner=owner, limit=10):
+        title = f"#{job['id']} {job['kind'].replace('_', ' ').title()} · {job['status']}"
+        if job['status'] in (QUEUED, RUNNING):
+            st.progress(job['progress'], text=f"{title} · {job['message'] or 'waiting for a worker'}")
+        elif job['status'] == SUCCEEDED:
+            st.success(title)
+            result = job['result'] or {}
+            if job['kind'] == "export_transactions" and os.path.exists(result.get("path", "")):
+                prepared = st.session_state.setdefault("prepared_exports", set())
+                if os.path.getsize(result["path"]) > EXPORT_DOWNLOAD_LIMIT_BYTES:
+                    st.info(f"{result['rows']:,} transactions is too large to download here; "
+                            f"the file is at `{result['path']}`")
+                elif job['id'] in prepared or st.button(f"📄 Prepare {result['rows']:,} transactions for download",
+                                                        key=f"job_prepare_{job['id']}"):
+                    prepared.add(job['id'])
+                    with open(result["path"], "rb") as f:
+                        st.download_button(f"📥 Download {result['rows']:,} transactions", f.read(),
+                                           file_name=os.path.basename(result["path"]), mime="text/csv",
+                                           key=f"job_download_{job['id']}",
+                                           on_click=prepared.discard, args=(job['id'],))
+            elif job['kind'] == "reconciliation":
+                if result.get("mismatches"):
+                    st.warning(f"{len(result['mismatches'])} of {result['accounts']} accounts do not match their ledger")
+                    st.dataframe(pd.DataFrame(result["mismatches"]), use_container_width=True, hide_index=True)
+                else:
+                    st.info(f"All {result.get('accounts', 0)} accounts match their ledger")
+        elif job['status'] == FAILED:
+            st.error(f"{title} after {job['attempts']} attempts: {job['error']}")
+        else:
+            st.caption(title)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,197 @@
+"""
+Spend categorization for SecureBank Pro
+Assigns a category ("Salary", "Bills", "Loan EMI", ...) to every ledger
+row from keywords in its free-text description. New rows are categorized
+inline on insert with an Aho-Corasick automaton over all keywords (one
+pass over the description however many rules there are); the existing
+ledger is backfilled in chunks on a process pool with vectorized pandas
+string matching. Both give the same answer: the first category in file
+order with a keyword in the description as a whole word (so "Insurance"
+is not a loan EMI), otherwise a fallback by transaction type.
+"""
+
+import json
+import re
+import sqlite3
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+DEFAULT_CATEGORIES_PATH = "spend_categories.json"
+
+DEFAULT_CATEGORIES = [
+    {"name": "Salary", "keywords": ["salary", "payroll", "wages"]},
+    {"name": "Interest & Dividends", "keywords": ["interest", "dividend", "dividends"]},
+    {"name": "Loan EMI", "keywords": ["emi", "loan", "loans"]},
+    {"name": "Bills & Utilities", "keywords": ["bill", "bills", "electricity", "recharge", "utility", "utilities"]},
+    {"name": "Shopping", "keywords": ["purchase", "purchases", "shopping", "store", "stores"]},
+    {"name": "Cash", "keywords": ["atm", "cash"]},
+    {"name": "Transfers", "keywords": ["transfer", "transfers"]},
+]
+
+TYPE_FALLBACKS = {"transfer_in": "Transfers", "transfer_out": "Transfers"}
+UNCATEGORIZED = "Uncategorized"
+
+_categorizers = {}
+_categorizers_lock = threading.Lock()
+
+
+def _is_word_char(char):
+    """Same notion of a word character as the regex \\b used by categorize_frame"""
+    return char.isalnum() or char == "_"
+
+
+def load_categories(path=DEFAULT_CATEGORIES_PATH):
+    """Category rules from the JSON file, or the built-in defaults if it is missing"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)["categories"]
+    except FileNotFoundError:
+        return DEFAULT_CATEGORIES
+
+
+class Categorizer:
+    """Aho-Corasick automaton mapping description keywords to categories"""
+
+    def __init__(self, categories=None):
+        self.categories = categories if categories is not None else load_categories()
+        # Per-node transitions, failure links and the (rule index, length) of every keyword ending there
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [()]
+        for priority, category in enumerate(self.categories):
+            for keyword in category["keywords"]:
+                self._add_keyword(keyword.lower(), priority)
+        self._build_failure_links()
+
+    def _add_keyword(self, keyword, priority):
+        node = 0
+        for char in keyword:
+            if char not in self.goto[node]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(())
+                self.goto[node][char] = len(self.goto) - 1
+            node = self.goto[node][char]
+        self.output[node] += ((priority, len(keyword)),)
+
+    def _build_failure_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                # A node also matches everything its failure target matches
+                self.output[child] = tuple(sorted(self.output[child] + self.output[self.fail[child]]))
+
+    def categorize(self, description, transaction_type=None):
+        """Category of one ledger row"""
+        text = (description or "").lower()
+        best = None
+        node = 0
+        for end, char in enumerate(text):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            if not self.output[node] or (end + 1 < len(text) and _is_word_char(text[end + 1])):
+                continue
+            # Outputs are sorted by rule index, so the first whole-word keyword is the best here
+            for priority, length in self.output[node]:
+                if best is not None and priority >= best:
+                    break
+                start = end - length + 1
+                if start == 0 or not _is_word_char(text[start - 1]):
+                    best = priority
+                    break
+            if best == 0:
+                break
+        if best is not None:
+            return self.categories[best]["name"]
+        return TYPE_FALLBACKS.get(transaction_type, UNCATEGORIZED)
+
+    def categorize_frame(self, df):
+        """Vectorized categories for a DataFrame with description and transaction_type columns"""
+        descriptions = df["description"].fillna("").str.lower()
+        result = pd.Series(pd.NA, index=df.index, dtype="object")
+        for category in self.categories:
+            pattern = r"\b(?:" + "|".join(re.escape(keyword.lower()) for keyword in category["keywords"]) + r")\b"
+            result = result.mask(result.isna() & descriptions.str.contains(pattern, regex=True), category["name"])
+        fallback = df["transaction_type"].map(TYPE_FALLBACKS).fillna(UNCATEGORIZED)
+        return result.fillna(fallback)
+
+
+def get_categorizer(path=DEFAULT_CATEGORIES_PATH):
+    """Process-wide categorizer for a rules file"""
+    with _categorizers_lock:
+        categorizer = _categorizers.get(path)
+        if categorizer is None:
+            categorizer = _categorizers[path] = Categorizer(load_categories(path))
+        return categorizer
+
+
+def _categorize_range(db_path, first_id, last_id):
+    """Worker: categories for the uncategorized rows in an id range, as (category, id) pairs"""
+    conn = sqlite3.connect(db_path)
+    try:
+        df = pd.read_sql_query('''
+            SELECT id, description, transaction_type FROM transactions
+            WHERE id BETWEEN ? AND ? AND category IS NULL
+        ''', conn, params=(first_id, last_id))
+    finally:
+        conn.close()
+    if df.empty:
+        return []
+    return list(zip(get_categorizer().categorize_frame(df), df["id"].tolist()))
+
+
+def backfill_categories(db_path="bank_system.db", chunk_size=50000, workers=None, recategorize=False):
+    """Categorize existing ledger rows in id-range chunks on a process pool
+
+    Workers read and categorize their chunk; this process writes each chunk
+    back in its own short transaction, so the app keeps writing meanwhile
+    and an interrupted backfill resumes where it stopped (rows still NULL).
+    """
+    # Opening the database runs its migrations, which add the category column
+    from bank_database import BankDatabase
+    BankDatabase(db_path)
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        if recategorize:
+            conn.execute("UPDATE transactions SET category = NULL")
+            conn.commit()
+        first_id, last_id = conn.execute(
+            "SELECT MIN(id), MAX(id) FROM transactions WHERE category IS NULL"
+        ).fetchone()
+        if first_id is None:
+            return 0
+
+        ranges = [(start, min(start + chunk_size - 1, last_id))
+                  for start in range(first_id, last_id + 1, chunk_size)]
+        updated = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_categorize_range, db_path, start, end) for start, end in ranges]
+            for future in futures:
+                rows = future.result()
+                # Only fill rows still NULL, in case the app categorized them in the meantime
+                conn.executemany("UPDATE transactions SET category = ? WHERE id = ? AND category IS NULL", rows)
+                conn.commit()
+                updated += len(rows)
+        return updated
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    import time
+
+    started = time.perf_counter()
+    count = backfill_categories(recategorize="--all" in sys.argv)
+    print(f"Categorized {count:,} transactions in {time.perf_counter() - started:.1f}s")
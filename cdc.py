@@ -0,0 +1,213 @@
+"""
+Change data capture for SecureBank Pro
+Ledger writes are copied into a `cdc_outbox` table in the same database
+transaction, and a publisher thread streams new outbox rows in batches to
+subscribers (callbacks, a JSONL file or a local socket). Each subscriber has
+its own offset in `cdc_offsets`, which only moves after a batch was delivered,
+so consumers get at-least-once delivery and never poll the `transactions` table.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+
+_publishers = []
+
+
+def init_outbox(cursor):
+    """Create the outbox and subscriber offset tables"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cdc_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            operation TEXT NOT NULL,
+            row_data TEXT NOT NULL,
+            committed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cdc_offsets (
+            subscriber TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+def publish_change(cursor, table_name, operation, row):
+    """Record a change in the outbox using the caller's cursor (same transaction)"""
+    cursor.execute(
+        "INSERT INTO cdc_outbox (table_name, operation, row_data) VALUES (?, ?, ?)",
+        (table_name, operation, json.dumps(row))
+    )
+
+
+def publish_changes(cursor, table_name, operation, rows):
+    """Record many changes in one executemany call (bulk write paths)"""
+    cursor.executemany(
+        "INSERT INTO cdc_outbox (table_name, operation, row_data) VALUES (?, ?, ?)",
+        [(table_name, operation, json.dumps(row)) for row in rows]
+    )
+
+
+def notify_committed():
+    """Wake in-process publishers after a commit that wrote to the outbox"""
+    for publisher in _publishers:
+        publisher.wake()
+
+
+class CallbackSink:
+    """Deliver each batch to a Python callable"""
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def deliver(self, changes):
+        self.callback(changes)
+
+
+class JsonlFileSink:
+    """Append each change as one JSON line, fsynced per batch"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def deliver(self, changes):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for change in changes:
+                f.write(json.dumps(change) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class SocketSink:
+    """Send newline-delimited JSON to a local TCP listener"""
+
+    def __init__(self, host="127.0.0.1", port=9099, timeout=5.0):
+        self.address = (host, port)
+        self.timeout = timeout
+        self._sock = None
+
+    def deliver(self, changes):
+        payload = "".join(json.dumps(change) + "\n" for change in changes).encode("utf-8")
+        try:
+            if self._sock is None:
+                self._sock = socket.create_connection(self.address, timeout=self.timeout)
+            self._sock.sendall(payload)
+        except OSError:
+            # Drop the connection so the batch is retried on a fresh one
+            self.close()
+            raise
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+class CDCPublisher:
+    """Streams outbox rows to subscribers in batches"""
+
+    def __init__(self, db_path, batch_size=500, idle_interval=5.0):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.idle_interval = idle_interval
+        self.subscribers = {}
+        self.errors = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        conn = sqlite3.connect(self.db_path)
+        init_outbox(conn.cursor())
+        conn.commit()
+        conn.close()
+
+    def subscribe(self, name, sink):
+        """Register a sink; a new subscriber starts from the beginning of the outbox"""
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT OR IGNORE INTO cdc_offsets (subscriber, last_id) VALUES (?, 0)", (name,))
+        conn.commit()
+        conn.close()
+        self.subscribers[name] = sink
+
+    def _deliver_pending(self, conn, name, sink):
+        """Deliver all pending changes to one subscriber; returns the number delivered"""
+        delivered = 0
+        while True:
+            last_id = conn.execute("SELECT last_id FROM cdc_offsets WHERE subscriber = ?",
+                                   (name,)).fetchone()[0]
+            rows = conn.execute('''
+                SELECT id, table_name, operation, row_data, committed_at
+                FROM cdc_outbox WHERE id > ? ORDER BY id LIMIT ?
+            ''', (last_id, self.batch_size)).fetchall()
+            if not rows:
+                return delivered
+
+            changes = [
+                {"offset": row[0], "table": row[1], "operation": row[2],
+                 "row": json.loads(row[3]), "committed_at": row[4]}
+                for row in rows
+            ]
+            sink.deliver(changes)
+
+            # Only acknowledge after the sink accepted the whole batch
+            conn.execute("UPDATE cdc_offsets SET last_id = ? WHERE subscriber = ?", (rows[-1][0], name))
+            conn.commit()
+            delivered += len(rows)
+
+    def run_once(self):
+        """Deliver everything pending to every subscriber"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        results = {}
+        try:
+            for name, sink in list(self.subscribers.items()):
+                try:
+                    results[name] = self._deliver_pending(conn, name, sink)
+                    self.errors.pop(name, None)
+                except Exception as e:
+                    # A failing subscriber keeps its offset and is retried on the next run
+                    self.errors[name] = str(e)
+                    results[name] = 0
+        finally:
+            conn.close()
+        return results
+
+    def prune(self):
+        """Delete outbox rows every subscriber has already received"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            min_offset = conn.execute("SELECT MIN(last_id) FROM cdc_offsets").fetchone()[0]
+            if min_offset is None:
+                return 0
+            removed = conn.execute("DELETE FROM cdc_outbox WHERE id <= ?", (min_offset,)).rowcount
+            conn.commit()
+            return removed
+        finally:
+            conn.close()
+
+    def wake(self):
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._wake.wait(self.idle_interval)
+            self._wake.clear()
+
+    def start(self):
+        """Run the publisher in a background thread, woken by notify_committed()"""
+        if self._thread is None:
+            _publishers.append(self)
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="cdc-publisher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+            _publishers.remove(self)
@@ -8,11 +8,11 @@ import bcrypt
 import random
 from datetime import datetime, timedelta
 
-def create_demo_data():
-    """Create demo users, accounts, and transactions"""
+def create_demo_data(db_path="bank_system.db"):
+    """Create demo users, accounts, and transactions; returns whether it succeeded"""
     
     # Database connection
-    conn = sqlite3.connect("bank_system.db")
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     
     try:
@@ -165,6 +165,8 @@ def create_demo_data():
                         days_ago = random.randint(1, 15)
                         transfer_date = datetime.now() - timedelta(days=days_ago)
                         ref_num = f"TXN{random.randint(1000000000, 9999999999)}"
+                        # reference_number is unique, so the incoming leg gets its own
+                        ref_num_in = f"TXN{random.randint(1000000000, 9999999999)}"
                         
                         cursor.execute('''
                             INSERT INTO transactions 
@@ -180,7 +182,7 @@ def create_demo_data():
                              reference_number, timestamp)
                             VALUES (?, ?, ?, ?, ?, ?, ?)
                         ''', (to_acc, "transfer_in", amount, new_to_balance, 
-                              f"Transfer from {from_acc}", ref_num, transfer_date))
+                              f"Transfer from {from_acc}", ref_num_in, transfer_date))
                         
                         print(f"Created transfer: {from_acc} → {to_acc} (₹{amount:,.2f})")
         
@@ -196,10 +198,12 @@ def create_demo_data():
         
         print("\n🏦 Demo accounts and transactions have been created!")
         print("You can now login to the app and explore the features.")
+        return True
         
     except Exception as e:
         conn.rollback()
         print(f"❌ Error creating demo data: {e}")
+        return False
     
     finally:
         conn.close()
@@ -0,0 +1,380 @@
+"""
+Event log for SecureBank Pro
+Every money movement is appended to an append-only `events` table in the same
+database transaction as the balance update. Balances, daily statistics and the
+account search index are projections built from that log; each projection
+keeps its own offset so it can catch up incrementally or be rebuilt from
+scratch. Catching up feeds all projections from one pass over the log; a
+rebuild splits the log into account ranges and replays them in parallel.
+"""
+
+import json
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+ACCOUNT_OPENED = "AccountOpened"
+DEPOSITED = "Deposited"
+WITHDRAWN = "Withdrawn"
+TRANSFER_POSTED = "TransferPosted"
+
+
+def init_event_log(cursor):
+    """Create the event log and the projection offset table"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_type TEXT NOT NULL,
+            account_number TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_events_account
+        ON events (account_number, seq)
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS projection_offsets (
+            projection TEXT PRIMARY KEY,
+            last_seq INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+def append_event(cursor, event_type, account_number, payload):
+    """Append an event using the caller's cursor and return its sequence number"""
+    cursor.execute(
+        "INSERT INTO events (event_type, account_number, payload) VALUES (?, ?, ?)",
+        (event_type, account_number, json.dumps(payload))
+    )
+    return cursor.lastrowid
+
+
+def append_events(cursor, events):
+    """Append many (event_type, account_number, payload) events in one call"""
+    cursor.executemany(
+        "INSERT INTO events (event_type, account_number, payload) VALUES (?, ?, ?)",
+        [(event_type, account_number, json.dumps(payload)) for event_type, account_number, payload in events]
+    )
+
+
+def _range_condition(column, lower, upper):
+    """SQL condition for lower < column <= upper, with its parameters; a None bound is open"""
+    conditions, params = [], []
+    if lower is not None:
+        conditions.append(f"{column} > ?")
+        params.append(lower)
+    if upper is not None:
+        conditions.append(f"{column} <= ?")
+        params.append(upper)
+    return " AND ".join(conditions) or "1", params
+
+
+def _rebuild_range(db_path, staging_path, projection_classes, lower, upper, last_seq, batch_size):
+    """Replay the events touching one account range into a staging database (runs in a worker process)"""
+    projections = [projection_class() for projection_class in projection_classes]
+    source = sqlite3.connect(db_path, timeout=30)
+    staging = sqlite3.connect(staging_path)
+    # Scratch file, removed after the merge: nothing to recover after a crash
+    staging.execute("PRAGMA journal_mode = OFF")
+    staging.execute("PRAGMA synchronous = OFF")
+    cursor = staging.cursor()
+    for projection in projections:
+        projection.init_tables(cursor)
+
+    own, own_params = _range_condition("account_number", lower, upper)
+    # Transfer events are keyed by the source account, so the receiving side is matched on the payload
+    received, received_params = _range_condition("json_extract(payload, '$.to_account')", lower, upper)
+    try:
+        events = source.execute(f'''
+            SELECT seq, event_type, account_number, payload, created_at FROM events
+            WHERE seq <= ? AND (({own}) OR (event_type = ? AND {received}))
+            ORDER BY seq
+        ''', [last_seq] + own_params + [TRANSFER_POSTED] + received_params)
+        while True:
+            batch = events.fetchmany(batch_size)
+            if not batch:
+                break
+            for seq, event_type, account_number, payload, created_at in batch:
+                payload = json.loads(payload)
+                for projection in projections:
+                    projection.apply(cursor, event_type, account_number, payload, created_at)
+            staging.commit()
+    finally:
+        source.close()
+        staging.close()
+
+
+class Projection:
+    """Base class for a read model maintained from the event log
+
+    Every table row belongs to the account in its `account_number` column,
+    which is what lets a rebuild replay account ranges independently.
+    """
+    name = None
+    tables = ()
+
+    def init_tables(self, cursor):
+        raise NotImplementedError
+
+    def reset(self, cursor):
+        for table in self.tables:
+            cursor.execute(f"DELETE FROM {table}")
+
+    def apply(self, cursor, event_type, account_number, payload, created_at):
+        raise NotImplementedError
+
+
+class BalanceProjection(Projection):
+    """Current balance per account"""
+    name = "balances"
+    tables = ("projected_balances",)
+
+    def init_tables(self, cursor):
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS projected_balances (
+                account_number TEXT PRIMARY KEY,
+                balance REAL NOT NULL
+            )
+        ''')
+
+    def _set_balance(self, cursor, account_number, balance):
+        cursor.execute(
+            "INSERT OR REPLACE INTO projected_balances (account_number, balance) VALUES (?, ?)",
+            (account_number, balance)
+        )
+
+    def apply(self, cursor, event_type, account_number, payload, created_at):
+        if event_type == ACCOUNT_OPENED:
+            self._set_balance(cursor, account_number, payload["initial_deposit"])
+        elif event_type in (DEPOSITED, WITHDRAWN):
+            self._set_balance(cursor, account_number, payload["balance_after"])
+        elif event_type == TRANSFER_POSTED:
+            self._set_balance(cursor, payload["from_account"], payload["from_balance_after"])
+            self._set_balance(cursor, payload["to_account"], payload["to_balance_after"])
+
+
+class DailyStatsProjection(Projection):
+    """Money in and out per account per day"""
+    name = "daily_stats"
+    tables = ("projected_daily_stats",)
+
+    def init_tables(self, cursor):
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS projected_daily_stats (
+                account_number TEXT NOT NULL,
+                day TEXT NOT NULL,
+                money_in REAL NOT NULL DEFAULT 0,
+                money_out REAL NOT NULL DEFAULT 0,
+                transaction_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (account_number, day)
+            )
+        ''')
+
+    def _add(self, cursor, account_number, day, money_in, money_out):
+        cursor.execute('''
+            INSERT INTO projected_daily_stats (account_number, day, money_in, money_out, transaction_count)
+            VALUES (?, ?, ?, ?, 1)
+            ON CONFLICT (account_number, day) DO UPDATE SET
+                money_in = money_in + excluded.money_in,
+                money_out = money_out + excluded.money_out,
+                transaction_count = transaction_count + 1
+        ''', (account_number, day, money_in, money_out))
+
+    def apply(self, cursor, event_type, account_number, payload, created_at):
+        day = created_at[:10]
+        if event_type == ACCOUNT_OPENED and payload["initial_deposit"] > 0:
+            self._add(cursor, account_number, day, payload["initial_deposit"], 0)
+        elif event_type == DEPOSITED:
+            self._add(cursor, account_number, day, payload["amount"], 0)
+        elif event_type == WITHDRAWN:
+            self._add(cursor, account_number, day, 0, payload["amount"])
+        elif event_type == TRANSFER_POSTED:
+            self._add(cursor, payload["from_account"], day, 0, payload["amount"])
+            self._add(cursor, payload["to_account"], day, payload["amount"], 0)
+
+
+class AccountSearchProjection(Projection):
+    """Case-insensitive lookup of accounts by holder name"""
+    name = "account_search"
+    tables = ("projected_account_search",)
+
+    def init_tables(self, cursor):
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS projected_account_search (
+                account_number TEXT PRIMARY KEY,
+                user_id INTEGER,
+                account_type TEXT NOT NULL,
+                holder_name TEXT NOT NULL,
+                holder_name_lower TEXT NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_account_search_name
+            ON projected_account_search (holder_name_lower)
+        ''')
+
+    def apply(self, cursor, event_type, account_number, payload, created_at):
+        if event_type == ACCOUNT_OPENED:
+            cursor.execute('''
+                INSERT OR REPLACE INTO projected_account_search
+                (account_number, user_id, account_type, holder_name, holder_name_lower)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (account_number, payload["user_id"], payload["account_type"],
+                  payload["holder_name"], payload["holder_name"].lower()))
+
+
+DEFAULT_PROJECTIONS = (BalanceProjection, DailyStatsProjection, AccountSearchProjection)
+
+
+class ProjectionRunner:
+    """Feeds events to projections, tracking one offset per projection"""
+
+    def __init__(self, db_path, projections=None, batch_size=1000):
+        self.db_path = db_path
+        self.projections = [p() for p in (projections or DEFAULT_PROJECTIONS)]
+        self.batch_size = batch_size
+
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        init_event_log(cursor)
+        for projection in self.projections:
+            projection.init_tables(cursor)
+            cursor.execute(
+                "INSERT OR IGNORE INTO projection_offsets (projection, last_seq) VALUES (?, 0)",
+                (projection.name,)
+            )
+        conn.commit()
+        conn.close()
+
+    def _run(self, projections):
+        """Apply pending events to the projections in one pass over the log; returns the number applied to each"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        cursor = conn.cursor()
+        names = [projection.name for projection in projections]
+        placeholders = ",".join("?" * len(names))
+        applied = dict.fromkeys(names, 0)
+
+        try:
+            while True:
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute(f"SELECT projection, last_seq FROM projection_offsets WHERE projection IN ({placeholders})",
+                               names)
+                offsets = dict(cursor.fetchall())
+                cursor.execute('''
+                    SELECT seq, event_type, account_number, payload, created_at
+                    FROM events WHERE seq > ? ORDER BY seq LIMIT ?
+                ''', (min(offsets.values()), self.batch_size))
+                batch = cursor.fetchall()
+
+                if not batch:
+                    conn.rollback()
+                    break
+
+                for seq, event_type, account_number, payload, created_at in batch:
+                    payload = json.loads(payload)
+                    for projection in projections:
+                        # Projections that were further along skip what they already applied
+                        if seq > offsets[projection.name]:
+                            projection.apply(cursor, event_type, account_number, payload, created_at)
+                            applied[projection.name] += 1
+
+                # Offsets move in the same transaction as the projected rows
+                cursor.execute(f'''
+                    UPDATE projection_offsets SET last_seq = MAX(last_seq, ?) WHERE projection IN ({placeholders})
+                ''', [batch[-1][0]] + names)
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        return applied
+
+    def catch_up(self):
+        """Bring every projection up to the end of the log"""
+        return self._run(self.projections)
+
+    def rebuild(self, workers=None):
+        """Drop and replay every projection from the start of the log
+
+        The log up to its current end is split into account ranges that
+        worker processes replay side by side, each into its own staging
+        database, so they never queue for SQLite's single writer. A transfer
+        is replayed in the ranges of both its accounts and each range keeps
+        only its own accounts' rows. The staged rows replace the projections
+        in one transaction; events appended meanwhile are then caught up.
+        """
+        workers = workers or os.cpu_count() or 1
+        names = [projection.name for projection in self.projections]
+        placeholders = ",".join("?" * len(names))
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        cursor = conn.cursor()
+        cursor.execute("SELECT COALESCE(MAX(seq), 0), COUNT(*) FROM events")
+        last_seq, replayed = cursor.fetchone()
+
+        # Upper bounds of contiguous account ranges; the outer ranges are left open
+        cursor.execute('''
+            SELECT MAX(account_number) FROM (
+                SELECT account_number, NTILE(?) OVER (ORDER BY account_number) AS bucket
+                FROM (SELECT DISTINCT account_number FROM events WHERE seq <= ?)
+            ) GROUP BY bucket ORDER BY 1
+        ''', (workers, last_seq))
+        bounds = [row[0] for row in cursor.fetchall()]
+        ranges = list(zip([None] + bounds[:-1], bounds[:-1] + [None]))
+
+        base, _ = os.path.splitext(self.db_path)
+        staging_paths = [f"{base}.rebuild-{os.getpid()}-{index}.db" for index in range(len(ranges))]
+        try:
+            for path in staging_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            with ProcessPoolExecutor(max_workers=len(ranges)) as executor:
+                futures = [
+                    executor.submit(_rebuild_range, self.db_path, path, [type(p) for p in self.projections],
+                                    lower, upper, last_seq, self.batch_size)
+                    for path, (lower, upper) in zip(staging_paths, ranges)
+                ]
+                for future in futures:
+                    future.result()
+
+            cursor.execute("BEGIN IMMEDIATE")
+            for projection in self.projections:
+                projection.reset(cursor)
+            for path, (lower, upper) in zip(staging_paths, ranges):
+                own, params = _range_condition("account_number", lower, upper)
+                staging = sqlite3.connect(path)
+                try:
+                    for projection in self.projections:
+                        for table in projection.tables:
+                            rows = staging.execute(f"SELECT * FROM {table} WHERE {own}", params)
+                            columns = ",".join("?" * len(rows.description))
+                            cursor.executemany(f"INSERT INTO {table} VALUES ({columns})", rows)
+                finally:
+                    staging.close()
+            cursor.execute(f"UPDATE projection_offsets SET last_seq = ? WHERE projection IN ({placeholders})",
+                           [last_seq] + names)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+            for path in staging_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+
+        applied = self._run(self.projections)
+        return {name: replayed + applied[name] for name in names}
+
+
+if __name__ == "__main__":
+    import sys
+
+    runner = ProjectionRunner("bank_system.db")
+    if "--rebuild" in sys.argv:
+        print("Rebuilding projections:", runner.rebuild())
+    else:
+        print("Projections caught up:", runner.catch_up())
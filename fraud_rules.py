@@ -0,0 +1,265 @@
+"""
+Fraud and velocity rules for SecureBank Pro
+Withdrawals and transfers are checked inline against in-memory per-account
+activity (fixed-size ring buffers), so a check costs microseconds instead of
+extra SQL queries. Rule definitions are read from fraud_rules.json and
+reloaded when the file changes; a file that does not parse is logged and the
+rules in force are kept. Every rule keeps its own latency counters.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+DEFAULT_RULES_PATH = "fraud_rules.json"
+
+log = logging.getLogger("securebank.fraud")
+log.addHandler(logging.NullHandler())
+
+DEFAULT_RULES = [
+    {"type": "velocity", "name": "debit_velocity_1m", "max_count": 5, "window_seconds": 60},
+    {"type": "velocity", "name": "debit_velocity_1h", "max_count": 30, "window_seconds": 3600},
+    {"type": "amount_anomaly", "name": "unusual_amount", "multiplier": 10.0,
+     "min_history": 5, "min_amount": 10000},
+    {"type": "new_beneficiary", "name": "new_beneficiary_limit", "max_amount": 50000},
+]
+
+
+class AccountActivity:
+    """Ring buffer of recent debits for one account"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.timestamps = [0.0] * capacity
+        self.amounts = [0.0] * capacity
+        self.size = 0
+        self.head = 0
+        self.total = 0.0
+        self.beneficiaries = set()
+
+    def record(self, timestamp, amount, beneficiary=None):
+        if self.size == self.capacity:
+            self.total -= self.amounts[self.head]
+        else:
+            self.size += 1
+        self.timestamps[self.head] = timestamp
+        self.amounts[self.head] = amount
+        self.total += amount
+        self.head = (self.head + 1) % self.capacity
+        if beneficiary:
+            self.beneficiaries.add(beneficiary)
+
+    def count_since(self, since, stop_at):
+        """Count debits newer than `since`, stopping early once `stop_at` is reached"""
+        count = 0
+        index = self.head
+        for _ in range(self.size):
+            index = (index - 1) % self.capacity
+            if self.timestamps[index] < since:
+                break
+            count += 1
+            if count >= stop_at:
+                break
+        return count
+
+    def mean(self):
+        return self.total / self.size if self.size else 0.0
+
+
+class VelocityRule:
+    """Limit the number of debits per account within a time window"""
+
+    def __init__(self, name, max_count, window_seconds, **_):
+        self.name = name
+        self.max_count = int(max_count)
+        self.window_seconds = float(window_seconds)
+
+    def evaluate(self, activity, amount, beneficiary, now):
+        if activity.count_since(now - self.window_seconds, self.max_count) >= self.max_count:
+            return f"limit of {self.max_count} debits per {int(self.window_seconds)} seconds reached"
+        return None
+
+
+class AmountAnomalyRule:
+    """Flag amounts far above the account's rolling mean debit"""
+
+    def __init__(self, name, multiplier, min_history, min_amount=0, **_):
+        self.name = name
+        self.multiplier = float(multiplier)
+        self.min_history = int(min_history)
+        self.min_amount = float(min_amount)
+
+    def evaluate(self, activity, amount, beneficiary, now):
+        if amount < self.min_amount or activity.size < self.min_history:
+            return None
+        if amount > activity.mean() * self.multiplier:
+            return f"amount is more than {self.multiplier:g}x the usual debit"
+        return None
+
+
+class NewBeneficiaryRule:
+    """Cap the first transfer to a beneficiary the account has never paid"""
+
+    def __init__(self, name, max_amount, **_):
+        self.name = name
+        self.max_amount = float(max_amount)
+
+    def evaluate(self, activity, amount, beneficiary, now):
+        if beneficiary and beneficiary not in activity.beneficiaries and amount > self.max_amount:
+            return f"first transfer to a new beneficiary is limited to ₹{self.max_amount:,.2f}"
+        return None
+
+
+RULE_TYPES = {
+    "velocity": VelocityRule,
+    "amount_anomaly": AmountAnomalyRule,
+    "new_beneficiary": NewBeneficiaryRule,
+}
+
+
+def build_rules(definitions):
+    """Rule objects for the enabled definitions; raises on an unknown type or bad parameters"""
+    return [RULE_TYPES[d["type"]](**d) for d in definitions if d.get("enabled", True)]
+
+
+class FraudRulesEngine:
+    """Evaluates debit rules against in-memory account activity"""
+
+    def __init__(self, rules_path=None, history_size=64, reload_interval=1.0,
+                 history_loader=None):
+        # FRAUD_RULES_PATH points the app at other rules, e.g. relaxed ones for load tests
+        self.rules_path = rules_path or os.environ.get("FRAUD_RULES_PATH", DEFAULT_RULES_PATH)
+        self.history_size = history_size
+        self.reload_interval = reload_interval
+        self.history_loader = history_loader
+        self.activity = {}
+        self.rules = []
+        self.rule_metrics = {}
+        self._lock = threading.Lock()
+        self._rules_mtime = None
+        self._load_error = None
+        self._next_reload_check = 0.0
+        # In force until the file loads, and kept if it never does
+        self._install(build_rules(DEFAULT_RULES))
+        self.load_rules()
+
+    def load_rules(self):
+        """(Re)load rule definitions; returns False and keeps the current rules if the file is bad
+
+        The mtime is only recorded after a good load, so a broken file is
+        retried on every reload check until it is fixed, even by an edit
+        that leaves the mtime unchanged at its granularity.
+        """
+        try:
+            mtime = os.path.getmtime(self.rules_path)
+            with open(self.rules_path, encoding="utf-8") as f:
+                rules = build_rules(json.load(f)["rules"])
+        except FileNotFoundError:
+            mtime, rules = None, build_rules(DEFAULT_RULES)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            error = f"{type(e).__name__}: {e}"
+            if error != self._load_error:
+                log.error("Keeping the current fraud rules, %s could not be loaded (%s)", self.rules_path, error)
+                self._load_error = error
+            return False
+
+        self._install(rules)
+        self._rules_mtime = mtime
+        self._load_error = None
+        return True
+
+    def _install(self, rules):
+        """Swap in a rule set, keeping existing metrics for rules that survive"""
+        with self._lock:
+            self.rules = rules
+            self.rule_metrics = {
+                rule.name: self.rule_metrics.get(rule.name, {"calls": 0, "blocked": 0, "total_ns": 0, "max_ns": 0})
+                for rule in rules
+            }
+
+    def reload_if_changed(self):
+        now = time.monotonic()
+        if now < self._next_reload_check:
+            return
+        self._next_reload_check = now + self.reload_interval
+        try:
+            mtime = os.path.getmtime(self.rules_path)
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._rules_mtime or self._load_error:
+            self.load_rules()
+
+    def _get_activity(self, account_number):
+        """Activity buffer of an account; call without holding the lock"""
+        activity = self.activity.get(account_number)
+        if activity is None:
+            activity = AccountActivity(self.history_size)
+            if self.history_loader:
+                # Warm the buffer once per account from persisted history, oldest first. The loader
+                # runs SQL, so other accounts' checks must not wait for it behind the lock
+                for timestamp, amount, beneficiary in self.history_loader(account_number, self.history_size):
+                    activity.record(timestamp, amount, beneficiary)
+            with self._lock:
+                activity = self.activity.setdefault(account_number, activity)
+        return activity
+
+    def check(self, account_number, amount, beneficiary=None):
+        """Return (allowed, reason) for a debit of `amount` from an account"""
+        self.reload_if_changed()
+        activity = self._get_activity(account_number)
+        now = time.time()
+
+        with self._lock:
+            for rule in self.rules:
+                started = time.perf_counter_ns()
+                reason = rule.evaluate(activity, amount, beneficiary, now)
+                elapsed = time.perf_counter_ns() - started
+
+                stats = self.rule_metrics[rule.name]
+                stats["calls"] += 1
+                stats["total_ns"] += elapsed
+                stats["max_ns"] = max(stats["max_ns"], elapsed)
+                if reason:
+                    stats["blocked"] += 1
+                    return False, f"Transaction blocked ({rule.name}): {reason}"
+
+        return True, None
+
+    def record(self, account_number, amount, beneficiary=None):
+        """Record a committed debit so later checks see it"""
+        activity = self._get_activity(account_number)
+        with self._lock:
+            activity.record(time.time(), amount, beneficiary)
+
+    def metrics(self):
+        """Per-rule call counts, block counts and latency in microseconds"""
+        with self._lock:
+            return {
+                name: {
+                    "calls": stats["calls"],
+                    "blocked": stats["blocked"],
+                    "avg_us": stats["total_ns"] / stats["calls"] / 1000 if stats["calls"] else 0.0,
+                    "max_us": stats["max_ns"] / 1000,
+                }
+                for name, stats in self.rule_metrics.items()
+            }
+
+
+if __name__ == "__main__":
+    engine = FraudRulesEngine()
+    accounts = [f"ACC{100000000 + i}" for i in range(1000)]
+    checks = 100000
+
+    started = time.perf_counter()
+    for i in range(checks):
+        account = accounts[i % len(accounts)]
+        allowed, _ = engine.check(account, 500, beneficiary=accounts[(i + 1) % len(accounts)])
+        if allowed:
+            engine.record(account, 500, beneficiary=accounts[(i + 1) % len(accounts)])
+    elapsed = time.perf_counter() - started
+
+    print(f"{checks} checks in {elapsed:.2f}s ({checks / elapsed:,.0f} checks/second)")
+    for name, stats in engine.metrics().items():
+        print(f"{name}: {stats}")
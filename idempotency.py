@@ -0,0 +1,74 @@
+"""
+Idempotency key store for SecureBank Pro
+Remembers the outcome of deposits, withdrawals and transfers by a client
+supplied key, so a replayed request (Streamlit rerun, double click or client
+retry) returns the original result instead of moving the money twice. Each
+key is stored with a fingerprint of its request, so a key reused for a
+different request is rejected instead of answered with someone else's result.
+"""
+
+import hashlib
+import json
+
+DEFAULT_TTL_HOURS = 24
+# Long-running processes purge expired keys on their write path this often
+PURGE_INTERVAL_SECONDS = 3600
+
+
+def init_idempotency_table(cursor):
+    """Create the idempotency key table and its expiry index"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            idempotency_key TEXT PRIMARY KEY,
+            operation TEXT NOT NULL,
+            fingerprint TEXT,
+            result TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_idempotency_expires
+        ON idempotency_keys (expires_at)
+    ''')
+    # Tables created before fingerprints keep NULL for their (soon expiring) keys
+    cursor.execute("PRAGMA table_info(idempotency_keys)")
+    if "fingerprint" not in [column[1] for column in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE idempotency_keys ADD COLUMN fingerprint TEXT")
+
+
+def request_fingerprint(*parts):
+    """Fingerprint of what a request asks for (accounts, amount, destination)"""
+    return hashlib.sha256(json.dumps([str(part) for part in parts]).encode()).hexdigest()
+
+
+def lookup_result(cursor, idempotency_key, operation, fingerprint):
+    """Return the stored (success, message) result for a key, a conflict result, or None"""
+    cursor.execute('''
+        SELECT operation, fingerprint, result FROM idempotency_keys
+        WHERE idempotency_key = ? AND expires_at > CURRENT_TIMESTAMP
+    ''', (idempotency_key,))
+    row = cursor.fetchone()
+
+    if not row:
+        return None
+    if row[0] != operation:
+        return False, "Idempotency key was already used for a different operation"
+    if row[1] is not None and row[1] != fingerprint:
+        return False, "Idempotency key conflict: it was already used for a different request"
+    return tuple(json.loads(row[2]))
+
+
+def store_result(cursor, idempotency_key, operation, fingerprint, result, ttl_hours=DEFAULT_TTL_HOURS):
+    """Store the result of an operation and its request fingerprint under its key (same transaction as the write)"""
+    cursor.execute('''
+        INSERT OR REPLACE INTO idempotency_keys
+        (idempotency_key, operation, fingerprint, result, expires_at)
+        VALUES (?, ?, ?, ?, datetime('now', ?))
+    ''', (idempotency_key, operation, fingerprint, json.dumps(list(result)), f"+{int(ttl_hours)} hours"))
+
+
+def purge_expired_keys(cursor):
+    """Delete expired keys and return how many were removed"""
+    cursor.execute("DELETE FROM idempotency_keys WHERE expires_at <= CURRENT_TIMESTAMP")
+    return cursor.rowcount
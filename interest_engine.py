@@ -0,0 +1,241 @@
+"""
+Interest Engine for SecureBank Pro
+Month-end batch that accrues daily-balance interest on savings accounts.
+The ledger for a range of accounts is loaded once, turned into an
+accounts x days balance matrix with pandas/NumPy, and the resulting credits
+are posted through BankDatabase.bulk_credit. Work is split into account
+ranges that run on a process pool; each range records its status in
+`interest_runs`, so an interrupted run can be restarted and only the
+unfinished ranges are computed again.
+"""
+
+import os
+import sqlite3
+import sys
+from calendar import monthrange
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from bank_database import BankDatabase
+
+SAVINGS_ANNUAL_RATE = 0.035
+CREDIT_TYPES = ("deposit", "transfer_in")
+
+
+def init_interest_tables(cursor):
+    """Create the per-range run status table"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS interest_runs (
+            run_id TEXT NOT NULL,
+            range_start TEXT NOT NULL,
+            range_end TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            accounts_credited INTEGER DEFAULT 0,
+            total_interest REAL DEFAULT 0.0,
+            finished_at TIMESTAMP,
+            PRIMARY KEY (run_id, range_start)
+        )
+    ''')
+
+
+def plan_ranges(db_path, run_id, num_ranges):
+    """Split savings accounts into contiguous account number ranges and register them
+
+    A run is planned once: a restart reuses the ranges already registered,
+    whatever num_ranges it asks for, because new boundaries would overlap
+    ranges that were already posted and credit those accounts twice.
+    """
+    conn = sqlite3.connect(db_path, timeout=60)
+    cursor = conn.cursor()
+    init_interest_tables(cursor)
+    conn.commit()
+
+    # Under the write lock, so two runs starting together cannot both plan
+    cursor.execute("BEGIN IMMEDIATE")
+    cursor.execute("SELECT 1 FROM interest_runs WHERE run_id = ? LIMIT 1", (run_id,))
+    if cursor.fetchone() is None:
+        cursor.execute('''
+            SELECT MIN(account_number), MAX(account_number) FROM (
+                SELECT account_number, NTILE(?) OVER (ORDER BY account_number) AS bucket
+                FROM accounts WHERE account_type = 'savings' AND status = 'active'
+            ) GROUP BY bucket ORDER BY 1
+        ''', (num_ranges,))
+        cursor.executemany(
+            "INSERT INTO interest_runs (run_id, range_start, range_end) VALUES (?, ?, ?)",
+            [(run_id, start, end) for start, end in cursor.fetchall()]
+        )
+    conn.commit()
+
+    cursor.execute(
+        "SELECT range_start, range_end FROM interest_runs WHERE run_id = ? AND status != 'posted' ORDER BY range_start",
+        (run_id,)
+    )
+    pending = cursor.fetchall()
+    conn.close()
+    return pending
+
+
+def load_ledger(conn, range_start, range_end, period_start, period_end):
+    """Return (accounts, opening, movements, following) frames for savings accounts in a range"""
+    params = (range_start, range_end)
+    # Accounts opened after the period earn nothing for it
+    accounts = pd.read_sql_query('''
+        SELECT account_number, date(created_at) AS opened FROM accounts
+        WHERE account_type = 'savings' AND status = 'active'
+          AND account_number BETWEEN ? AND ?
+          AND (created_at IS NULL OR created_at < ?)
+    ''', conn, params=params + (period_end,))
+
+    # Last ledger balance before the period opens
+    opening = pd.read_sql_query('''
+        SELECT t.account_number, t.balance_after AS opening_balance
+        FROM transactions t
+        JOIN (
+            SELECT t2.account_number, MAX(t2.id) AS last_id
+            FROM transactions t2 JOIN accounts a ON a.account_number = t2.account_number
+            WHERE a.account_type = 'savings' AND t2.account_number BETWEEN ? AND ?
+              AND t2.timestamp < ?
+            GROUP BY t2.account_number
+        ) last ON last.last_id = t.id
+    ''', conn, params=params + (period_start,))
+
+    movements = pd.read_sql_query('''
+        SELECT t.account_number, t.id, date(t.timestamp) AS day,
+               t.transaction_type, t.amount, t.balance_after
+        FROM transactions t JOIN accounts a ON a.account_number = t.account_number
+        WHERE a.account_type = 'savings' AND t.account_number BETWEEN ? AND ?
+          AND t.timestamp >= ? AND t.timestamp < ?
+        ORDER BY t.id
+    ''', conn, params=params + (period_start, period_end))
+
+    # First ledger row after the period, for accounts that did not move before or during it
+    following = pd.read_sql_query('''
+        SELECT t.account_number, t.transaction_type, t.amount, t.balance_after
+        FROM transactions t
+        JOIN (
+            SELECT t2.account_number, MIN(t2.id) AS first_id
+            FROM transactions t2 JOIN accounts a ON a.account_number = t2.account_number
+            WHERE a.account_type = 'savings' AND t2.account_number BETWEEN ? AND ?
+              AND t2.timestamp >= ?
+            GROUP BY t2.account_number
+        ) first ON first.first_id = t.id
+    ''', conn, params=params + (period_end,))
+
+    return accounts, opening, movements, following
+
+
+def _balance_before(rows):
+    """Balance just before each ledger row, by undoing its signed amount"""
+    sign = np.where(rows["transaction_type"].isin(CREDIT_TYPES), 1.0, -1.0)
+    return rows["balance_after"] - sign * rows["amount"]
+
+
+def compute_interest(accounts, opening, movements, following, period_start, period_end, annual_rate):
+    """Vectorized daily-balance interest; returns a Series of credits indexed by account"""
+    days = pd.date_range(period_start, pd.Timestamp(period_end) - pd.Timedelta(days=1), freq="D")
+    index = accounts["account_number"]
+
+    # Opening balance: last balance before the period, otherwise the balance just
+    # before the first movement in the period, otherwise just before the first one
+    # after it (today's balance would include later deposits). No ledger means 0.
+    start_balance = opening.set_index("account_number")["opening_balance"].reindex(index).astype(float)
+    for later in (movements, following):
+        if not later.empty:
+            first = later.drop_duplicates("account_number", keep="first").set_index("account_number")
+            start_balance = start_balance.fillna(_balance_before(first).reindex(index))
+    start_balance = start_balance.fillna(0.0)
+
+    # End-of-day balance matrix: last balance_after per day, carried forward
+    if movements.empty:
+        matrix = pd.DataFrame(np.nan, index=index, columns=days)
+    else:
+        end_of_day = movements.drop_duplicates(["account_number", "day"], keep="last")
+        matrix = (end_of_day.pivot(index="account_number", columns="day", values="balance_after")
+                  .rename(columns=pd.Timestamp)
+                  .reindex(index=index, columns=days))
+    matrix = matrix.ffill(axis=1)
+    values = matrix.to_numpy(dtype=float)
+    values = np.where(np.isnan(values), start_balance.to_numpy(dtype=float)[:, None], values)
+
+    # Interest accrues from the day an account was opened
+    opened = pd.to_datetime(accounts["opened"]).to_numpy()
+    values = np.where(days.to_numpy()[None, :] < opened[:, None], 0.0, values)
+
+    daily_rate = annual_rate / 365.0
+    interest = np.round(np.clip(values, 0, None).sum(axis=1) * daily_rate, 2)
+    credits = pd.Series(interest, index=index)
+    return credits[credits > 0]
+
+
+def process_range(db_path, run_id, range_start, range_end, period_start, period_end, annual_rate):
+    """Compute and post interest for one account range; safe to call again after a crash"""
+    conn = sqlite3.connect(db_path, timeout=60)
+    try:
+        accounts, opening, movements, following = load_ledger(conn, range_start, range_end,
+                                                              period_start, period_end)
+        credits = compute_interest(accounts, opening, movements, following, period_start, period_end, annual_rate)
+
+        db = BankDatabase(db_path)
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("SELECT status FROM interest_runs WHERE run_id = ? AND range_start = ?",
+                       (run_id, range_start))
+        if cursor.fetchone()[0] == "posted":
+            conn.rollback()
+            return range_start, 0, 0.0
+
+        label = date.fromisoformat(period_start).strftime("%b %Y")
+        db.bulk_credit(list(credits.items()), f"Interest credit for {label}", cursor)
+
+        # Credits and the range status commit together, so a range is posted exactly once
+        cursor.execute('''
+            UPDATE interest_runs
+            SET status = 'posted', accounts_credited = ?, total_interest = ?, finished_at = CURRENT_TIMESTAMP
+            WHERE run_id = ? AND range_start = ?
+        ''', (len(credits), float(credits.sum()), run_id, range_start))
+        conn.commit()
+        return range_start, len(credits), float(credits.sum())
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def run_month_end(db_path, year, month, annual_rate=SAVINGS_ANNUAL_RATE, workers=None, ranges_per_worker=4):
+    """Accrue interest for every savings account for one calendar month"""
+    workers = workers or os.cpu_count() or 1
+    run_id = f"interest-{year:04d}-{month:02d}"
+    period_start = date(year, month, 1)
+    period_end = period_start + timedelta(days=monthrange(year, month)[1])
+
+    pending = plan_ranges(db_path, run_id, workers * ranges_per_worker)
+    print(f"{run_id}: {len(pending)} account ranges to process on {workers} workers")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(process_range, db_path, run_id, start, end,
+                            period_start.isoformat(), period_end.isoformat(), annual_rate)
+            for start, end in pending
+        ]
+        total_accounts = 0
+        total_interest = 0.0
+        for future in futures:
+            _, credited, interest = future.result()
+            total_accounts += credited
+            total_interest += interest
+
+    print(f"{run_id}: credited ₹{total_interest:,.2f} to {total_accounts} accounts")
+    return total_accounts, total_interest
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2:
+        year, month = map(int, sys.argv[1].split("-"))
+    else:
+        last_month = date.today().replace(day=1) - timedelta(days=1)
+        year, month = last_month.year, last_month.month
+    run_month_end("bank_system.db", year, month)
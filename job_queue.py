@@ -0,0 +1,483 @@
+"""
+Background jobs for SecureBank Pro
+Long-running work (demo data, ledger exports, reconciliation, month-end
+interest, category backfills) is queued in a small SQLite file next to the
+database instead of running on a Streamlit script thread. A worker daemon
+claims the highest-priority ready job under a lease, runs it on a process
+pool at lower CPU priority and renews the lease while it runs; a job whose
+daemon died is picked up again once its lease expires, and a failed job is
+retried with exponential backoff until it runs out of attempts. Handlers
+report progress into the queue, which the app polls.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+DEFAULT_LEASE_SECONDS = 60.0
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_BASE_SECONDS = 30.0
+POLL_INTERVAL = 1.0
+# Added to the worker processes' nice value so interactive reruns win the CPU
+JOB_NICENESS = 10
+EXPORT_DIR = "exports"
+EXPORT_CHUNK_ROWS = 50000
+RECONCILE_CHUNK_ACCOUNTS = 1000
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def jobs_path(db_path):
+    """Path of the queue file belonging to a database"""
+    base, _ = os.path.splitext(db_path)
+    return f"{base}.jobs.db"
+
+
+def init_job_tables(cursor):
+    """Create the jobs table"""
+    # run_after and lease_expires_at are epoch seconds, compared with time.time()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            owner TEXT,
+            priority INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            run_after REAL NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_expires_at REAL,
+            progress REAL NOT NULL DEFAULT 0,
+            message TEXT,
+            result TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_jobs_ready
+        ON jobs (status, priority DESC, id)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_jobs_owner
+        ON jobs (owner, id)
+    ''')
+
+
+def _job_from_row(row):
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+    return job
+
+
+class JobQueue:
+    """Durable priority queue of jobs with leases and retries"""
+
+    def __init__(self, db_path="bank_system.db"):
+        self.db_path = db_path
+        self.path = jobs_path(db_path)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            init_job_tables(conn.cursor())
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def enqueue(self, kind, payload=None, priority=0, owner=None, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """Queue a job for a registered handler and return its id; higher priorities run first"""
+        if kind not in HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        conn = self._connect()
+        try:
+            cursor = conn.execute('''
+                INSERT INTO jobs (kind, payload, owner, priority, max_attempts)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (kind, json.dumps(payload or {}), owner, priority, max_attempts))
+            conn.commit()
+            return cursor.lastrowid
+        finally:
+            conn.close()
+
+    def get(self, job_id):
+        """One job as a dict, or None"""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return _job_from_row(row) if row else None
+        finally:
+            conn.close()
+
+    def recent(self, owner=None, limit=20):
+        """Newest jobs first, optionally only those of one owner"""
+        conn = self._connect()
+        try:
+            if owner is None:
+                rows = conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+            else:
+                rows = conn.execute("SELECT * FROM jobs WHERE owner = ? ORDER BY id DESC LIMIT ?",
+                                    (owner, limit)).fetchall()
+            return [_job_from_row(row) for row in rows]
+        finally:
+            conn.close()
+
+    def cancel(self, job_id):
+        """Cancel a job that has not started yet; returns whether it was cancelled"""
+        conn = self._connect()
+        try:
+            cancelled = conn.execute('''
+                UPDATE jobs SET status = ?, finished_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status = ?
+            ''', (CANCELLED, job_id, QUEUED)).rowcount
+            conn.commit()
+            return bool(cancelled)
+        finally:
+            conn.close()
+
+    def claim(self, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Lease the highest-priority ready job to a worker, or return None"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # A lease that ran out belongs to a dead worker: the job counts as an attempt that failed
+            conn.execute('''
+                UPDATE jobs SET status = ?, error = 'Worker lost its lease on the last attempt',
+                                lease_owner = NULL, finished_at = CURRENT_TIMESTAMP
+                WHERE status = ? AND lease_expires_at < ? AND attempts >= max_attempts
+            ''', (FAILED, RUNNING, now))
+            row = conn.execute('''
+                SELECT id FROM jobs
+                WHERE (status = ? AND run_after <= ?) OR (status = ? AND lease_expires_at < ?)
+                ORDER BY priority DESC, id
+                LIMIT 1
+            ''', (QUEUED, now, RUNNING, now)).fetchone()
+            if row is None:
+                conn.commit()
+                return None
+            conn.execute('''
+                UPDATE jobs SET status = ?, lease_owner = ?, lease_expires_at = ?, attempts = attempts + 1,
+                                started_at = CURRENT_TIMESTAMP, progress = 0, error = NULL
+                WHERE id = ?
+            ''', (RUNNING, worker_id, now + lease_seconds, row["id"]))
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+            conn.commit()
+            return _job_from_row(job)
+        finally:
+            conn.close()
+
+    def renew(self, worker_id, job_ids, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Extend the worker's leases on running jobs"""
+        if not job_ids:
+            return
+        conn = self._connect()
+        try:
+            conn.executemany('''
+                UPDATE jobs SET lease_expires_at = ?
+                WHERE id = ? AND lease_owner = ? AND status = ?
+            ''', [(time.time() + lease_seconds, job_id, worker_id, RUNNING) for job_id in job_ids])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def report_progress(self, job_id, worker_id, progress, message=None):
+        """Record how far a running job is (0.0-1.0); False if the worker no longer holds its lease"""
+        conn = self._connect()
+        try:
+            updated = conn.execute('''
+                UPDATE jobs SET progress = ?, message = COALESCE(?, message)
+                WHERE id = ? AND lease_owner = ? AND status = ?
+            ''', (min(max(progress, 0.0), 1.0), message, job_id, worker_id, RUNNING)).rowcount
+            conn.commit()
+            return bool(updated)
+        finally:
+            conn.close()
+
+    def complete(self, job_id, worker_id, result=None):
+        """Mark a job succeeded with its JSON-serializable result"""
+        conn = self._connect()
+        try:
+            conn.execute('''
+                UPDATE jobs SET status = ?, result = ?, progress = 1.0, lease_owner = NULL,
+                                finished_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND lease_owner = ?
+            ''', (SUCCEEDED, json.dumps(result), job_id, worker_id))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def fail(self, job_id, worker_id, error):
+        """Record a failed attempt: retry later with backoff, or fail for good after max_attempts"""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ? AND lease_owner = ?",
+                               (job_id, worker_id)).fetchone()
+            if row is None:
+                return
+            if row["attempts"] < row["max_attempts"]:
+                retry_at = time.time() + RETRY_BASE_SECONDS * 2 ** (row["attempts"] - 1)
+                conn.execute('''
+                    UPDATE jobs SET status = ?, error = ?, run_after = ?, lease_owner = NULL
+                    WHERE id = ?
+                ''', (QUEUED, error, retry_at, job_id))
+            else:
+                conn.execute('''
+                    UPDATE jobs SET status = ?, error = ?, lease_owner = NULL, finished_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', (FAILED, error, job_id))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def get_job_queue(db_path="bank_system.db"):
+    """Process-wide job queue for a database"""
+    with _queues_lock:
+        queue = _queues.get(db_path)
+        if queue is None:
+            queue = _queues[db_path] = JobQueue(db_path)
+        return queue
+
+
+# Handlers run in a worker process as handler(db_path, payload, progress) and return
+# a JSON-serializable result; progress(fraction, message=None) updates the job row
+
+def _demo_data_job(db_path, payload, progress):
+    from bank_database import BankDatabase
+    from create_demo_data import create_demo_data
+
+    # Opening the database runs its migrations, so the demo rows land in the current schema
+    BankDatabase(db_path)
+    progress(0.0, "Creating demo users, accounts and transactions")
+    if not create_demo_data(db_path):
+        raise RuntimeError("Demo data generation failed")
+    return {"db_path": db_path}
+
+
+def _export_transactions_job(db_path, payload, progress):
+    """Ledger rows as CSV: per account through its index when accounts are given, else in id-range chunks"""
+    import pyarrow.csv as pa_csv
+
+    from arrow_results import SEARCH_SCHEMA, cursor_batches
+
+    account_numbers = payload.get("account_numbers")
+    path = payload.get("path") or os.path.join(
+        EXPORT_DIR, f"transactions-{datetime.now().strftime('%Y%m%d-%H%M%S')}.csv")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    columns = '''
+        SELECT account_number, transaction_type, amount, balance_after, description,
+               timestamp, reference_number
+        FROM transactions
+    '''
+
+    conn = sqlite3.connect(db_path)
+    try:
+        exported = 0
+        with pa_csv.CSVWriter(path, SEARCH_SCHEMA) as writer:
+            if account_numbers is not None:
+                # A user's accounts are a sliver of the ledger: one seek on
+                # idx_transactions_account_time per account instead of a full scan
+                for done, account_number in enumerate(account_numbers, 1):
+                    cursor = conn.execute(f"{columns} WHERE account_number = ? ORDER BY timestamp, id",
+                                          (account_number,))
+                    for batch in cursor_batches(cursor, SEARCH_SCHEMA, EXPORT_CHUNK_ROWS):
+                        writer.write_batch(batch)
+                        exported += batch.num_rows
+                    progress(done / len(account_numbers), f"{exported:,} rows written")
+            else:
+                first_id, last_id = conn.execute("SELECT MIN(id), MAX(id) FROM transactions").fetchone()
+                if first_id is not None:
+                    for start in range(first_id, last_id + 1, EXPORT_CHUNK_ROWS):
+                        cursor = conn.execute(f"{columns} WHERE id BETWEEN ? AND ? ORDER BY id",
+                                              (start, start + EXPORT_CHUNK_ROWS - 1))
+                        for batch in cursor_batches(cursor, SEARCH_SCHEMA, EXPORT_CHUNK_ROWS):
+                            writer.write_batch(batch)
+                            exported += batch.num_rows
+                        done = min(start + EXPORT_CHUNK_ROWS, last_id + 1) - first_id
+                        progress(done / (last_id + 1 - first_id), f"{exported:,} rows written")
+    finally:
+        conn.close()
+    return {"path": path, "rows": exported}
+
+
+def _reconciliation_job(db_path, payload, progress):
+    """Compare each account's balance with the balance after its newest ledger row"""
+    from bank_database import BankDatabase
+
+    db = BankDatabase(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        if payload.get("account_numbers") is not None:
+            rows = conn.execute('''
+                SELECT account_number, balance FROM accounts
+                WHERE account_number IN (SELECT value FROM json_each(?))
+                ORDER BY account_number
+            ''', (json.dumps(payload["account_numbers"]),)).fetchall()
+        else:
+            rows = conn.execute("SELECT account_number, balance FROM accounts ORDER BY account_number").fetchall()
+    finally:
+        conn.close()
+
+    mismatches = []
+    for start in range(0, len(rows), RECONCILE_CHUNK_ACCOUNTS):
+        chunk = rows[start:start + RECONCILE_CHUNK_ACCOUNTS]
+        # Accounts without ledger rows reconcile against 0.0, like any unopened balance
+        ledger = db.balances_at("9999-12-31 23:59:59", [account for account, _ in chunk])
+        for account_number, balance in chunk:
+            if abs(balance - ledger.get(account_number, 0.0)) >= 0.005:
+                mismatches.append({"account_number": account_number, "balance": balance,
+                                   "ledger_balance": ledger.get(account_number, 0.0)})
+        progress((start + len(chunk)) / len(rows), f"{start + len(chunk):,} of {len(rows):,} accounts checked")
+    return {"accounts": len(rows), "mismatches": mismatches}
+
+
+def _month_end_interest_job(db_path, payload, progress):
+    from interest_engine import run_month_end
+
+    progress(0.0, f"Accruing interest for {payload['year']:04d}-{payload['month']:02d}")
+    accounts, interest = run_month_end(db_path, payload["year"], payload["month"], workers=payload.get("workers"))
+    return {"accounts_credited": accounts, "total_interest": interest}
+
+
+def _category_backfill_job(db_path, payload, progress):
+    from categorizer import backfill_categories
+
+    progress(0.0, "Categorizing ledger rows")
+    return {"categorized": backfill_categories(db_path, recategorize=payload.get("recategorize", False))}
+
+
+HANDLERS = {
+    "demo_data": _demo_data_job,
+    "export_transactions": _export_transactions_job,
+    "reconciliation": _reconciliation_job,
+    "month_end_interest": _month_end_interest_job,
+    "category_backfill": _category_backfill_job,
+}
+
+
+def _lower_priority():
+    if hasattr(os, "nice"):
+        os.nice(JOB_NICENESS)
+
+
+def _execute(db_path, job_id, worker_id, kind, payload):
+    """Worker process: run one job's handler with a progress callback into the queue"""
+    queue = JobQueue(db_path)
+
+    def progress(fraction, message=None):
+        queue.report_progress(job_id, worker_id, fraction, message)
+
+    return HANDLERS[kind](db_path, payload, progress)
+
+
+class JobWorker:
+    """Daemon that claims jobs and runs them on a process pool"""
+
+    def __init__(self, db_path="bank_system.db", workers=None, lease_seconds=DEFAULT_LEASE_SECONDS,
+                 poll_interval=POLL_INTERVAL):
+        self.db_path = db_path
+        self.workers = workers or os.cpu_count() or 1
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.worker_id = f"worker-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.queue = JobQueue(db_path)
+        self._stop = threading.Event()
+
+    def _executor(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_lower_priority)
+
+    def run(self, until_idle=False):
+        """Claim and run jobs until stop() (or, with until_idle, until the queue is empty)"""
+        executor = self._executor()
+        running = {}
+        last_renewal = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                while len(running) < self.workers:
+                    job = self.queue.claim(self.worker_id, self.lease_seconds)
+                    if job is None:
+                        break
+                    future = executor.submit(_execute, self.db_path, job["id"], self.worker_id,
+                                             job["kind"], job["payload"])
+                    running[future] = job["id"]
+                if not running:
+                    if until_idle:
+                        return
+                    self._stop.wait(self.poll_interval)
+                    continue
+
+                # Renew well before the leases run out, so a live daemon never loses a job
+                if time.monotonic() - last_renewal >= self.lease_seconds / 3:
+                    self.queue.renew(self.worker_id, list(running.values()), self.lease_seconds)
+                    last_renewal = time.monotonic()
+
+                done, _ = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    job_id = running.pop(future)
+                    try:
+                        self.queue.complete(job_id, self.worker_id, future.result())
+                    except BrokenProcessPool as e:
+                        broken = True
+                        self.queue.fail(job_id, self.worker_id, f"Worker process died: {e}")
+                    except Exception as e:
+                        self.queue.fail(job_id, self.worker_id, f"{type(e).__name__}: {e}")
+                if broken:
+                    # A crashed worker breaks the whole pool; its other jobs fail on the next wait
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    executor = self._executor()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def stop(self):
+        self._stop.set()
+
+
+if __name__ == "__main__":
+    usage = ("Usage: python job_queue.py work [bank_system.db] | "
+             "enqueue <kind> [json-payload] [priority] | list [bank_system.db]")
+    if len(sys.argv) < 2 or sys.argv[1] not in ("work", "enqueue", "list"):
+        print(usage)
+        sys.exit(1)
+
+    if sys.argv[1] == "work":
+        db_path = sys.argv[2] if len(sys.argv) > 2 else "bank_system.db"
+        worker = JobWorker(db_path)
+        print(f"Running jobs for {db_path} on {worker.workers} worker processes")
+        try:
+            worker.run()
+        except KeyboardInterrupt:
+            worker.stop()
+    elif sys.argv[1] == "enqueue":
+        if len(sys.argv) < 3:
+            print(usage)
+            sys.exit(1)
+        payload = json.loads(sys.argv[3]) if len(sys.argv) > 3 else {}
+        priority = int(sys.argv[4]) if len(sys.argv) > 4 else 0
+        job_id = JobQueue().enqueue(sys.argv[2], payload, priority)
+        print(f"Queued job {job_id} ({sys.argv[2]})")
+    else:
+        db_path = sys.argv[2] if len(sys.argv) > 2 else "bank_system.db"
+        for job in JobQueue(db_path).recent(limit=50):
+            print(f"{job['id']:>6} {job['kind']:<20} {job['status']:<10} {job['progress']:>4.0%} "
+                  f"attempt {job['attempts']}/{job['max_attempts']}  {job['message'] or job['error'] or ''}")
@@ -0,0 +1,168 @@
+"""
+Legacy data migration for SecureBank Pro
+Imports the fixed-layout accounts.dat written by the C console program
+(bank.c) into bank_system.db, and exports accounts back to that format.
+
+bank.c writes an int record count followed by `BankAccount` structs
+({char accountNumber[20]; double balance;}, padded to 32 bytes on x86-64).
+The file is memory-mapped and decoded chunk by chunk straight from a
+memoryview, so large files never become one big list of Python objects.
+Balances are imported signed: bank.c accepts negative deposits, so an
+overdrawn legacy account opens with a ledger debit instead of a credit.
+The C++ console program (main.cpp) keeps its accounts in memory only and
+has no data file to migrate.
+"""
+
+import mmap
+import os
+import sqlite3
+import struct
+import sys
+
+from bank_database import BankDatabase
+from event_log import append_events, ACCOUNT_OPENED
+from cdc import publish_changes, notify_committed
+
+HEADER = struct.Struct("<i")
+RECORD = struct.Struct("<20s4xd")
+LEGACY_PREFIX = "LEG"
+
+
+def iter_record_chunks(path, chunk_size=50000):
+    """Yield lists of (account_number, balance) decoded from a memory-mapped accounts.dat"""
+    if os.path.getsize(path) < HEADER.size:
+        return
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        try:
+            count = HEADER.unpack_from(view, 0)[0]
+            # Never trust the header beyond what is actually in the file
+            count = min(count, (len(view) - HEADER.size) // RECORD.size)
+
+            for start in range(0, count, chunk_size):
+                stop = min(start + chunk_size, count)
+                with view[HEADER.size + start * RECORD.size:HEADER.size + stop * RECORD.size] as chunk:
+                    records = [
+                        (raw_number.split(b"\0", 1)[0].decode("ascii", "replace"), balance)
+                        for raw_number, balance in RECORD.iter_unpack(chunk)
+                    ]
+                yield records
+        finally:
+            view.release()
+
+
+def import_accounts_dat(path, db_path="bank_system.db", prefix=LEGACY_PREFIX, chunk_size=200000):
+    """Bulk-import legacy accounts; already imported accounts are skipped, so it can be re-run
+
+    Returns (imported, skipped, overdrawn): overdrawn counts the imported
+    accounts whose legacy balance was negative.
+    """
+    db = BankDatabase(db_path)
+    conn = sqlite3.connect(db_path, timeout=60)
+    cursor = conn.cursor()
+    # Random reference numbers make index inserts scattered; a large page cache keeps them in memory
+    cursor.execute("PRAGMA cache_size = -262144")
+    imported = skipped = overdrawn = 0
+
+    try:
+        for records in iter_record_chunks(path, chunk_size):
+            rows = {}
+            for legacy_number, balance in records:
+                if legacy_number:
+                    rows[f"{prefix}{legacy_number}"] = (legacy_number, balance)
+
+            cursor.execute("BEGIN IMMEDIATE")
+            existing = set()
+            numbers = list(rows)
+            for start in range(0, len(numbers), 500):
+                batch = numbers[start:start + 500]
+                cursor.execute(
+                    f"SELECT account_number FROM accounts WHERE account_number IN ({','.join('?' * len(batch))})",
+                    batch
+                )
+                existing.update(row[0] for row in cursor.fetchall())
+            new_rows = [(number, legacy, balance) for number, (legacy, balance) in rows.items()
+                        if number not in existing]
+
+            # Accounts open at zero and receive their legacy balance as a ledger credit (a debit
+            # when it is negative), so the transactions, event log and CDC outbox stay consistent
+            account_rows = [
+                {"account_number": number, "user_id": None, "account_type": "savings",
+                 "balance": 0.0, "account_holder_name": f"Legacy account {legacy}",
+                 "phone_number": None, "address": None}
+                for number, legacy, _ in new_rows
+            ]
+            cursor.executemany('''
+                INSERT INTO accounts
+                (account_number, user_id, account_type, balance, account_holder_name, phone_number, address)
+                VALUES (:account_number, :user_id, :account_type, :balance, :account_holder_name,
+                        :phone_number, :address)
+            ''', account_rows)
+            publish_changes(cursor, "accounts", "insert", account_rows)
+            append_events(cursor, [
+                (ACCOUNT_OPENED, row["account_number"], {
+                    "user_id": None, "account_type": "savings",
+                    "holder_name": row["account_holder_name"], "initial_deposit": 0.0
+                })
+                for row in account_rows
+            ])
+            db.bulk_credit([(number, balance) for number, _, balance in new_rows if balance > 0],
+                           "Legacy balance migration", cursor)
+            debits = [(number, -balance) for number, _, balance in new_rows if balance < 0]
+            db.bulk_debit(debits, "Legacy overdrawn balance migration", cursor)
+            conn.commit()
+
+            imported += len(new_rows)
+            overdrawn += len(debits)
+            skipped += len(records) - len(new_rows)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    notify_committed()
+    return imported, skipped, overdrawn
+
+
+def export_accounts_dat(path, db_path="bank_system.db", prefix=LEGACY_PREFIX, chunk_size=50000):
+    """Write accounts in the bank.c layout; imported accounts get their legacy number back"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT account_number, balance FROM accounts ORDER BY account_number")
+    written = 0
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(0))
+        buffer = bytearray(RECORD.size * chunk_size)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for i, (account_number, balance) in enumerate(rows):
+                if prefix and account_number.startswith(prefix):
+                    account_number = account_number[len(prefix):]
+                # char[20] keeps room for the terminating NUL
+                RECORD.pack_into(buffer, i * RECORD.size, account_number.encode("ascii", "replace")[:19], balance)
+            f.write(memoryview(buffer)[:len(rows) * RECORD.size])
+            written += len(rows)
+        # The count goes in last, once we know how many records were written
+        f.seek(0)
+        f.write(HEADER.pack(written))
+
+    conn.close()
+    return written
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("import", "export"):
+        print("Usage: python legacy_import.py import|export <accounts.dat> [bank_system.db]")
+        sys.exit(1)
+
+    db_path = sys.argv[3] if len(sys.argv) > 3 else "bank_system.db"
+    if sys.argv[1] == "import":
+        imported, skipped, overdrawn = import_accounts_dat(sys.argv[2], db_path)
+        print(f"Imported {imported} legacy accounts ({skipped} already present, {overdrawn} overdrawn)")
+    else:
+        written = export_accounts_dat(sys.argv[2], db_path)
+        print(f"Exported {written} accounts to {sys.argv[2]}")
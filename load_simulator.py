@@ -0,0 +1,325 @@
+"""
+Load simulator for SecureBank Pro
+Runs virtual users against bank_management_app.py headlessly with
+Streamlit's AppTest, each in its own thread with its own session, the way
+one Streamlit server process serves its browser sessions. Every user logs
+in, then keeps cycling through the dashboard, a quick deposit, a transfer
+and the analytics page with random think times. Concurrency is ramped in
+levels; each level reports rerun latency percentiles per page and the
+overall rerun throughput, and the knee of the throughput curve is where
+adding users stops adding throughput or latency starts to climb. A virtual
+user transfers far more often than a person, so the app runs with the
+velocity rules disabled; the other fraud rules still run on every debit.
+"""
+
+import json
+import os
+import random
+import sys
+import threading
+import time
+from unittest.mock import MagicMock
+
+from streamlit import config
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.scriptrunner import ScriptRunnerEvent
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1 import app_test, local_script_runner
+
+from bank_database import BankDatabase
+from fraud_rules import DEFAULT_RULES, DEFAULT_RULES_PATH
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bank_management_app.py")
+USER_PREFIX = "loadsim"
+PASSWORD = "loadsim-password"
+MEAN_THINK_SECONDS = 2.0
+RUN_TIMEOUT = 60
+
+
+def _wait_for_session_idle(runner, timeout=3):
+    """Wait until the script thread has shut down, polling every millisecond
+
+    AppTest polls every 100 ms and returns at the first stop event, which
+    would round every latency up to 100 ms and return before an st.rerun()
+    has finished. The script thread only shuts down after the last rerun.
+    """
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if runner.events and runner.events[-1] == ScriptRunnerEvent.SHUTDOWN:
+            return
+        time.sleep(0.001)
+    runner.request_stop()
+    runner.join()
+    raise RuntimeError(f"AppTest script run timed out after {timeout}s")
+
+
+class _AppTestRuntime(Runtime):
+    """Target for AppTest's per-run Runtime._instance setup and teardown"""
+
+
+class _BrowserLikeScriptRunner(local_script_runner.LocalScriptRunner):
+    """Script runner that keeps only the elements of its last script pass
+
+    When the script calls st.rerun(), AppTest parses the messages of both
+    passes, so widgets the second pass no longer draws (a submitted form)
+    stay on the page with no state behind them and the next run fails.
+    A browser drops them, so the queue is cleared whenever a pass starts.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_event.connect(self._clear_on_script_start, weak=False)
+
+    def _clear_on_script_start(self, sender, event, **kwargs):
+        if event == ScriptRunnerEvent.SCRIPT_STARTED:
+            self.forward_msg_queue.clear()
+
+
+def _install_concurrent_harness():
+    """Let many AppTest sessions run at once in this process
+
+    AppTest expects one test at a time: every run installs a mock runtime
+    as the process-wide Runtime and clears it afterwards, which breaks the
+    other sessions mid-run. One shared mock runtime (with shared media and
+    cache storage, as on a real server) is installed instead, and AppTest's
+    own setup/teardown is pointed at a subclass where it does no harm.
+    Each run also patches config.get_option to turn on global.appTest, and
+    overlapping patches restore each other's original, so the option is
+    set for the whole process instead.
+    """
+    config.set_option("global.appTest", True)
+    shared_runtime = MagicMock(spec=Runtime)
+    shared_runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    shared_runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = shared_runtime
+    app_test.Runtime = _AppTestRuntime
+    app_test.LocalScriptRunner = _BrowserLikeScriptRunner
+    local_script_runner.require_widgets_deltas = _wait_for_session_idle
+
+
+def provision_users(db_path, count):
+    """Create loadsim users with a funded account each; returns [(username, account_number)]"""
+    db = BankDatabase(db_path)
+    users = []
+    for index in range(count):
+        username = f"{USER_PREFIX}{index}"
+        db.register_user(username, PASSWORD, f"{username}@example.com")
+        _, user_id = db.authenticate_user(username, PASSWORD)
+        accounts = db.get_user_accounts(user_id)
+        if not accounts:
+            db.create_account(user_id, "savings", f"Load Sim {index}", "0000000000", "Load test", 1_000_000)
+            accounts = db.get_user_accounts(user_id)
+        users.append((username, accounts[0][0]))
+    return users
+
+
+def write_load_test_rules(db_path, rules_path=DEFAULT_RULES_PATH):
+    """Copy of the fraud rules with velocity rules disabled, next to the database; returns its path"""
+    try:
+        with open(rules_path, encoding="utf-8") as f:
+            rules = json.load(f)["rules"]
+    except FileNotFoundError:
+        rules = DEFAULT_RULES
+    rules = [dict(rule, enabled=False) if rule["type"] == "velocity" else rule for rule in rules]
+    base, _ = os.path.splitext(db_path)
+    path = f"{base}.fraud_rules.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"rules": rules}, f, indent=4)
+    return path
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class VirtualUser:
+    """One browser session driving the app through AppTest"""
+
+    def __init__(self, username, transfer_to, samples, samples_lock, think_seconds):
+        self.username = username
+        self.transfer_to = transfer_to
+        self.samples = samples
+        self.samples_lock = samples_lock
+        self.think_seconds = think_seconds
+        self.app = AppTest.from_file(APP_PATH, default_timeout=RUN_TIMEOUT)
+
+    def _run(self, page):
+        started = time.perf_counter()
+        self.app.run()
+        elapsed = time.perf_counter() - started
+        failure = None
+        if self.app.exception:
+            failure = self.app.exception[0].message.splitlines()[0]
+        elif self.app.error:
+            failure = self.app.error[0].value
+        with self.samples_lock:
+            self.samples.append((page, elapsed, failure))
+
+    def _think(self, deadline):
+        pause = random.expovariate(1 / self.think_seconds) if self.think_seconds else 0
+        time.sleep(max(0.0, min(pause, deadline - time.time())))
+
+    def _widget(self, widgets, label):
+        for widget in widgets:
+            if widget.label == label:
+                return widget
+        raise LookupError(f"no {label!r} widget on the page")
+
+    def _navigate(self, option, page):
+        if not self.app.sidebar.selectbox:
+            # The last rerun failed before drawing the sidebar; reload the page like a user would
+            self._run("reload")
+        self._widget(self.app.sidebar.selectbox, "Navigate to:").select(option)
+        self._run(page)
+
+    def login(self):
+        self._run("auth")
+        self._widget(self.app.text_input, "Username").input(self.username)
+        self._widget(self.app.text_input, "Password").input(PASSWORD)
+        self._widget(self.app.button, "Login").click()
+        self._run("login")
+
+    def cycle(self, deadline):
+        """Dashboard, quick deposit, transfer and analytics, with think time between steps"""
+        self._navigate("🏠 Dashboard", "dashboard")
+        self._think(deadline)
+
+        self._widget(self.app.button, "💰 Make Deposit").click()
+        self._run("deposit_form")
+        self._widget(self.app.number_input, "Amount to Deposit").set_value(round(random.uniform(10, 500), 2))
+        self._widget(self.app.button, "Deposit").click()
+        self._run("deposit")
+        self._think(deadline)
+
+        self._navigate("🔄 Transfer Money", "transfer_form")
+        self._widget(self.app.text_input, "Destination Account Number").input(self.transfer_to)
+        self._widget(self.app.number_input, "Transfer Amount").set_value(round(random.uniform(1, 50), 2))
+        self._widget(self.app.button, "Transfer Money").click()
+        self._run("transfer")
+        self._think(deadline)
+
+        self._navigate("📊 Analytics", "analytics")
+        self._think(deadline)
+
+    def run_until(self, deadline):
+        logged_in = False
+        while time.time() < deadline:
+            try:
+                if not logged_in:
+                    self.login()
+                    logged_in = True
+                self.cycle(deadline)
+            except LookupError as e:
+                # A failed rerun left the page without the next widget; start the next cycle over
+                with self.samples_lock:
+                    self.samples.append(("lost_step", 0.0, str(e)))
+                self._think(deadline)
+
+
+def run_level(users, concurrency, duration, think_seconds):
+    """Run `concurrency` virtual users for `duration` seconds and summarise their reruns"""
+    samples = []
+    samples_lock = threading.Lock()
+    errors = []
+    deadline = time.time() + duration
+
+    def session(index):
+        username, _ = users[index]
+        transfer_to = users[(index + 1) % len(users)][1]
+        try:
+            VirtualUser(username, transfer_to, samples, samples_lock, think_seconds).run_until(deadline)
+        except Exception as e:
+            errors.append(f"{username}: {e!r}")
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=session, args=(index,), daemon=True) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    reruns = [(page, seconds) for page, seconds, _ in samples if page != "lost_step"]
+    failures = {}
+    for _, _, failure in samples:
+        if failure:
+            failures[failure] = failures.get(failure, 0) + 1
+
+    pages = {}
+    for page, seconds in reruns:
+        pages.setdefault(page, []).append(seconds)
+    all_latencies = sorted(seconds for _, seconds in reruns)
+    return {
+        "concurrency": concurrency,
+        "reruns": len(reruns),
+        "throughput": len(reruns) / elapsed,
+        "failures": sorted(failures.items(), key=lambda item: -item[1]),
+        "session_errors": errors,
+        "p95_ms": (percentile(all_latencies, 95) or 0) * 1000,
+        "pages": {
+            page: {q: percentile(sorted(latencies), q) * 1000 for q in (50, 95, 99)}
+            for page, latencies in sorted(pages.items())
+        },
+    }
+
+
+def find_knee(levels, min_gain=0.5, max_latency_growth=2.0):
+    """Highest concurrency before scaling breaks down
+
+    Going from one level to the next, throughput should grow roughly in
+    proportion to the number of users. The knee is the last level before
+    the extra throughput falls under `min_gain` of that ideal, or overall p95
+    latency exceeds `max_latency_growth` times the first level's.
+    """
+    for previous, current in zip(levels, levels[1:]):
+        ideal_gain = previous["throughput"] * (current["concurrency"] / previous["concurrency"] - 1)
+        actual_gain = current["throughput"] - previous["throughput"]
+        if actual_gain < min_gain * ideal_gain or current["p95_ms"] > max_latency_growth * levels[0]["p95_ms"]:
+            return previous["concurrency"]
+    return None
+
+
+def ramp(db_path="loadtest.db", max_users=32, level_seconds=30, think_seconds=MEAN_THINK_SECONDS):
+    """Run doubling concurrency levels up to max_users and print a report per level"""
+    # The app reads its database path from the environment on every rerun, and
+    # the database its fraud rules path when it is first opened
+    os.environ["BANK_DB_PATH"] = db_path
+    os.environ["FRAUD_RULES_PATH"] = write_load_test_rules(db_path)
+    _install_concurrent_harness()
+    users = provision_users(db_path, max(max_users, 2))
+
+    levels = []
+    concurrency = 1
+    while concurrency <= max_users:
+        level = run_level(users, concurrency, level_seconds, think_seconds)
+        levels.append(level)
+        print(f"\n{concurrency} users: {level['reruns']} reruns, {level['throughput']:.1f} reruns/s, "
+              f"{sum(count for _, count in level['failures'])} failed steps, "
+              f"{len(level['session_errors'])} sessions aborted")
+        for page, stats in level["pages"].items():
+            print(f"  {page:<14} p50 {stats[50]:8.1f} ms   p95 {stats[95]:8.1f} ms   p99 {stats[99]:8.1f} ms")
+        for failure, count in level["failures"][:3]:
+            print(f"  {count:>4} x {failure}")
+        for error in level["session_errors"][:3]:
+            print(f"  ! {error}")
+        concurrency *= 2
+
+    knee = find_knee(levels)
+    if knee is None:
+        print(f"\nNo knee up to {max_users} concurrent users")
+    else:
+        print(f"\nKnee of the curve at about {knee} concurrent users")
+    return levels, knee
+
+
+if __name__ == "__main__":
+    max_users = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    level_seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 30
+    ramp(max_users=max_users, level_seconds=level_seconds)
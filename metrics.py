@@ -0,0 +1,188 @@
+"""
+Metrics for SecureBank Pro
+Low-overhead counters and latency histograms for database methods and
+Streamlit pages, rendered in the Prometheus text format. Metrics can be
+served over HTTP (set BANK_METRICS_PORT) or written to a file. Setting
+BANK_SLOW_MS (e.g. 250) also logs calls slower than that to stderr; it is
+off by default, so batch runs stay quiet.
+"""
+
+import functools
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+slow_log = logging.getLogger("securebank.slow")
+slow_log.addHandler(logging.NullHandler())
+slow_threshold = float(os.environ["BANK_SLOW_MS"]) / 1000 if os.environ.get("BANK_SLOW_MS") else None
+if slow_threshold is not None:
+    # Asked for explicitly, so printed even when the process configures no logging
+    _slow_handler = logging.StreamHandler()
+    _slow_handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    slow_log.addHandler(_slow_handler)
+    slow_log.propagate = False
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_server = None
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.total += value
+        self.count += 1
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    """Increment a counter"""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, value, **labels):
+    """Record a value (seconds) in a histogram"""
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(value)
+
+
+class timed:
+    """Time a block or function into a histogram; usable as decorator or context manager"""
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._started
+        observe(self.name, elapsed, **self.labels)
+        if slow_threshold is not None and elapsed > slow_threshold:
+            slow_log.warning("slow call %s %s took %.1f ms", self.name, self.labels, elapsed * 1000)
+        return False
+
+    def __call__(self, func):
+        name, labels = self.name, self.labels
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(name, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def instrument_methods(metric_name):
+    """Class decorator timing every public method under one metric, labelled by method"""
+    def decorate(cls):
+        for attr, value in list(vars(cls).items()):
+            if callable(value) and not attr.startswith("_"):
+                setattr(cls, attr, timed(metric_name, method=attr)(value))
+        return cls
+    return decorate
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, (list(h.counts), h.total, h.count, h.buckets))
+                            for key, h in _histograms.items())
+
+    seen = set()
+    for (name, labels), value in counters:
+        if name not in seen:
+            lines.append(f"# TYPE {name} counter")
+            seen.add(name)
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for (name, labels), (counts, total, count, buckets) in histograms:
+        if name not in seen:
+            lines.append(f"# TYPE {name} histogram")
+            seen.add(name)
+        cumulative = 0
+        for bound, bucket_count in zip(buckets, counts):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path):
+    """Atomically write the current metrics to a file (node_exporter textfile style)"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(temp_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host="127.0.0.1"):
+    """Serve /metrics from a background thread; repeated calls are ignored"""
+    global _server
+    with _lock:
+        if _server is not None:
+            return _server
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    return _server
+
+
+def start_from_env():
+    """Start the HTTP endpoint if BANK_METRICS_PORT is set"""
+    port = os.environ.get("BANK_METRICS_PORT")
+    if port:
+        start_http_server(int(port))
@@ -0,0 +1,193 @@
+"""
+Read replicas for SecureBank Pro
+Keeps a read-only snapshot of bank_system.db for analytics, search and
+exports, so heavy reads do not compete with transfers for the primary.
+Snapshots are taken with SQLite's online backup API in a single step: the
+primary runs in WAL mode, so the copy reads one consistent snapshot while
+writers carry on (a page-stepped copy restarts whenever the primary is
+written, and under steady traffic never finishes). Every refresh writes a
+new file, so a long report keeps the snapshot it opened and never blocks
+the next refresh; a replaced snapshot is deleted when its last reader
+closes. Reads fall back to the primary when the snapshot is older than the
+configured staleness bound.
+"""
+
+import functools
+import glob
+import os
+import sqlite3
+import threading
+import time
+
+from metrics import observe, inc
+
+# Snapshots left behind by other processes are removed once this old; live ones refresh far more often
+ORPHAN_SNAPSHOT_SECONDS = 3600
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def _remove_snapshot(path):
+    try:
+        os.remove(path)
+    except (FileNotFoundError, PermissionError):
+        # Gone already, or (on Windows) still open in another process: the orphan sweep retries
+        pass
+
+
+class SnapshotConnection(sqlite3.Connection):
+    """Read connection on a snapshot; closing it releases the snapshot file"""
+
+    release = None
+
+    def close(self):
+        release, self.release = self.release, None
+        super().close()
+        if release:
+            release()
+
+
+class ReplicaManager:
+    """Maintains a periodically refreshed snapshot of a primary database"""
+
+    def __init__(self, primary_path, max_staleness=30.0):
+        self.primary_path = primary_path
+        self.max_staleness = max_staleness
+        base, _ = os.path.splitext(primary_path)
+        self._snapshot_glob = f"{base}.replica-*.db"
+        # Per process and generation, so processes sharing a primary never write each other's files
+        self._snapshot_prefix = f"{base}.replica-{os.getpid()}-"
+        self._generation = 0
+        self.current_path = None
+        self.refreshed_at = None
+        # Open references per snapshot file: its readers, plus one for the current snapshot
+        self._references = {}
+        self._references_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._remove_orphans()
+
+    def _remove_orphans(self):
+        """Delete snapshots of processes that are gone (an earlier process with our pid, or old files)"""
+        cutoff = time.time() - ORPHAN_SNAPSHOT_SECONDS
+        for path in glob.glob(self._snapshot_glob):
+            try:
+                orphaned = path.startswith(self._snapshot_prefix) or os.path.getmtime(path) < cutoff
+            except FileNotFoundError:
+                continue
+            if orphaned:
+                _remove_snapshot(path)
+
+    def _release(self, path):
+        """Drop one reference to a snapshot, deleting the file with the last one"""
+        with self._references_lock:
+            self._references[path] -= 1
+            if self._references[path]:
+                return
+            del self._references[path]
+        _remove_snapshot(path)
+
+    def refresh(self):
+        """Copy the primary into a new snapshot file, then switch readers to it"""
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            self._generation += 1
+            target = f"{self._snapshot_prefix}{self._generation}.db"
+            started = time.perf_counter()
+            snapshot_time = time.time()
+
+            source = sqlite3.connect(self.primary_path, timeout=30)
+            destination = sqlite3.connect(target, timeout=30)
+            try:
+                source.backup(destination)
+                # Snapshots are opened read-only, which a WAL file without its -shm cannot always be
+                destination.execute("PRAGMA journal_mode=DELETE")
+            except Exception:
+                destination.close()
+                _remove_snapshot(target)
+                raise
+            finally:
+                destination.close()
+                source.close()
+
+            with self._references_lock:
+                self._references[target] = 1
+                previous, self.current_path = self.current_path, target
+                self.refreshed_at = snapshot_time
+            if previous:
+                self._release(previous)
+            observe("replica_refresh_seconds", time.perf_counter() - started)
+            return True
+        finally:
+            self._refresh_lock.release()
+
+    def staleness(self):
+        """Seconds since the current snapshot was taken, or None if there is none"""
+        if self.refreshed_at is None:
+            return None
+        return time.time() - self.refreshed_at
+
+    def connect(self, max_staleness=None):
+        """Open a read connection on the snapshot, or on the primary if it is too stale
+
+        A snapshot connection keeps its file until it is closed, however
+        many refreshes happen meanwhile.
+        """
+        bound = self.max_staleness if max_staleness is None else max_staleness
+        path = None
+        with self._references_lock:
+            age = self.staleness()
+            if age is not None and age <= bound:
+                path = self.current_path
+                self._references[path] += 1
+        if path:
+            try:
+                conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, factory=SnapshotConnection)
+            except Exception:
+                self._release(path)
+                raise
+            conn.release = functools.partial(self._release, path)
+            inc("replica_reads_total", source="replica")
+            return conn
+
+        # Too stale: serve this read from the primary and refresh in the background
+        if self._thread is None:
+            threading.Thread(target=self.refresh, name="replica-refresh", daemon=True).start()
+        inc("replica_reads_total", source="primary")
+        return sqlite3.connect(self.primary_path)
+
+    def _loop(self, interval):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except sqlite3.Error:
+                inc("replica_refresh_errors_total")
+            self._stop.wait(interval)
+
+    def start(self, interval=None):
+        """Refresh the snapshot periodically in a background thread"""
+        if self._thread is None:
+            interval = interval or self.max_staleness / 2
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, args=(interval,),
+                                            name="replica-refresher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+
+def get_replica_manager(primary_path, max_staleness=30.0):
+    """Process-wide replica manager for a primary (Streamlit reruns share one)"""
+    with _managers_lock:
+        manager = _managers.get(primary_path)
+        if manager is None:
+            manager = _managers[primary_path] = ReplicaManager(primary_path, max_staleness)
+            manager.start()
+        return manager
@@ -0,0 +1,660 @@
+"""
+Account-sharded storage for SecureBank Pro
+Spreads accounts over several SQLite files, picked by a stable hash of the
+account number, so deposits, withdrawals and transfers on different shards
+no longer queue behind one database write lock. ShardedBankDatabase keeps
+the BankDatabase API: users and the cross-shard transfer log stay in the
+catalog database at db_path, single-account calls go to the owning shard,
+and multi-account reads are scattered over the shards and merged.
+
+A transfer between two shards is a two-phase commit. Both shards are
+locked in shard order and both legs are written without committing
+(prepare); the commit decision is then logged durably in the catalog, and
+only after that does each shard commit, the source first. A crash before
+the decision rolls both shards back (presumed abort); after it, recover()
+redoes whichever leg is missing, using a per-shard marker to tell which
+legs committed. SQLite cannot keep a prepared transaction across a crash,
+so the shard locks are gone by then: a redone debit checks the balance
+again and aborts the transfer if the funds were spent meanwhile (the
+source commits first, so no credit exists without its debit), and a
+credit whose account has disappeared is refunded to the source.
+Transfers into a striped hot account (see striping.py) run the same
+protocol with one of the account's stripe files in place of the
+destination shard, so that shard is never locked; the stripe file keeps
+its own leg marker, so recover() can tell whether the credit committed.
+"""
+
+import heapq
+import os
+import random
+import sqlite3
+import sys
+import uuid
+import zlib
+
+from arrow_results import SEARCH_SCHEMA, newest_rows
+from bank_database import BankDatabase
+from cdc import notify_committed
+from event_log import append_event, DEPOSITED, WITHDRAWN
+from idempotency import request_fingerprint, lookup_result, store_result
+from metrics import instrument_methods
+from striping import stripe_paths, post_stripe_credit, DEFAULT_STRIPES
+
+DEFAULT_SHARD_COUNT = 4
+
+
+def shard_index(account_number, shard_count):
+    """Shard owning an account; CRC32 so every process routes the same way"""
+    return zlib.crc32(account_number.encode("utf-8")) % shard_count
+
+
+def init_catalog_tables(cursor):
+    """Create the shard map and the cross-shard transfer decision log"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS shard_map (
+            shard INTEGER PRIMARY KEY,
+            path TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS shard_transfers (
+            txid TEXT PRIMARY KEY,
+            from_account TEXT NOT NULL,
+            to_account TEXT NOT NULL,
+            amount REAL NOT NULL,
+            reference TEXT NOT NULL,
+            idempotency_key TEXT,
+            status TEXT NOT NULL DEFAULT 'committed',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_shard_transfers_status
+        ON shard_transfers (status)
+    ''')
+    # Stripe file of the destination that takes the credit, NULL when it is the destination shard
+    cursor.execute("PRAGMA table_info(shard_transfers)")
+    if "stripe" not in [column[1] for column in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE shard_transfers ADD COLUMN stripe INTEGER")
+
+
+def init_shard_tables(cursor):
+    """Create the marker table recording which cross-shard transfer legs a shard committed"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS shard_transfer_legs (
+            txid TEXT NOT NULL,
+            leg TEXT NOT NULL,
+            PRIMARY KEY (txid, leg)
+        )
+    ''')
+
+
+def _connect_stripe(shard, stripe):
+    """Connection to one of a shard's stripe files, with the leg marker table in place"""
+    conn = sqlite3.connect(stripe_paths(shard.db_path)[stripe], timeout=30)
+    init_shard_tables(conn.cursor())
+    return conn
+
+
+def _leg_committed(cursor, txid, leg):
+    cursor.execute("SELECT 1 FROM shard_transfer_legs WHERE txid = ? AND leg = ?", (txid, leg))
+    return cursor.fetchone() is not None
+
+
+def _balance(cursor, account_number):
+    """Balance of an account, or None if the shard does not hold it"""
+    cursor.execute("SELECT balance FROM accounts WHERE account_number = ?", (account_number,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _post_debit(shard, cursor, from_account, to_account, amount, reference, idempotency_key=None):
+    """Debit the source of a transfer whose credit is written to another file (balance checked by the caller)"""
+    new_balance = _balance(cursor, from_account) - amount
+    cursor.execute("UPDATE accounts SET balance = ? WHERE account_number = ?", (new_balance, from_account))
+    shard._insert_transaction(cursor, from_account, "transfer_out", amount, new_balance,
+                              f"Transfer to {to_account}", reference)
+    # The destination lives in another file, so each leg gets a single-account event
+    append_event(cursor, WITHDRAWN, from_account, {
+        "amount": amount, "balance_after": new_balance, "reference": reference, "to_account": to_account
+    })
+    if idempotency_key:
+        store_result(cursor, idempotency_key, "transfer", request_fingerprint(from_account, to_account, float(amount)),
+                     (True, f"Transfer successful! Reference: {reference}"))
+
+
+def _apply_debit(shard, cursor, txid, from_account, to_account, amount, reference, idempotency_key=None):
+    """Write the source leg of a cross-shard transfer in the caller's transaction"""
+    _post_debit(shard, cursor, from_account, to_account, amount, reference, idempotency_key)
+    cursor.execute("INSERT INTO shard_transfer_legs (txid, leg) VALUES (?, 'debit')", (txid,))
+
+
+def _apply_credit(shard, cursor, txid, from_account, to_account, amount):
+    """Write the destination leg of a cross-shard transfer in the caller's transaction"""
+    cursor.execute("UPDATE accounts SET balance = balance + ? WHERE account_number = ? RETURNING balance",
+                   (amount, to_account))
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError("Destination account not found")
+    new_balance = row[0]
+    reference = shard.add_transaction(to_account, "transfer_in", amount, new_balance,
+                                      f"Transfer from {from_account}", cursor)
+    append_event(cursor, DEPOSITED, to_account, {
+        "amount": amount, "balance_after": new_balance, "reference": reference, "from_account": from_account
+    })
+    cursor.execute("INSERT INTO shard_transfer_legs (txid, leg) VALUES (?, 'credit')", (txid,))
+
+
+def _apply_stripe_credit(cursor, txid, stripe, from_account, to_account, amount):
+    """Write the destination leg of a transfer into a striped account, in the stripe file's transaction"""
+    post_stripe_credit(cursor, stripe, to_account, "transfer_in", amount, f"Transfer from {from_account}")
+    cursor.execute("INSERT INTO shard_transfer_legs (txid, leg) VALUES (?, 'credit')", (txid,))
+
+
+def _apply_refund(shard, cursor, txid, from_account, to_account, amount):
+    """Give a debited source its money back when the credit can no longer be applied"""
+    new_balance = _balance(cursor, from_account) + amount
+    cursor.execute("UPDATE accounts SET balance = ? WHERE account_number = ?", (new_balance, from_account))
+    reference = shard.add_transaction(from_account, "transfer_in", amount, new_balance,
+                                      f"Reversal of transfer to {to_account}", cursor)
+    append_event(cursor, DEPOSITED, from_account, {
+        "amount": amount, "balance_after": new_balance, "reference": reference, "from_account": to_account
+    })
+    cursor.execute("INSERT INTO shard_transfer_legs (txid, leg) VALUES (?, 'refund')", (txid,))
+
+
+@instrument_methods("sharded_db_call_seconds")
+class ShardedBankDatabase(BankDatabase):
+    """BankDatabase API over a catalog database and N account shards"""
+
+    def __init__(self, db_path="bank_system.db", shard_count=None):
+        base, _ = os.path.splitext(db_path)
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        init_catalog_tables(cursor)
+        cursor.execute("SELECT path FROM shard_map ORDER BY shard")
+        paths = [row[0] for row in cursor.fetchall()]
+        if not paths:
+            # The shard count is fixed when the catalog is created: routing depends on it
+            paths = [f"{base}.shard{index}.db" for index in range(shard_count or DEFAULT_SHARD_COUNT)]
+            cursor.executemany("INSERT INTO shard_map (shard, path) VALUES (?, ?)", enumerate(paths))
+        elif shard_count and shard_count != len(paths):
+            conn.close()
+            raise ValueError(f"{db_path} was created with {len(paths)} shards, not {shard_count}")
+        conn.commit()
+        conn.close()
+
+        self.shard_paths = paths
+        self.shards = [BankDatabase(path) for path in paths]
+        for shard in self.shards:
+            conn = sqlite3.connect(shard.db_path)
+            init_shard_tables(conn.cursor())
+            conn.commit()
+            conn.close()
+
+        super().__init__(db_path)
+        self.recover()
+
+    def shard_for(self, account_number):
+        """The shard BankDatabase holding an account"""
+        return self.shards[shard_index(account_number, len(self.shards))]
+
+    def _group_by_shard(self, account_numbers):
+        groups = {}
+        for account_number in account_numbers:
+            groups.setdefault(shard_index(account_number, len(self.shards)), []).append(account_number)
+        return [(self.shards[index], accounts) for index, accounts in sorted(groups.items())]
+
+    def enable_replica(self, max_staleness=30.0):
+        """Serve snapshot reads from a read replica of every shard"""
+        for shard in self.shards:
+            shard.enable_replica(max_staleness)
+
+    def purge_expired_idempotency_keys(self):
+        """Remove expired idempotency keys from every shard"""
+        return sum(shard.purge_expired_idempotency_keys() for shard in self.shards)
+
+    def update_projections(self):
+        """Catch up the projections of every shard, keyed by shard path"""
+        return {shard.db_path: shard.update_projections() for shard in self.shards}
+
+    def generate_account_number(self):
+        """Generate an account number unused on the shard it routes to"""
+        # A number can only ever live on its own shard, so that is the only one to check
+        while True:
+            account_number = f"ACC{random.randint(100000000, 999999999)}"
+            if not self.shard_for(account_number).directory.contains(account_number, verify_misses=False):
+                return account_number
+
+    def create_account(self, user_id, account_type, name, phone, address, initial_deposit=0, account_number=None):
+        """Create a new bank account on the shard its number routes to"""
+        account_number = account_number or self.generate_account_number()
+        return self.shard_for(account_number).create_account(
+            user_id, account_type, name, phone, address, initial_deposit, account_number
+        )
+
+    def get_user_accounts(self, user_id):
+        """Get all accounts for a user, from every shard, oldest first"""
+        accounts = [account for shard in self.shards for account in shard.get_user_accounts(user_id)]
+        return sorted(accounts, key=lambda account: account[6])
+
+    def get_account_details(self, account_number):
+        """Get account details"""
+        return self.shard_for(account_number).get_account_details(account_number)
+
+    def update_balance(self, account_number, new_balance):
+        """Update account balance"""
+        self.shard_for(account_number).update_balance(account_number, new_balance)
+
+    def add_transaction(self, account_number, transaction_type, amount, balance_after, description, cursor=None):
+        """Add a transaction record (a cursor must belong to the account's shard)"""
+        return self.shard_for(account_number).add_transaction(
+            account_number, transaction_type, amount, balance_after, description, cursor
+        )
+
+    def bulk_credit(self, credits, description, cursor=None):
+        """Credit many accounts, routed to their shards; returns references in the order of credits
+
+        A cursor must be open on the one shard holding every credited account,
+        and the credits join its transaction. Without one, each shard posts
+        its share in its own transaction.
+        """
+        if cursor is not None:
+            cursor.execute("PRAGMA database_list")
+            path = next(row[2] for row in cursor.fetchall() if row[1] == "main")
+            shard = next((shard for shard in self.shards
+                          if os.path.realpath(shard.db_path) == os.path.realpath(path)), None)
+            if shard is None or any(self.shard_for(account_number) is not shard for account_number, _ in credits):
+                raise ValueError("bulk_credit with a cursor needs a cursor on the shard holding every credited account")
+            return shard.bulk_credit(credits, description, cursor)
+
+        positions = {}
+        for position, (account_number, _) in enumerate(credits):
+            positions.setdefault(shard_index(account_number, len(self.shards)), []).append(position)
+        references = [None] * len(credits)
+        for index, shard_positions in sorted(positions.items()):
+            shard = self.shards[index]
+            conn = sqlite3.connect(shard.db_path, timeout=30)
+            try:
+                shard_cursor = conn.cursor()
+                shard._begin_write(shard_cursor)
+                posted = shard.bulk_credit([credits[position] for position in shard_positions], description,
+                                           shard_cursor)
+                shard._commit(conn)
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+            for position, reference in zip(shard_positions, posted):
+                references[position] = reference
+        if credits:
+            notify_committed()
+        return references
+
+    def get_transactions(self, account_number, limit=50, snapshot=False, as_arrow=False):
+        """Get transaction history for an account"""
+        return self.shard_for(account_number).get_transactions(account_number, limit, snapshot, as_arrow)
+
+    def search_transactions(self, account_numbers, transaction_type=None, date_from=None, date_to=None,
+                            min_amount=None, max_amount=None, limit=500, snapshot=True, as_arrow=False):
+        """Search each shard for its accounts and merge the newest `limit` matches"""
+        results = [
+            shard.search_transactions(accounts, transaction_type, date_from, date_to,
+                                      min_amount, max_amount, limit, snapshot, as_arrow)
+            for shard, accounts in self._group_by_shard(account_numbers)
+        ]
+        if as_arrow:
+            return newest_rows(results, SEARCH_SCHEMA, limit)
+        # Every shard answers newest first, so a merge keeps the order without a full sort
+        return list(heapq.merge(*results, key=lambda row: row[5], reverse=True))[:limit]
+
+    def spending_by_category(self, account_numbers, since=None, snapshot=True):
+        """Count and total of withdrawals and outgoing transfers per spend category, over all shards"""
+        totals = {}
+        for shard, accounts in self._group_by_shard(account_numbers):
+            for category, count, total in shard.spending_by_category(accounts, since, snapshot):
+                previous_count, previous_total = totals.get(category, (0, 0.0))
+                totals[category] = (previous_count + count, previous_total + total)
+        return sorted(((category, count, total) for category, (count, total) in totals.items()),
+                      key=lambda row: -row[2])
+
+    def balances_at(self, at, account_numbers=None, snapshot=False):
+        """Balances of many accounts (all if None) at one UTC timestamp, one query per shard"""
+        if account_numbers is None:
+            groups = [(shard, None) for shard in self.shards]
+        else:
+            groups = self._group_by_shard(account_numbers)
+        balances = {}
+        for shard, accounts in groups:
+            balances.update(shard.balances_at(at, accounts, snapshot))
+        return balances
+
+    def deposit(self, account_number, amount, description="Cash deposit", idempotency_key=None):
+        """Deposit money into an account"""
+        return self.shard_for(account_number).deposit(account_number, amount, description, idempotency_key)
+
+    def withdraw(self, account_number, amount, description="Cash withdrawal", idempotency_key=None):
+        """Withdraw money from an account"""
+        return self.shard_for(account_number).withdraw(account_number, amount, description, idempotency_key)
+
+    def enable_striping(self, account_number, stripe_count=DEFAULT_STRIPES):
+        """Spread an account's incoming credits over stripe files of its shard"""
+        return self.shard_for(account_number).enable_striping(account_number, stripe_count)
+
+    def disable_striping(self, account_number):
+        """Stop striping an account and fold its pending credits into the ledger"""
+        return self.shard_for(account_number).disable_striping(account_number)
+
+    def stripe_count(self, account_number):
+        """Number of stripes of an account, 0 if it is not striped"""
+        return self.shard_for(account_number).stripe_count(account_number)
+
+    def sweep_stripes(self, account_number=None):
+        """Move pending stripe credits into balances and the ledger, on one shard or all"""
+        if account_number is not None:
+            return self.shard_for(account_number).sweep_stripes(account_number)
+        return sum(shard.sweep_stripes() for shard in self.shards)
+
+    def transfer_money(self, from_account, to_account, amount, idempotency_key=None):
+        """Transfer money between accounts, with a two-phase commit when they are on different shards"""
+        source, destination = self.shard_for(from_account), self.shard_for(to_account)
+        if source is destination:
+            return source.transfer_money(from_account, to_account, amount, idempotency_key)
+        if not destination.directory.contains(to_account):
+            return False, "Destination account not found"
+        if source.stripe_count(from_account):
+            source.sweep_stripes(from_account)
+        if destination.stripe_count(to_account):
+            return self._transfer_to_stripe(source, destination, from_account, to_account, amount, idempotency_key)
+
+        txid = uuid.uuid4().hex
+        reference = f"TXN{uuid.uuid4().hex[:10].upper()}"
+        # Locks are always taken in shard order, so opposite transfers cannot deadlock
+        ordered = sorted((source, destination), key=self.shards.index)
+        connections = {shard: sqlite3.connect(shard.db_path) for shard in ordered}
+        cursors = {shard: connections[shard].cursor() for shard in ordered}
+        decided = False
+
+        try:
+            # Phase 1 (prepare): lock both shards, validate, write both legs uncommitted
+            for shard in ordered:
+                shard._begin_write(cursors[shard])
+            source_cursor, destination_cursor = cursors[source], cursors[destination]
+
+            if idempotency_key:
+                previous = lookup_result(source_cursor, idempotency_key, "transfer",
+                                         request_fingerprint(from_account, to_account, float(amount)))
+                if previous:
+                    return previous
+
+            source_cursor.execute("SELECT balance FROM accounts WHERE account_number = ?", (from_account,))
+            source_balance = source_cursor.fetchone()
+            if not source_balance or source_balance[0] < amount:
+                return False, "Insufficient balance or invalid source account"
+
+            allowed, reason = source.fraud_engine.check(from_account, amount, beneficiary=to_account)
+            if not allowed:
+                return False, reason
+
+            _apply_debit(source, source_cursor, txid, from_account, to_account, amount, reference, idempotency_key)
+            _apply_credit(destination, destination_cursor, txid, from_account, to_account, amount)
+
+            # Phase 2: the logged decision is the commit point; each shard commits after it,
+            # the source first so a credit is never durable without its debit
+            self._log_decision(txid, from_account, to_account, amount, reference, idempotency_key)
+            decided = True
+            for shard in (source, destination):
+                shard._commit(connections[shard])
+        except Exception as e:
+            for conn in connections.values():
+                conn.rollback()
+            if not decided:
+                return False, str(e)
+            # Committed by decision: redo whichever leg did not make it
+            self.recover()
+            if self._transfer_status(txid) != "done":
+                return False, "Transfer aborted: it could not be completed after a failure"
+        finally:
+            for conn in connections.values():
+                conn.close()
+
+        self._mark_done(txid)
+        notify_committed()
+        source.fraud_engine.record(from_account, amount, beneficiary=to_account)
+        return True, f"Transfer successful! Reference: {reference}"
+
+    def _transfer_to_stripe(self, source, destination, from_account, to_account, amount, idempotency_key=None):
+        """Cross-shard transfer into a striped account: a two-phase commit over the source shard and one stripe
+
+        The credit goes to the destination stripe picked by the source shard,
+        so the destination shard is never locked and sources on different
+        shards write to different stripes. The decision is logged as for any
+        cross-shard transfer, and recover() finishes whichever leg is missing.
+        """
+        stripe = self.shards.index(source) % destination.stripe_count(to_account)
+        txid = uuid.uuid4().hex
+        reference = f"TXN{uuid.uuid4().hex[:10].upper()}"
+        source_conn = sqlite3.connect(source.db_path)
+        stripe_conn = _connect_stripe(destination, stripe)
+        source_cursor, stripe_cursor = source_conn.cursor(), stripe_conn.cursor()
+        decided = False
+
+        try:
+            # Phase 1 (prepare): the shard is locked before the stripe, the order a sweep takes them in
+            source._begin_write(source_cursor)
+            destination._begin_write(stripe_cursor)
+            if idempotency_key:
+                previous = lookup_result(source_cursor, idempotency_key, "transfer",
+                                         request_fingerprint(from_account, to_account, float(amount)))
+                if previous:
+                    return previous
+
+            source_cursor.execute("SELECT balance FROM accounts WHERE account_number = ?", (from_account,))
+            source_balance = source_cursor.fetchone()
+            if not source_balance or source_balance[0] < amount:
+                return False, "Insufficient balance or invalid source account"
+
+            allowed, reason = source.fraud_engine.check(from_account, amount, beneficiary=to_account)
+            if not allowed:
+                return False, reason
+
+            _apply_debit(source, source_cursor, txid, from_account, to_account, amount, reference, idempotency_key)
+            _apply_stripe_credit(stripe_cursor, txid, stripe, from_account, to_account, amount)
+
+            # Phase 2, as in transfer_money: the decision is the commit point, the source commits first
+            self._log_decision(txid, from_account, to_account, amount, reference, idempotency_key, stripe)
+            decided = True
+            source._commit(source_conn)
+            destination._commit(stripe_conn)
+        except Exception as e:
+            source_conn.rollback()
+            stripe_conn.rollback()
+            if not decided:
+                return False, str(e)
+            self.recover()
+            if self._transfer_status(txid) != "done":
+                return False, "Transfer aborted: it could not be completed after a failure"
+        finally:
+            source_conn.close()
+            stripe_conn.close()
+
+        self._mark_done(txid)
+        notify_committed()
+        destination.pending_credits.add(to_account, amount)
+        source.fraud_engine.record(from_account, amount, beneficiary=to_account)
+        return True, f"Transfer successful! Reference: {reference}"
+
+    def _log_decision(self, txid, from_account, to_account, amount, reference, idempotency_key, stripe=None):
+        """Durably record that a cross-shard transfer commits (stripe: the destination stripe taking the credit)"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute('''
+                INSERT INTO shard_transfers (txid, from_account, to_account, amount, reference, idempotency_key, stripe)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (txid, from_account, to_account, amount, reference, idempotency_key, stripe))
+            self._commit(conn)
+        finally:
+            conn.close()
+
+    def _mark_done(self, txid, status="done"):
+        """Close a logged transfer: 'done', 'aborted' (nothing applied) or 'refunded'"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute("UPDATE shard_transfers SET status = ? WHERE txid = ? AND status = 'committed'",
+                         (status, txid))
+            self._commit(conn)
+        finally:
+            conn.close()
+
+    def _transfer_status(self, txid):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute("SELECT status FROM shard_transfers WHERE txid = ?", (txid,)).fetchone()
+            return row[0] if row else None
+        finally:
+            conn.close()
+
+    def recover(self):
+        """Finish cross-shard transfers that were logged as committed but not applied on both shards
+
+        Each leg is checked under its shard's write lock, so a transfer that
+        is still committing in another process is waited for, not redone.
+        A lost debit is only redone if the source can still pay; otherwise
+        the transfer is aborted. A credit to an account that no longer
+        exists is refunded to the source; a credit to a stripe file is always
+        redone there (the sweep posts it). Returns the number of legs written.
+        """
+        conn = sqlite3.connect(self.db_path)
+        pending = conn.execute('''
+            SELECT txid, from_account, to_account, amount, reference, idempotency_key, stripe
+            FROM shard_transfers WHERE status = 'committed'
+        ''').fetchall()
+        conn.close()
+
+        redone = 0
+        for txid, from_account, to_account, amount, reference, idempotency_key, stripe in pending:
+            source, destination = self.shard_for(from_account), self.shard_for(to_account)
+
+            conn = sqlite3.connect(source.db_path, timeout=30)
+            cursor = conn.cursor()
+            try:
+                source._begin_write(cursor)
+                if not _leg_committed(cursor, txid, "debit"):
+                    # The prepare-time balance check died with the crash: check again
+                    balance = _balance(cursor, from_account)
+                    if balance is None or balance < amount:
+                        conn.rollback()
+                        self._mark_done(txid, "aborted")
+                        continue
+                    _apply_debit(source, cursor, txid, from_account, to_account, amount, reference,
+                                 idempotency_key)
+                    source._commit(conn)
+                    redone += 1
+            finally:
+                conn.close()
+
+            if stripe is not None:
+                conn = _connect_stripe(destination, stripe)
+                cursor = conn.cursor()
+                try:
+                    destination._begin_write(cursor)
+                    if not _leg_committed(cursor, txid, "credit"):
+                        _apply_stripe_credit(cursor, txid, stripe, from_account, to_account, amount)
+                        destination._commit(conn)
+                        destination.pending_credits.invalidate(to_account)
+                        redone += 1
+                finally:
+                    conn.close()
+                self._mark_done(txid)
+                continue
+
+            conn = sqlite3.connect(destination.db_path, timeout=30)
+            cursor = conn.cursor()
+            try:
+                destination._begin_write(cursor)
+                credited = _leg_committed(cursor, txid, "credit")
+                if not credited and _balance(cursor, to_account) is not None:
+                    _apply_credit(destination, cursor, txid, from_account, to_account, amount)
+                    destination._commit(conn)
+                    credited = True
+                    redone += 1
+            finally:
+                conn.close()
+
+            if credited:
+                self._mark_done(txid)
+                continue
+            conn = sqlite3.connect(source.db_path, timeout=30)
+            cursor = conn.cursor()
+            try:
+                source._begin_write(cursor)
+                if not _leg_committed(cursor, txid, "refund") and _balance(cursor, from_account) is not None:
+                    _apply_refund(source, cursor, txid, from_account, to_account, amount)
+                    source._commit(conn)
+                    redone += 1
+            finally:
+                conn.close()
+            self._mark_done(txid, "refunded")
+        if redone:
+            notify_committed()
+        return redone
+
+
+def _benchmark_worker(db_path, account_numbers, barrier, seconds):
+    """Deposit into random accounts for `seconds` once every worker is ready; returns (committed, failed)"""
+    import time
+
+    db = ShardedBankDatabase(db_path)
+    barrier.wait()
+    committed = failed = 0
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        success, _ = db.deposit(random.choice(account_numbers), 1.0, "Benchmark deposit")
+        if success:
+            committed += 1
+        else:
+            failed += 1
+    return committed, failed
+
+
+def benchmark(shard_counts=(1, 2, 4, 8), workers=None, accounts=2000, seconds=10.0, directory="shard_benchmark"):
+    """Deposit throughput with `workers` writer processes for each shard count"""
+    import shutil
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import Manager
+
+    workers = workers or max(os.cpu_count() or 1, 4)
+    results = {}
+    for shard_count in shard_counts:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        db_path = os.path.join(directory, "bank.db")
+        db = ShardedBankDatabase(db_path, shard_count)
+        db.register_user("benchmark", "benchmark", "benchmark@example.com")
+        _, user_id = db.authenticate_user("benchmark", "benchmark")
+        account_numbers = [db.create_account(user_id, "savings", f"Benchmark {index}", "", "", 100.0)[1]
+                           for index in range(accounts)]
+
+        # Workers open the database first and start writing together
+        with Manager() as manager, ProcessPoolExecutor(max_workers=workers) as executor:
+            barrier = manager.Barrier(workers)
+            futures = [executor.submit(_benchmark_worker, db_path, account_numbers, barrier, seconds)
+                       for _ in range(workers)]
+            outcomes = [future.result() for future in futures]
+        committed = sum(ok for ok, _ in outcomes)
+        failed = sum(bad for _, bad in outcomes)
+        results[shard_count] = committed / seconds
+        print(f"{shard_count} shard(s), {workers} writers: {committed / seconds:8.0f} deposits/s "
+              f"({failed} failed, {results[shard_count] / results[shard_counts[0]]:.2f}x)")
+    shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--recover":
+        db_path = sys.argv[2] if len(sys.argv) > 2 else "bank_system.db"
+        print(f"Redid {ShardedBankDatabase(db_path).recover()} transfer legs")
+    else:
+        counts = tuple(int(n) for n in sys.argv[1:]) or (1, 2, 4, 8)
+        benchmark(counts)
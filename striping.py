@@ -0,0 +1,186 @@
+"""
+Hot-account striping for SecureBank Pro
+A merchant or payroll account receiving a stream of credits makes every
+deposit queue behind the same write lock. SQLite locks whole files, not
+rows, so the sub-balances of a striped account live in separate stripe
+files next to the database: a credit picks a stripe by hash and only locks
+that file, so K stripes take K credits at once. The visible balance is the
+account balance plus the unswept stripe credits (cached briefly per
+process). A sweep moves pending credits into the ledger in time order and
+deletes them from the stripe files in one transaction; a credit whose
+reference is already in the ledger is only deleted, so a sweep cut short
+between files is finished by the next one. Debits sweep first and then
+check the consolidated balance, so they can never overdraw.
+"""
+
+import os
+import threading
+import time
+import zlib
+
+from idempotency import init_idempotency_table
+
+DEFAULT_STRIPES = 4
+# A sweep attaches every stripe file at once and SQLite allows 10 attached databases
+MAX_STRIPES = 8
+PENDING_CACHE_SECONDS = 1.0
+STRIPE_REFERENCE_PREFIX = "TXS"
+
+
+def stripe_paths(db_path):
+    """Paths of the stripe files belonging to a database"""
+    base, _ = os.path.splitext(db_path)
+    return [f"{base}.stripe{index}.db" for index in range(MAX_STRIPES)]
+
+
+def stripe_index(key, stripe_count):
+    """Stripe a credit lands on; CRC32 so retries and other processes pick the same one"""
+    return zlib.crc32(key.encode("utf-8")) % stripe_count
+
+
+def stripe_reference(stripe, credit_id):
+    """Ledger reference of a stripe credit, unique because stripe ids are never reused"""
+    return f"{STRIPE_REFERENCE_PREFIX}{stripe}{credit_id:09d}"
+
+
+def init_striping_tables(cursor):
+    """Create the table of striped accounts in the main database"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS striped_accounts (
+            account_number TEXT PRIMARY KEY,
+            stripe_count INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def init_stripe_tables(cursor):
+    """Create the pending credit table (and idempotency keys) in a stripe file"""
+    # AUTOINCREMENT so swept ids are never handed out again: references derive from them
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stripe_credits (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account_number TEXT NOT NULL,
+            transaction_type TEXT NOT NULL,
+            amount REAL NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_stripe_credits_account
+        ON stripe_credits (account_number, id)
+    ''')
+    init_idempotency_table(cursor)
+
+
+def post_stripe_credit(cursor, stripe, account_number, transaction_type, amount, description, schema="main"):
+    """Record a pending credit using the caller's cursor and return its ledger reference"""
+    cursor.execute(f'''
+        INSERT INTO {schema}.stripe_credits (account_number, transaction_type, amount, description)
+        VALUES (?, ?, ?, ?)
+    ''', (account_number, transaction_type, amount, description))
+    return stripe_reference(stripe, cursor.lastrowid)
+
+
+class PendingCreditCache:
+    """Per-process cache of each striped account's unswept credit total"""
+
+    def __init__(self, max_age=PENDING_CACHE_SECONDS):
+        self.max_age = max_age
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def get(self, account_number, loader):
+        """Cached total, reloaded with loader(account_number) once older than max_age"""
+        with self._lock:
+            cached = self._totals.get(account_number)
+        if cached and time.monotonic() - cached[1] < self.max_age:
+            return cached[0]
+        total = loader(account_number)
+        with self._lock:
+            self._totals[account_number] = (total, time.monotonic())
+        return total
+
+    def add(self, account_number, amount):
+        """Count a credit this process just committed without waiting for a reload"""
+        with self._lock:
+            cached = self._totals.get(account_number)
+            if cached:
+                self._totals[account_number] = (cached[0] + amount, cached[1])
+
+    def invalidate(self, account_number=None):
+        with self._lock:
+            if account_number is None:
+                self._totals.clear()
+            else:
+                self._totals.pop(account_number, None)
+
+
+def _benchmark_worker(db_path, account_number, barrier, seconds):
+    """Deposit into the hot account for `seconds` once every worker is ready; returns (committed, failed)"""
+    from bank_database import BankDatabase
+
+    db = BankDatabase(db_path)
+    barrier.wait()
+    committed = failed = 0
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        success, _ = db.deposit(account_number, 1.0, "Card settlement")
+        if success:
+            committed += 1
+        else:
+            failed += 1
+    return committed, failed
+
+
+def benchmark(stripe_counts=(0, 1, 2, 4, 8), workers=8, seconds=10.0, directory="stripe_benchmark"):
+    """Deposit throughput into one hot account with `workers` writer processes per stripe count (0 = unstriped)"""
+    import shutil
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import Manager
+
+    from bank_database import BankDatabase
+
+    results = {}
+    for stripe_count in stripe_counts:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        db_path = os.path.join(directory, "bank.db")
+        db = BankDatabase(db_path)
+        db.register_user("merchant", "merchant", "merchant@example.com")
+        _, user_id = db.authenticate_user("merchant", "merchant")
+        _, account_number = db.create_account(user_id, "current", "Hot Merchant", "", "")
+        if stripe_count:
+            db.enable_striping(account_number, stripe_count)
+
+        with Manager() as manager, ProcessPoolExecutor(max_workers=workers) as executor:
+            barrier = manager.Barrier(workers)
+            futures = [executor.submit(_benchmark_worker, db_path, account_number, barrier, seconds)
+                       for _ in range(workers)]
+            outcomes = [future.result() for future in futures]
+        committed = sum(ok for ok, _ in outcomes)
+        failed = sum(bad for _, bad in outcomes)
+
+        started = time.perf_counter()
+        swept = db.sweep_stripes()
+        sweep_seconds = time.perf_counter() - started
+        balance_ok = db.get_account_details(account_number)[2] == committed
+        results[stripe_count] = committed / seconds
+        print(f"{stripe_count or 'no'} stripes, {workers} writers: {committed / seconds:8.0f} credits/s "
+              f"({failed} failed, {results[stripe_count] / results[stripe_counts[0]]:.2f}x), "
+              f"swept {swept} in {sweep_seconds:.2f}s, balance matches: {balance_ok}")
+    shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "sweep":
+        from bank_database import BankDatabase
+
+        db_path = sys.argv[2] if len(sys.argv) > 2 else "bank_system.db"
+        print(f"Swept {BankDatabase(db_path).sweep_stripes()} pending credits")
+    else:
+        benchmark(tuple(int(n) for n in sys.argv[1:]) or (0, 1, 2, 4, 8))
@@ -0,0 +1,46 @@
+"""Shared fixtures: a fresh SecureBank database per test, and accounts in it"""
+
+import itertools
+
+import pytest
+
+from bank_database import BankDatabase
+from sharding import ShardedBankDatabase
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "bank.db")
+
+
+@pytest.fixture
+def db(db_path):
+    return BankDatabase(db_path)
+
+
+@pytest.fixture
+def sharded(tmp_path):
+    return ShardedBankDatabase(str(tmp_path / "sharded.db"), shard_count=2)
+
+
+@pytest.fixture
+def make_account(db):
+    """Open an account with an opening balance (in db, or in another bank); all belong to one test user"""
+    db.register_user("tester", "secret-pass", "tester@example.com")
+    _, user_id = db.authenticate_user("tester", "secret-pass")
+    names = itertools.count(1)
+
+    def make(balance=0, account_type="savings", bank=None):
+        bank = bank or db
+        ok, account_number = bank.create_account(user_id, account_type, f"Holder {next(names)}",
+                                                 "5550100", "1 Main Street", balance)
+        assert ok, account_number
+        return account_number
+
+    return make
+
+
+@pytest.fixture
+def balance(db):
+    """Current balance of an account, pending stripe credits included"""
+    return lambda account_number: db.get_account_details(account_number)[2]
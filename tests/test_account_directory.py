@@ -0,0 +1,81 @@
+import sqlite3
+
+import pytest
+
+import account_directory
+from account_directory import AccountDirectory, BloomFilter
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    """Count the connections the directory opens (each catch-up is one query on one connection)"""
+    opened = []
+    connect = sqlite3.connect
+
+    def counting_connect(*args, **kwargs):
+        opened.append(args)
+        return connect(*args, **kwargs)
+    monkeypatch.setattr(account_directory.sqlite3, "connect", counting_connect)
+    return opened
+
+
+def _insert_account_elsewhere(db_path, account_number):
+    """An account written by another process or tool, without going through create_account"""
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO accounts (account_number, account_type, balance, account_holder_name) "
+                 "VALUES (?, 'savings', 0, 'Elsewhere')", (account_number,))
+    conn.commit()
+    conn.close()
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000)
+    numbers = [f"ACC{value:09d}" for value in range(100000000, 100002000, 2)]
+    for number in numbers:
+        bloom.add(number)
+    assert all(number in bloom for number in numbers)
+
+
+def test_directory_grows_past_its_filter_capacity():
+    directory = AccountDirectory(":memory:")
+    directory.build([])
+    numbers = [f"ACC{value:09d}" for value in range(200000000, 200003000)] + ["LEG0000001"]
+    for number in numbers:
+        directory.add(number)
+    assert len(directory) == len(numbers)
+    assert all(directory.contains(number, verify_misses=False) for number in numbers)
+
+
+def test_hit_needs_no_query_and_miss_costs_one(db, make_account, connections):
+    account = make_account(0)
+    directory = db.directory
+    connections.clear()
+
+    assert directory.contains(account)
+    assert connections == []
+    assert not directory.contains("ACC000000001")
+    assert len(connections) == 1
+
+
+def test_miss_catches_up_on_accounts_written_elsewhere(db, db_path, make_account):
+    make_account(0)
+    directory = db.directory
+    _insert_account_elsewhere(db_path, "LEG0000042")
+
+    assert directory.contains("LEG0000042")
+    assert not directory.contains("LEG0000043")
+
+
+def test_transfer_to_unknown_destination_is_rejected(db, make_account, balance):
+    source = make_account(100)
+
+    assert db.transfer_money(source, "ACC000000001", 10) == (False, "Destination account not found")
+    assert balance(source) == 100
+
+
+def test_transfer_to_account_written_elsewhere(db, db_path, make_account, balance):
+    source = make_account(100)
+    _insert_account_elsewhere(db_path, "ACC123123123")
+
+    assert db.transfer_money(source, "ACC123123123", 40)[0]
+    assert balance(source) == 60 and balance("ACC123123123") == 40
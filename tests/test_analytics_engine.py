@@ -0,0 +1,138 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("duckdb")
+pytest.importorskip("pyarrow")
+
+import analytics_engine
+from analytics_engine import ColumnarAnalytics, FileLock
+from replica import ReplicaManager
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SYNC = "import sys; from analytics_engine import ColumnarAnalytics; ColumnarAnalytics(sys.argv[1], batch_size=3).sync()"
+
+
+@pytest.fixture
+def replica(db, db_path):
+    manager = ReplicaManager(db_path, max_staleness=60)
+    yield manager
+    manager.stop()
+
+
+def _ledger_count(db_path):
+    conn = sqlite3.connect(db_path)
+    count = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+    conn.close()
+    return count
+
+
+def _synced_ids(analytics):
+    frame = analytics._query("SELECT id FROM ledger ORDER BY id", [])
+    return [] if frame is None else frame["id"].tolist()
+
+
+def test_sync_is_incremental_and_queries_read_the_parts(db, db_path, make_account):
+    account = make_account(100)
+    analytics = ColumnarAnalytics(db_path)
+    assert analytics.sync() == _ledger_count(db_path)
+    assert analytics.sync() == 0
+
+    db.deposit(account, 50)
+    db.withdraw(account, 20)
+    assert analytics.sync() == 2
+
+    breakdown = analytics.type_breakdown([account]).set_index("Transaction Type")
+    assert breakdown.loc["withdrawal", "Total Amount"] == 20
+    assert analytics.balance_history(account)["Balance"].iloc[-1] == 130
+
+
+def test_sync_reads_from_the_replica_snapshot(db, db_path, replica, make_account, monkeypatch):
+    account = make_account(100)
+    replica.refresh()
+    db.deposit(account, 50)
+
+    in_snapshot = _ledger_count(db_path) - 1
+
+    # The primary is never opened while the snapshot is fresh
+    opened = []
+    real_connect = sqlite3.connect
+
+    def connect(path, *args, **kwargs):
+        opened.append(path)
+        return real_connect(path, *args, **kwargs)
+    monkeypatch.setattr(analytics_engine.sqlite3, "connect", connect)
+    analytics = ColumnarAnalytics(db_path, replica=replica)
+    assert analytics.sync() == in_snapshot
+    monkeypatch.undo()
+    assert db_path not in opened
+
+    # The row the snapshot lacked arrives with the next refresh
+    replica.refresh()
+    assert analytics.sync() == 1
+    assert analytics.balance_history(account)["Balance"].iloc[-1] == 150
+
+
+def test_compaction_merges_parts_without_losing_rows(db, db_path, make_account):
+    account = make_account(100)
+    analytics = ColumnarAnalytics(db_path, max_parts=2)
+    for amount in range(1, 6):
+        db.deposit(account, amount)
+        analytics.sync()
+
+    assert len(analytics._parts()) <= 2
+    assert len(_synced_ids(analytics)) == _ledger_count(db_path)
+
+
+def test_syncs_in_several_processes_copy_each_row_once(db, db_path, make_account):
+    account = make_account(100)
+    for amount in range(1, 20):
+        db.deposit(account, amount)
+
+    workers = [subprocess.Popen([sys.executable, "-c", SYNC, db_path], cwd=REPO_ROOT) for _ in range(4)]
+    assert [worker.wait() for worker in workers] == [0] * 4
+
+    ids = _synced_ids(ColumnarAnalytics(db_path))
+    assert len(ids) == len(set(ids)) == _ledger_count(db_path)
+
+
+def test_failed_sync_keeps_the_watermark_at_the_last_written_part(db, db_path, make_account, monkeypatch):
+    account = make_account(100)
+    for amount in range(1, 6):
+        db.deposit(account, amount)
+    analytics = ColumnarAnalytics(db_path, batch_size=2)
+
+    written = []
+    real_write = analytics_engine.pq.write_table
+
+    def fail_second_part(table, path):
+        if written:
+            raise OSError("disk full")
+        written.append(path)
+        real_write(table, path)
+    monkeypatch.setattr(analytics_engine.pq, "write_table", fail_second_part)
+    with pytest.raises(OSError):
+        analytics.sync()
+    monkeypatch.undo()
+
+    assert analytics._read_watermark() == 2
+    # The lock was released and the next sync resumes after the watermark
+    analytics.sync()
+    ids = _synced_ids(analytics)
+    assert ids == sorted(set(ids)) and len(ids) == _ledger_count(db_path)
+
+
+def test_file_lock_writer_waits_for_readers(tmp_path):
+    path = str(tmp_path / "parts.lock")
+    impatient = FileLock(path, timeout=0.1)
+    with FileLock(path).reading():
+        with impatient.reading():
+            pass
+        with pytest.raises(sqlite3.OperationalError):
+            with impatient.writing():
+                pass
+    with impatient.writing():
+        pass
@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+streamlit = pytest.importorskip("streamlit")
+
+pytestmark = pytest.mark.skipif(tuple(int(part) for part in streamlit.__version__.split(".")[:2]) < (1, 37),
+                                reason="the app's fragments need the Streamlit version in requirements.txt")
+
+import bank_database
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bank_management_app.py")
+
+
+def _widget(widgets, label):
+    return next(widget for widget in widgets if widget.label == label)
+
+
+@pytest.fixture
+def app(db_path, make_account, monkeypatch):
+    """Logged-in session of the app against the test database"""
+    monkeypatch.setenv("BANK_DB_PATH", db_path)
+    streamlit.cache_resource.clear()
+    make_account(100)
+
+    app = AppTest.from_file(APP_PATH, default_timeout=60).run()
+    _widget(app.text_input, "Username").input("tester")
+    _widget(app.text_input, "Password").input("secret-pass")
+    _widget(app.button, "Login").click()
+    app.run()
+    assert not app.exception
+    yield app
+    streamlit.cache_resource.clear()
+
+
+def test_database_is_built_once_per_process(app, monkeypatch):
+    built = []
+    original = bank_database.BankDatabase.__init__
+
+    def counting_init(self, *args, **kwargs):
+        built.append(args)
+        original(self, *args, **kwargs)
+    monkeypatch.setattr(bank_database.BankDatabase, "__init__", counting_init)
+
+    for option in ("💳 My Accounts", "💰 Transactions", "🏠 Dashboard"):
+        _widget(app.sidebar.selectbox, "Navigate to:").select(option)
+        app.run()
+        assert not app.exception
+    assert built == []
+
+
+def test_quick_deposit_fragment_posts_once(app, db, make_account):
+    account = db.get_user_accounts(db.authenticate_user("tester", "secret-pass")[1])[0][0]
+
+    _widget(app.button, "💰 Make Deposit").click()
+    app.run()
+    _widget(app.number_input, "Amount to Deposit").set_value(25.0)
+    _widget(app.button, "Deposit").click()
+    app.run()
+
+    assert not app.exception
+    assert db.get_account_details(account)[2] == 125
+    assert [row[3] for row in db.get_transactions(account)].count("Quick deposit") == 1
+
+
+def test_rejected_withdrawal_shows_the_error_and_moves_nothing(app, db):
+    account = db.get_user_accounts(db.authenticate_user("tester", "secret-pass")[1])[0][0]
+
+    _widget(app.button, "💸 Withdraw Money").click()
+    app.run()
+    _widget(app.number_input, "Amount to Withdraw").set_value(500.0)
+    _widget(app.button, "Withdraw").click()
+    app.run()
+
+    assert not app.exception
+    assert app.error and "Insufficient" in app.error[0].value
+    assert db.get_account_details(account)[2] == 100
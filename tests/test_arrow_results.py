@@ -0,0 +1,77 @@
+import sqlite3
+from decimal import Decimal
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+import arrow_results
+from arrow_results import SEARCH_SCHEMA, TRANSACTION_SCHEMA, cursor_batches, cursor_to_arrow, to_chart_frame, to_pandas
+
+
+@pytest.fixture
+def history(db, make_account):
+    account = make_account(100)
+    db.deposit(account, 10.005)
+    db.withdraw(account, 0.1)
+    db.deposit(account, 1234.5, "Salary for March")
+    return account
+
+
+def test_arrow_history_matches_the_row_tuples(db, history):
+    rows = db.get_transactions(history)
+    table = db.get_transactions(history, as_arrow=True)
+
+    assert table.schema == TRANSACTION_SCHEMA
+    assert table.num_rows == len(rows)
+    assert table.column("description").to_pylist() == [row[3] for row in rows]
+    assert table.column("amount").to_pylist() == [Decimal(str(round(row[1], 2))) for row in rows]
+    assert [str(value) for value in table.column("timestamp").to_pylist()] == [row[4] for row in rows]
+
+
+def test_cursor_is_read_in_batches(db_path, history):
+    conn = sqlite3.connect(db_path)
+    query = '''
+        SELECT transaction_type, amount, balance_after, description, timestamp, reference_number
+        FROM transactions ORDER BY id
+    '''
+    batches = list(cursor_batches(conn.execute(query), TRANSACTION_SCHEMA, batch_size=2))
+    assert [batch.num_rows for batch in batches] == [2, 2]
+    assert pa.Table.from_batches(batches) == cursor_to_arrow(conn.execute(query), TRANSACTION_SCHEMA)
+    conn.close()
+
+
+def test_search_without_accounts_is_an_empty_table(db):
+    table = db.search_transactions([], as_arrow=True)
+    assert table.num_rows == 0 and table.schema == SEARCH_SCHEMA
+
+
+def test_sharded_search_keeps_the_newest_rows_across_shards(sharded, make_account):
+    accounts = [make_account(10 + index, bank=sharded) for index in range(4)]
+    for account in accounts:
+        sharded.deposit(account, 5)
+    rows = sharded.search_transactions(accounts, limit=5)
+    table = sharded.search_transactions(accounts, limit=5, as_arrow=True)
+
+    assert table.num_rows == len(rows) == 5
+    timestamps = table.column("timestamp").to_pylist()
+    assert timestamps == sorted(timestamps, reverse=True)
+    assert sorted(table.column("account_number").to_pylist()) == sorted(row[0] for row in rows)
+
+
+def test_frames_for_grids_and_charts(db, history):
+    table = db.get_transactions(history, as_arrow=True)
+
+    grid = to_pandas(table)
+    assert str(grid["amount"].dtype).startswith("decimal128")
+
+    chart = to_chart_frame(table)
+    assert chart["amount"].dtype == "float64"
+    assert str(chart["timestamp"].dtype).startswith("datetime64")
+    assert chart["amount"].sum() == pytest.approx(100 + 10.01 + 0.1 + 1234.5)
+
+
+def test_arrow_results_need_pyarrow(monkeypatch):
+    monkeypatch.setattr(arrow_results, "ARROW_AVAILABLE", False)
+    with pytest.raises(RuntimeError, match="pyarrow"):
+        arrow_results.empty_table(SEARCH_SCHEMA)
@@ -0,0 +1,78 @@
+import sqlite3
+import time
+
+import pytest
+
+from backup import BackupManager, _utc_now
+from bank_database import BankDatabase
+
+
+@pytest.fixture
+def backups(db, db_path, tmp_path):
+    return BackupManager(db_path, str(tmp_path / "backups"))
+
+
+def _ledger(path):
+    conn = sqlite3.connect(path)
+    accounts = conn.execute("SELECT account_number, balance FROM accounts ORDER BY 1").fetchall()
+    transactions = conn.execute('''
+        SELECT id, account_number, transaction_type, amount, balance_after, timestamp, category
+        FROM transactions ORDER BY id
+    ''').fetchall()
+    projected = conn.execute("SELECT account_number, balance FROM projected_balances ORDER BY 1").fetchall()
+    conn.close()
+    return accounts, transactions, projected
+
+
+def _next_second():
+    """Wait until CURRENT_TIMESTAMP has moved on, so commit times order the changes"""
+    started = _utc_now()
+    while _utc_now() == started:
+        time.sleep(0.05)
+
+
+def test_restore_replays_archived_changes_onto_the_base_backup(db, db_path, backups, make_account, tmp_path):
+    account = make_account(100)
+    entry = backups.take_base_backup()
+    assert entry["outbox_id"] > 0 and entry["size_bytes"] > 0
+
+    other = make_account(40)
+    db.deposit(account, 25)
+    db.transfer_money(account, other, 60)
+    assert backups.archive_changes() > 0
+    db.update_projections()
+
+    restored_path = str(tmp_path / "restored.db")
+    base, replayed = backups.restore(_utc_now(), restored_path)
+    assert base["file"] == entry["file"] and replayed > 0
+
+    accounts, transactions, projected = _ledger(restored_path)
+    assert (accounts, transactions) == _ledger(db_path)[:2]
+    assert projected == accounts
+    # Users in the stream are restored too, so their logins work
+    restored = BankDatabase(restored_path)
+    assert restored.authenticate_user("tester", "secret-pass")[0]
+
+
+def test_restore_stops_at_the_target_time(db, backups, make_account, tmp_path):
+    account = make_account(100)
+    backups.take_base_backup()
+    db.deposit(account, 10)
+    _next_second()
+    target = _utc_now()
+    _next_second()
+    db.deposit(account, 1000)
+    backups.archive_changes()
+
+    restored_path = str(tmp_path / "restored.db")
+    backups.restore(target, restored_path)
+    assert BankDatabase(restored_path).get_account_details(account)[2] == 110
+
+
+def test_restore_needs_a_base_backup_before_the_target(backups, tmp_path):
+    with pytest.raises(ValueError):
+        backups.restore("2000-01-01 00:00:00", str(tmp_path / "restored.db"))
+
+    backups.take_base_backup()
+    with pytest.raises(ValueError):
+        backups.restore("2000-01-01 00:00:00", str(tmp_path / "restored.db"))
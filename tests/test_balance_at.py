@@ -0,0 +1,61 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+
+@pytest.fixture
+def dated_ledger(db, db_path, make_account):
+    """Two accounts whose ledger rows are moved to known times"""
+    first, second = make_account(100), make_account(0)
+    db.deposit(first, 50)
+    db.withdraw(first, 30)
+    db.deposit(second, 10)
+    db.deposit(second, 5)
+
+    times = {first: ["2024-01-01 09:00:00", "2024-01-05 12:00:00", "2024-01-10 18:30:00"],
+             second: ["2024-01-03 08:00:00", "2024-01-03 08:00:00"]}
+    conn = sqlite3.connect(db_path)
+    for account_number, stamps in times.items():
+        ids = [row[0] for row in conn.execute(
+            "SELECT id FROM transactions WHERE account_number = ? ORDER BY id", (account_number,))]
+        assert len(ids) == len(stamps)
+        conn.executemany("UPDATE transactions SET timestamp = ? WHERE id = ?", zip(stamps, ids))
+    conn.commit()
+    conn.close()
+    return first, second
+
+
+def test_balance_is_the_last_row_at_or_before_the_time(db, dated_ledger):
+    first, _ = dated_ledger
+    assert db.balance_at(first, "2023-12-31 23:59:59") == 0.0
+    assert db.balance_at(first, "2024-01-01 09:00:00") == 100
+    assert db.balance_at(first, "2024-01-07 00:00:00") == 150
+    assert db.balance_at(first, datetime(2024, 2, 1)) == 120
+
+
+def test_rows_with_the_same_timestamp_follow_ledger_order(db, dated_ledger):
+    _, second = dated_ledger
+    assert db.balance_at(second, "2024-01-03 08:00:00") == 15
+
+
+def test_balances_of_many_accounts_in_one_query(db, dated_ledger):
+    first, second = dated_ledger
+    assert db.balances_at("2024-01-04 00:00:00", [first, second]) == {first: 100, second: 15}
+    assert db.balances_at("2024-01-04 00:00:00") == {first: 100, second: 15}
+    assert db.balances_at("2024-01-04 00:00:00", [first, "0000000000"]) == {first: 100}
+
+
+def test_unknown_account_has_no_balance(db, dated_ledger):
+    assert db.balance_at("0000000000", "2024-01-04 00:00:00") == 0.0
+
+
+def test_snapshot_reads_go_through_the_replica(db, dated_ledger):
+    first, _ = dated_ledger
+    db.enable_replica(60)
+    # Refresh by hand only, so the snapshot is known to predate the next deposit
+    db.replica.stop()
+    db.replica.refresh()
+    db.deposit(first, 1000)
+    assert db.balance_at(first, "2100-01-01 00:00:00", snapshot=True) == 120
+    assert db.balance_at(first, "2100-01-01 00:00:00") == 1120
@@ -0,0 +1,85 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from categorizer import Categorizer, DEFAULT_CATEGORIES, UNCATEGORIZED, backfill_categories, load_categories
+
+DESCRIPTIONS = [
+    ("Salary for March", "deposit"),
+    ("Home loan EMI", "withdrawal"),
+    ("Insurance premium", "withdrawal"),
+    ("Electricity bill", "withdrawal"),
+    ("ATM cash withdrawal", "withdrawal"),
+    ("Interest credit for Jan 2024", "deposit"),
+    ("Transfer to ACC123", "transfer_out"),
+    ("Gift from a friend", "transfer_in"),
+    ("Gift from a friend", "deposit"),
+    ("Loans, bills and shopping", "withdrawal"),
+    (None, "withdrawal"),
+]
+
+
+@pytest.fixture
+def categorizer():
+    return Categorizer(DEFAULT_CATEGORIES)
+
+
+def test_first_category_with_a_whole_word_keyword_wins(categorizer):
+    assert categorizer.categorize("Salary for March") == "Salary"
+    assert categorizer.categorize("Home loan EMI") == "Loan EMI"
+    # File order decides between categories: Loan EMI comes before Bills and Shopping
+    assert categorizer.categorize("Loans, bills and shopping") == "Loan EMI"
+    # Keywords inside longer words do not count ("emi" in "premium", "loan" in "loaner")
+    assert categorizer.categorize("Insurance premium") == UNCATEGORIZED
+    assert categorizer.categorize("Loaner car") == UNCATEGORIZED
+
+
+def test_uncategorized_rows_fall_back_on_the_transaction_type(categorizer):
+    assert categorizer.categorize("Gift from a friend", "transfer_in") == "Transfers"
+    assert categorizer.categorize("Gift from a friend", "deposit") == UNCATEGORIZED
+    assert categorizer.categorize(None) == UNCATEGORIZED
+
+
+def test_vectorized_and_inline_matching_agree(categorizer):
+    frame = pd.DataFrame(DESCRIPTIONS, columns=["description", "transaction_type"])
+    inline = [categorizer.categorize(description, kind) for description, kind in DESCRIPTIONS]
+    assert categorizer.categorize_frame(frame).tolist() == inline
+
+
+def test_missing_rules_file_uses_the_defaults(tmp_path):
+    assert load_categories(str(tmp_path / "missing.json")) == DEFAULT_CATEGORIES
+
+
+def test_new_ledger_rows_are_categorized_on_insert(db, db_path, make_account):
+    account = make_account(100)
+    db.deposit(account, 5000, "Salary for March")
+    conn = sqlite3.connect(db_path)
+    category = conn.execute("SELECT category FROM transactions ORDER BY id DESC LIMIT 1").fetchone()[0]
+    conn.close()
+    assert category == "Salary"
+
+
+def test_backfill_fills_only_uncategorized_rows(db, db_path, make_account):
+    account = make_account(100)
+    db.deposit(account, 5000, "Salary for March")
+    db.withdraw(account, 40, "Electricity bill")
+    db.withdraw(account, 10, "Insurance premium")
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE transactions SET category = NULL")
+    # A row the app already categorized in the meantime keeps its category
+    conn.execute("UPDATE transactions SET category = 'Manual' WHERE description = 'Insurance premium'")
+    conn.commit()
+
+    assert backfill_categories(db_path, chunk_size=2, workers=2) == 3
+    categories = dict(conn.execute("SELECT description, category FROM transactions"))
+    assert categories["Salary for March"] == "Salary"
+    assert categories["Electricity bill"] == "Bills & Utilities"
+    assert categories["Insurance premium"] == "Manual"
+    assert backfill_categories(db_path, workers=2) == 0
+
+    assert backfill_categories(db_path, workers=2, recategorize=True) == 4
+    categories = dict(conn.execute("SELECT description, category FROM transactions"))
+    conn.close()
+    assert categories["Insurance premium"] == UNCATEGORIZED
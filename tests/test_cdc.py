@@ -0,0 +1,95 @@
+import json
+import threading
+
+import pytest
+
+from cdc import CDCPublisher, CallbackSink, JsonlFileSink
+
+
+@pytest.fixture
+def publisher(db, db_path):
+    publisher = CDCPublisher(db_path)
+    yield publisher
+    publisher.stop()
+
+
+def _ledger_changes(changes):
+    return [change["row"] for change in changes if change["table"] == "transactions"]
+
+
+def test_committed_writes_are_delivered_once_in_order(db, publisher, make_account):
+    account = make_account(100)
+    received = []
+    publisher.subscribe("audit", CallbackSink(received.extend))
+    publisher.run_once()
+
+    db.deposit(account, 50)
+    db.withdraw(account, 30)
+    assert publisher.run_once() == {"audit": 2}
+    assert [(row["transaction_type"], row["balance_after"]) for row in _ledger_changes(received[-2:])] == [
+        ("deposit", 150), ("withdrawal", 120)]
+    offsets = [change["offset"] for change in received]
+    assert offsets == sorted(set(offsets))
+    assert publisher.run_once() == {"audit": 0}
+
+
+def test_rejected_writes_never_reach_the_outbox(db, publisher, make_account):
+    account = make_account(100)
+    received = []
+    publisher.subscribe("audit", CallbackSink(received.extend))
+    publisher.run_once()
+
+    ok, _ = db.withdraw(account, 500)
+    assert not ok
+    assert publisher.run_once() == {"audit": 0}
+
+
+def test_failing_subscriber_keeps_its_offset_and_gets_the_batch_again(db, publisher, make_account):
+    account = make_account(100)
+    attempts = []
+
+    def flaky(changes):
+        attempts.append(changes)
+        if len(attempts) == 1:
+            raise ConnectionError("consumer down")
+    healthy = []
+    publisher.subscribe("flaky", CallbackSink(flaky))
+    publisher.subscribe("healthy", CallbackSink(healthy.extend))
+
+    results = publisher.run_once()
+    assert results["flaky"] == 0 and results["healthy"] > 0
+    assert "consumer down" in publisher.errors["flaky"]
+
+    # At-least-once: the failed batch is delivered again, and pruning waits for the slow subscriber
+    assert publisher.prune() == 0
+    publisher.run_once()
+    assert attempts[1] == attempts[0]
+    assert "flaky" not in publisher.errors
+    assert publisher.prune() == len(healthy)
+
+
+def test_jsonl_sink_appends_one_line_per_change(db, publisher, make_account, tmp_path):
+    path = tmp_path / "changes.jsonl"
+    publisher.subscribe("file", JsonlFileSink(str(path)))
+    account = make_account(100)
+    db.deposit(account, 5)
+    delivered = publisher.run_once()["file"]
+
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert len(lines) == delivered
+    assert _ledger_changes(lines)[-1]["amount"] == 5
+
+
+def test_started_publisher_is_woken_by_commits(db, publisher, make_account):
+    account = make_account(100)
+    deposited = threading.Event()
+
+    def watch(changes):
+        if any(row["amount"] == 7 for row in _ledger_changes(changes)):
+            deposited.set()
+    publisher.idle_interval = 60
+    publisher.subscribe("watcher", CallbackSink(watch))
+    publisher.start()
+
+    db.deposit(account, 7)
+    assert deposited.wait(10)
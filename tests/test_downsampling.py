@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+from downsampling import aggregate_series, choose_granularity, downsample, lttb_indices, min_max_indices
+
+
+def _balance_series(count, seed=7):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Time": pd.date_range("2020-01-01", periods=count, freq="h"),
+        "Balance": np.cumsum(rng.normal(0, 100, count)) + 50_000,
+    })
+
+
+def test_granularity_follows_the_range():
+    assert choose_granularity("2024-01-01", "2024-03-01") == "day"
+    assert choose_granularity("2023-01-01", "2024-06-01") == "week"
+    assert choose_granularity("2010-01-01", "2024-01-01") == "month"
+    # An empty range still gets a bucket size
+    assert choose_granularity("2024-01-01", "2024-01-01") == "day"
+
+
+def test_aggregation_keeps_the_total():
+    days = pd.date_range("2022-01-01", "2023-12-31", freq="D")
+    frame = pd.DataFrame({"Date": days, "Amount": np.arange(len(days), dtype=float)})
+
+    buckets, granularity = aggregate_series(frame, "Date", "Amount")
+    assert granularity == "week"
+    assert len(buckets) < len(frame)
+    assert buckets["Amount"].sum() == frame["Amount"].sum()
+
+    # The range shown decides the buckets, not only the data in it
+    _, granularity = aggregate_series(frame.tail(30), "Date", "Amount", start="2014-01-01", end="2023-12-31")
+    assert granularity == "month"
+
+
+def test_empty_series_pass_through():
+    empty = pd.DataFrame({"Date": [], "Amount": []})
+    assert aggregate_series(empty, "Date", "Amount")[0] is empty
+    assert aggregate_series(None, "Date", "Amount") == (None, "day")
+    assert downsample(None, "Time", "Balance") is None
+
+
+def test_lttb_keeps_the_ends_and_a_spike():
+    series = _balance_series(20_000)
+    spike = 12_345
+    series.loc[spike, "Balance"] = series["Balance"].max() + 1_000_000
+
+    indices = lttb_indices(np.arange(len(series)), series["Balance"], 500)
+    assert len(indices) == 500
+    assert indices[0] == 0 and indices[-1] == len(series) - 1
+    assert np.all(np.diff(indices) > 0)
+    assert spike in indices
+
+    # Too few points to thin, or too small a budget, keeps everything
+    assert list(lttb_indices([0, 1, 2], [5, 6, 7], 10)) == [0, 1, 2]
+    assert len(lttb_indices(np.arange(10), np.arange(10), 2)) == 10
+
+
+def test_min_max_keeps_the_extremes_within_budget():
+    values = _balance_series(50_000)["Balance"].to_numpy()
+    indices = min_max_indices(values, 1000)
+
+    assert len(indices) <= 1000
+    assert np.all(np.diff(indices) > 0)
+    assert values.argmin() in indices and values.argmax() in indices
+
+
+def test_downsample_returns_rows_of_the_original_in_order():
+    series = _balance_series(5_000)
+    assert downsample(series, "Time", "Balance", max_points=5_000) is series
+
+    for method in ("lttb", "minmax"):
+        thinned = downsample(series, "Time", "Balance", max_points=300, method=method)
+        assert len(thinned) <= 300
+        assert thinned["Time"].is_monotonic_increasing
+        assert thinned["Balance"].isin(series["Balance"]).all()
+        # Only min/max bucketing guarantees every extreme; LTTB keeps the visually large ones
+        if method == "minmax":
+            assert thinned["Balance"].max() == series["Balance"].max()
@@ -0,0 +1,87 @@
+import glob
+import os
+import sqlite3
+
+import pytest
+
+import event_log
+from event_log import ProjectionRunner
+
+TABLES = ("projected_balances", "projected_daily_stats", "projected_account_search")
+
+
+@pytest.fixture
+def busy_ledger(db, make_account):
+    """Accounts spread over the account ranges, with transfers between them"""
+    accounts = [make_account(1000) for _ in range(6)]
+    for index, account in enumerate(accounts):
+        db.deposit(account, 10 * (index + 1))
+        db.withdraw(account, index + 1)
+        ok, message = db.transfer_money(account, accounts[-1 - index], 25)
+        assert ok, message
+    return accounts
+
+
+def _projected(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = {table: sorted(conn.execute(f"SELECT * FROM {table}").fetchall()) for table in TABLES}
+    conn.close()
+    return rows
+
+
+def _staging_files(db_path):
+    base, _ = os.path.splitext(db_path)
+    return glob.glob(f"{base}.rebuild-*.db")
+
+
+def test_parallel_rebuild_matches_the_incremental_catch_up(db_path, busy_ledger):
+    runner = ProjectionRunner(db_path)
+    runner.catch_up()
+    caught_up = _projected(db_path)
+
+    applied = runner.rebuild(workers=3)
+
+    conn = sqlite3.connect(db_path)
+    events = conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+    conn.close()
+    assert _projected(db_path) == caught_up
+    assert applied == dict.fromkeys(("balances", "daily_stats", "account_search"), events)
+    assert not _staging_files(db_path)
+
+
+def test_rebuild_repairs_drifted_projections(db, db_path, busy_ledger):
+    runner = ProjectionRunner(db_path)
+    runner.catch_up()
+    expected = _projected(db_path)
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE projected_balances SET balance = -1")
+    conn.execute("DELETE FROM projected_daily_stats WHERE account_number = ?", (busy_ledger[0],))
+    conn.commit()
+    conn.close()
+
+    runner.rebuild(workers=4)
+    assert _projected(db_path) == expected
+    assert dict(_projected(db_path)["projected_balances"])[busy_ledger[0]] == db.get_account_details(busy_ledger[0])[2]
+
+
+def test_rebuild_of_an_empty_log(db_path):
+    runner = ProjectionRunner(db_path)
+    assert runner.rebuild(workers=2) == {"balances": 0, "daily_stats": 0, "account_search": 0}
+    assert all(not rows for rows in _projected(db_path).values())
+
+
+def test_failed_rebuild_keeps_the_current_projections(db_path, busy_ledger, monkeypatch):
+    runner = ProjectionRunner(db_path)
+    runner.catch_up()
+    before = _projected(db_path)
+
+    # Worker processes are forked, so they inherit the broken projection
+    def broken(self, cursor, event_type, account_number, payload, created_at):
+        raise ValueError("bad event")
+    monkeypatch.setattr(event_log.BalanceProjection, "apply", broken)
+
+    with pytest.raises(ValueError):
+        runner.rebuild(workers=2)
+    assert _projected(db_path) == before
+    assert not _staging_files(db_path)
@@ -0,0 +1,121 @@
+import json
+import logging
+import os
+
+import pytest
+
+from bank_database import BankDatabase
+from fraud_rules import FraudRulesEngine
+
+VELOCITY_3 = {"rules": [{"type": "velocity", "name": "three_a_minute", "max_count": 3, "window_seconds": 60}]}
+VELOCITY_1 = {"rules": [{"type": "velocity", "name": "one_a_minute", "max_count": 1, "window_seconds": 60}]}
+
+
+@pytest.fixture
+def rules_path(tmp_path):
+    path = tmp_path / "fraud_rules.json"
+    path.write_text(json.dumps(VELOCITY_3))
+    return str(path)
+
+
+def _rewrite(path, content, same_mtime=False):
+    """Replace the rules file, optionally keeping its mtime (an edit within the clock's granularity)"""
+    mtime = os.stat(path).st_mtime_ns
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content if isinstance(content, str) else json.dumps(content))
+    os.utime(path, ns=(mtime, mtime if same_mtime else mtime + 1_000_000_000))
+
+
+def _debits_allowed(engine, account, attempts=5):
+    allowed = 0
+    for _ in range(attempts):
+        if engine.check(account, 100)[0]:
+            engine.record(account, 100)
+            allowed += 1
+    return allowed
+
+
+def test_velocity_rule_blocks_debits_over_the_limit(rules_path):
+    engine = FraudRulesEngine(rules_path)
+
+    assert _debits_allowed(engine, "ACC100000001") == 3
+    assert engine.metrics()["three_a_minute"]["blocked"] == 2
+
+
+def test_new_beneficiary_rule_caps_first_transfer(tmp_path):
+    engine = FraudRulesEngine(str(tmp_path / "missing.json"))
+
+    allowed, reason = engine.check("ACC100000001", 60000, beneficiary="ACC100000002")
+    assert not allowed and "new_beneficiary_limit" in reason
+    engine.record("ACC100000001", 100, beneficiary="ACC100000002")
+    assert engine.check("ACC100000001", 60000, beneficiary="ACC100000002")[0]
+
+
+def test_changed_file_is_reloaded(rules_path):
+    engine = FraudRulesEngine(rules_path, reload_interval=0)
+    _rewrite(rules_path, VELOCITY_1)
+
+    assert _debits_allowed(engine, "ACC100000001") == 1
+    assert list(engine.metrics()) == ["one_a_minute"]
+
+
+@pytest.mark.parametrize("content", ["{not json", {"rules": [{"type": "no_such_rule", "name": "x"}]},
+                                     {"rules": [{"type": "velocity", "name": "x"}]}, {"no_rules": []}])
+def test_malformed_reload_keeps_current_rules(rules_path, content, caplog):
+    engine = FraudRulesEngine(rules_path, reload_interval=0)
+    _rewrite(rules_path, content)
+
+    with caplog.at_level(logging.ERROR, logger="securebank.fraud"):
+        assert _debits_allowed(engine, "ACC100000001") == 3
+    assert list(engine.metrics()) == ["three_a_minute"]
+    # Logged once, not on every check
+    assert len(caplog.records) == 1
+
+
+def test_fix_with_unchanged_mtime_is_picked_up(rules_path):
+    engine = FraudRulesEngine(rules_path, reload_interval=0)
+    _rewrite(rules_path, "{not json")
+    engine.check("ACC100000001", 100)
+
+    _rewrite(rules_path, VELOCITY_1, same_mtime=True)
+
+    assert _debits_allowed(engine, "ACC100000002") == 1
+
+
+def test_malformed_file_at_startup_falls_back_to_defaults(tmp_path, monkeypatch):
+    path = tmp_path / "fraud_rules.json"
+    path.write_text("{not json")
+    monkeypatch.setenv("FRAUD_RULES_PATH", str(path))
+
+    db = BankDatabase(str(tmp_path / "bank.db"))
+
+    assert "debit_velocity_1m" in db.fraud_engine.metrics()
+
+
+def test_history_is_loaded_outside_the_lock(rules_path):
+    seen = []
+
+    def loader(account_number, limit):
+        seen.append(engine._lock.locked())
+        return []
+    engine = FraudRulesEngine(rules_path, history_loader=loader)
+
+    engine.check("ACC100000001", 100)
+    engine.record("ACC100000002", 100)
+
+    assert seen == [False, False]
+
+
+def test_withdrawals_are_checked_against_persisted_history(tmp_path, monkeypatch, make_account, balance):
+    path = tmp_path / "velocity.json"
+    path.write_text(json.dumps(VELOCITY_3))
+    monkeypatch.setenv("FRAUD_RULES_PATH", str(path))
+    account = make_account(1000)
+    for _ in range(3):
+        assert BankDatabase(str(tmp_path / "bank.db")).withdraw(account, 10)[0]
+
+    # A fresh process warms the account's activity from the ledger
+    ok, reason = BankDatabase(str(tmp_path / "bank.db")).withdraw(account, 10)
+
+    assert not ok and "three_a_minute" in reason
+    assert balance(account) == 970
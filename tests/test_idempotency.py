@@ -0,0 +1,79 @@
+import sqlite3
+
+from idempotency import DEFAULT_TTL_HOURS
+
+
+def test_replayed_deposit_returns_original_result_once(db, make_account, balance):
+    account = make_account(100)
+
+    first = db.deposit(account, 50, idempotency_key="k1")
+    replay = db.deposit(account, 50, idempotency_key="k1")
+
+    assert first[0] and replay == first
+    assert balance(account) == 150
+
+
+def test_key_reused_for_a_different_account_is_a_conflict(db, make_account, balance):
+    a, b = make_account(0), make_account(0)
+    assert db.deposit(a, 100, idempotency_key="k1")[0]
+
+    ok, message = db.deposit(b, 999, idempotency_key="k1")
+
+    assert not ok and "conflict" in message
+    assert balance(a) == 100 and balance(b) == 0
+
+
+def test_key_reused_for_a_different_amount_is_a_conflict(db, make_account, balance):
+    account = make_account(500)
+    assert db.withdraw(account, 100, idempotency_key="w1")[0]
+
+    ok, message = db.withdraw(account, 200, idempotency_key="w1")
+
+    assert not ok and "conflict" in message
+    assert balance(account) == 400
+
+
+def test_key_reused_for_a_different_operation_is_rejected(db, make_account, balance):
+    account = make_account(500)
+    assert db.deposit(account, 100, idempotency_key="k1")[0]
+
+    ok, _ = db.withdraw(account, 100, idempotency_key="k1")
+
+    assert not ok
+    assert balance(account) == 600
+
+
+def test_transfer_replay_and_destination_conflict(db, make_account, balance):
+    source, destination, other = make_account(1000), make_account(0), make_account(0)
+
+    first = db.transfer_money(source, destination, 300, idempotency_key="t1")
+    assert db.transfer_money(source, destination, 300, idempotency_key="t1") == first
+    ok, message = db.transfer_money(source, other, 300, idempotency_key="t1")
+
+    assert first[0] and not ok and "conflict" in message
+    assert (balance(source), balance(destination), balance(other)) == (700, 300, 0)
+
+
+def test_failed_requests_do_not_consume_their_key(db, make_account, balance):
+    account = make_account(10)
+
+    assert not db.withdraw(account, 50, idempotency_key="w1")[0]
+    assert db.deposit(account, 100)[0]
+
+    assert db.withdraw(account, 50, idempotency_key="w1")[0]
+    assert balance(account) == 60
+
+
+def test_expired_keys_are_purged(db, make_account, db_path):
+    account = make_account(0)
+    db.deposit(account, 10, idempotency_key="old")
+    db.deposit(account, 10, idempotency_key="fresh")
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE idempotency_keys SET expires_at = datetime('now', ?) WHERE idempotency_key = 'old'",
+                 (f"-{DEFAULT_TTL_HOURS} hours",))
+    conn.commit()
+    conn.close()
+
+    assert db.purge_expired_idempotency_keys() == 1
+    # The purged key is free again
+    assert db.deposit(account, 25, idempotency_key="old")[0]
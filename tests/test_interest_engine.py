@@ -0,0 +1,65 @@
+import sqlite3
+
+import pytest
+
+from interest_engine import SAVINGS_ANNUAL_RATE, run_month_end
+
+
+def _backdate(db_path, account_number, opened, ledger_times):
+    """Open an account on a past date and move its ledger rows (in id order) to the given times"""
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE accounts SET created_at = ? WHERE account_number = ?", (opened, account_number))
+    ids = [row[0] for row in conn.execute(
+        "SELECT id FROM transactions WHERE account_number = ? ORDER BY id", (account_number,))]
+    for transaction_id, timestamp in zip(ids, ledger_times):
+        conn.execute("UPDATE transactions SET timestamp = ? WHERE id = ?", (timestamp, transaction_id))
+    conn.commit()
+    conn.close()
+
+
+def _interest_rows(db_path, account_number):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT amount FROM transactions WHERE account_number = ? AND description LIKE 'Interest%'",
+                        (account_number,)).fetchall()
+    conn.close()
+    return [amount for (amount,) in rows]
+
+
+def test_month_end_credits_daily_balance_interest_once(db, db_path, make_account):
+    account = make_account(36500)
+    _backdate(db_path, account, "2026-08-01 09:00:00", ["2026-08-01 09:00:00"])
+
+    credited, total = run_month_end(db_path, 2026, 9, workers=1)
+    # A restarted run finds every range posted and credits nothing again
+    assert run_month_end(db_path, 2026, 9, workers=1) == (0, 0.0)
+
+    expected = round(36500 * 30 * SAVINGS_ANNUAL_RATE / 365, 2)
+    assert (credited, total) == (1, pytest.approx(expected))
+    assert _interest_rows(db_path, account) == [pytest.approx(expected)]
+
+
+def test_interest_accrues_from_the_day_the_account_opened(db, db_path, make_account):
+    account = make_account(36500)
+    _backdate(db_path, account, "2026-09-21 10:00:00", ["2026-09-21 10:00:00"])
+
+    run_month_end(db_path, 2026, 9, workers=1)
+
+    assert _interest_rows(db_path, account) == [pytest.approx(round(36500 * 10 * SAVINGS_ANNUAL_RATE / 365, 2))]
+
+
+def test_deposits_after_the_period_do_not_earn_interest_for_it(db, db_path, make_account):
+    account = make_account(0)
+    db.deposit(account, 100000)
+    _backdate(db_path, account, "2026-09-10 10:00:00", ["2026-10-05 12:00:00"])
+
+    credited, total = run_month_end(db_path, 2026, 9, workers=1)
+
+    assert (credited, total) == (0, 0.0)
+    assert _interest_rows(db_path, account) == []
+
+
+def test_account_without_ledger_earns_nothing(db, db_path, make_account):
+    account = make_account(0)
+    _backdate(db_path, account, "2026-08-01 10:00:00", [])
+
+    assert run_month_end(db_path, 2026, 9, workers=1) == (0, 0.0)
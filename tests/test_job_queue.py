@@ -0,0 +1,115 @@
+import csv
+import time
+
+import pytest
+
+import job_queue
+from job_queue import CANCELLED, FAILED, QUEUED, RUNNING, SUCCEEDED, JobQueue, JobWorker
+
+
+@pytest.fixture
+def queue(db):
+    return JobQueue(db.db_path)
+
+
+def test_jobs_are_claimed_by_priority_then_age(queue):
+    low = queue.enqueue("reconciliation", priority=0)
+    high = queue.enqueue("category_backfill", priority=5)
+    later_low = queue.enqueue("reconciliation", priority=0)
+
+    assert [queue.claim("w")["id"] for _ in range(3)] == [high, low, later_low]
+    assert queue.claim("w") is None
+
+    job = queue.get(high)
+    assert (job["status"], job["attempts"], job["lease_owner"]) == (RUNNING, 1, "w")
+
+    with pytest.raises(ValueError):
+        queue.enqueue("format_disk")
+
+
+def test_only_queued_jobs_can_be_cancelled(queue):
+    waiting, started = queue.enqueue("reconciliation"), queue.enqueue("reconciliation")
+    queue.claim("w")
+    assert queue.cancel(started) and queue.get(started)["status"] == CANCELLED
+    assert not queue.cancel(waiting)
+    assert queue.get(waiting)["status"] == RUNNING
+
+
+def test_failed_attempts_back_off_then_fail_for_good(queue):
+    job_id = queue.enqueue("reconciliation", max_attempts=2)
+
+    queue.claim("w")
+    before = time.time()
+    queue.fail(job_id, "w", "boom")
+    job = queue.get(job_id)
+    assert job["status"] == QUEUED and job["error"] == "boom"
+    assert job["run_after"] >= before + job_queue.RETRY_BASE_SECONDS
+    # Not ready until the backoff has passed
+    assert queue.claim("w") is None
+
+    conn = queue._connect()
+    conn.execute("UPDATE jobs SET run_after = 0 WHERE id = ?", (job_id,))
+    conn.commit()
+    conn.close()
+    assert queue.claim("w")["attempts"] == 2
+    queue.fail(job_id, "w", "boom again")
+    job = queue.get(job_id)
+    assert (job["status"], job["error"]) == (FAILED, "boom again")
+
+
+def test_expired_lease_moves_the_job_to_another_worker(queue):
+    job_id = queue.enqueue("reconciliation", max_attempts=2)
+    queue.claim("dead", lease_seconds=-1)
+
+    assert queue.claim("alive")["id"] == job_id
+    # The dead worker's late reports and results are ignored
+    assert not queue.report_progress(job_id, "dead", 0.5)
+    queue.complete(job_id, "dead", {"stale": True})
+    assert queue.get(job_id)["status"] == RUNNING
+
+    assert queue.report_progress(job_id, "alive", 2.0, "almost")
+    assert (queue.get(job_id)["progress"], queue.get(job_id)["message"]) == (1.0, "almost")
+    queue.complete(job_id, "alive", {"ok": True})
+    assert (queue.get(job_id)["status"], queue.get(job_id)["result"]) == (SUCCEEDED, {"ok": True})
+
+
+def test_lease_lost_on_the_last_attempt_fails_the_job(queue):
+    job_id = queue.enqueue("reconciliation", max_attempts=1)
+    queue.claim("dead", lease_seconds=-1)
+
+    assert queue.claim("alive") is None
+    job = queue.get(job_id)
+    assert job["status"] == FAILED and "lease" in job["error"]
+
+
+def test_worker_runs_exports_and_reconciliation_on_its_pool(db, queue, make_account, tmp_path):
+    account, other = make_account(100), make_account(20)
+    db.deposit(account, 5)
+    db.withdraw(account, 30)
+    db.deposit(other, 1)
+
+    path = str(tmp_path / "export.csv")
+    export = queue.enqueue("export_transactions", {"account_numbers": [account], "path": path})
+    reconcile = queue.enqueue("reconciliation")
+    JobWorker(db.db_path, workers=2, poll_interval=0.05).run(until_idle=True)
+
+    job = queue.get(export)
+    assert job["status"] == SUCCEEDED and job["result"] == {"path": path, "rows": 3}
+    with open(path, newline="") as exported:
+        rows = list(csv.DictReader(exported))
+    assert {row["account_number"] for row in rows} == {account}
+    assert [float(row["balance_after"]) for row in rows] == [100, 105, 75]
+
+    job = queue.get(reconcile)
+    assert job["status"] == SUCCEEDED
+    assert job["result"] == {"accounts": 2, "mismatches": []}
+
+
+def test_worker_records_a_handler_error(db, queue):
+    # month_end_interest needs a year and month in its payload
+    job_id = queue.enqueue("month_end_interest", {}, max_attempts=1)
+    JobWorker(db.db_path, workers=1, poll_interval=0.05).run(until_idle=True)
+
+    job = queue.get(job_id)
+    assert job["status"] == FAILED
+    assert job["error"].startswith("KeyError")
@@ -0,0 +1,81 @@
+import sqlite3
+
+import pytest
+
+from bank_database import BankDatabase
+from legacy_import import HEADER, RECORD, export_accounts_dat, import_accounts_dat, iter_record_chunks
+
+
+def _write_accounts_dat(path, records, count=None):
+    """An accounts.dat as bank.c's saveAccounts writes it"""
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(len(records) if count is None else count))
+        for number, balance in records:
+            f.write(RECORD.pack(number.encode("ascii"), balance))
+
+
+@pytest.fixture
+def legacy_file(tmp_path):
+    path = str(tmp_path / "accounts.dat")
+    _write_accounts_dat(path, [("1001", 250.5), ("1002", 0.0), ("1003", -75.25)])
+    return path
+
+
+def _ledger(db_path, account_number):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT transaction_type, amount, balance_after FROM transactions "
+                        "WHERE account_number = ? ORDER BY id", (account_number,)).fetchall()
+    conn.close()
+    return rows
+
+
+def test_import_keeps_signed_balances(legacy_file, db_path):
+    assert import_accounts_dat(legacy_file, db_path) == (3, 0, 1)
+
+    db = BankDatabase(db_path)
+    assert [db.get_account_details(f"LEG{n}")[2] for n in ("1001", "1002", "1003")] == [250.5, 0.0, -75.25]
+    assert _ledger(db_path, "LEG1001") == [("deposit", 250.5, 250.5)]
+    assert _ledger(db_path, "LEG1002") == []
+    assert _ledger(db_path, "LEG1003") == [("withdrawal", 75.25, -75.25)]
+
+
+def test_reimport_skips_accounts_already_present(legacy_file, db_path):
+    import_accounts_dat(legacy_file, db_path)
+
+    assert import_accounts_dat(legacy_file, db_path) == (0, 3, 0)
+    assert BankDatabase(db_path).get_account_details("LEG1003")[2] == -75.25
+
+
+def test_imported_balances_match_the_event_log(legacy_file, db_path):
+    import_accounts_dat(legacy_file, db_path)
+    BankDatabase(db_path).update_projections()
+
+    conn = sqlite3.connect(db_path)
+    projected = dict(conn.execute("SELECT account_number, balance FROM projected_balances"))
+    actual = dict(conn.execute("SELECT account_number, balance FROM accounts"))
+    conn.close()
+    assert projected == actual
+
+
+def test_export_round_trips_legacy_numbers(legacy_file, db_path, tmp_path):
+    import_accounts_dat(legacy_file, db_path)
+    exported = str(tmp_path / "exported.dat")
+
+    assert export_accounts_dat(exported, db_path) == 3
+    assert [record for chunk in iter_record_chunks(exported) for record in chunk] == [
+        ("1001", 250.5), ("1002", 0.0), ("1003", -75.25)
+    ]
+
+
+def test_header_count_beyond_the_file_is_not_trusted(tmp_path):
+    path = str(tmp_path / "truncated.dat")
+    _write_accounts_dat(path, [("1001", 1.0), ("1002", 2.0)], count=100)
+
+    assert [record for chunk in iter_record_chunks(path) for record in chunk] == [("1001", 1.0), ("1002", 2.0)]
+
+
+def test_empty_file_imports_nothing(tmp_path, db_path):
+    path = tmp_path / "empty.dat"
+    path.write_bytes(b"")
+
+    assert import_accounts_dat(str(path), db_path) == (0, 0, 0)
@@ -0,0 +1,76 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+streamlit = pytest.importorskip("streamlit")
+
+from fraud_rules import DEFAULT_RULES
+from load_simulator import find_knee, percentile, provision_users, write_load_test_rules
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# AppTest's concurrent harness patches process-wide Streamlit state, so a level runs in its own interpreter
+RUN_LEVEL = """
+import json, os, sys
+import load_simulator
+db_path = sys.argv[1]
+os.environ["BANK_DB_PATH"] = db_path
+os.environ["FRAUD_RULES_PATH"] = load_simulator.write_load_test_rules(db_path)
+load_simulator._install_concurrent_harness()
+users = load_simulator.provision_users(db_path, 2)
+print(json.dumps(load_simulator.run_level(users, 2, 5, 0.1)))
+"""
+
+
+def _level(concurrency, throughput, p95_ms):
+    return {"concurrency": concurrency, "throughput": throughput, "p95_ms": p95_ms}
+
+
+def test_percentile_uses_the_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([7], 95) == 7
+    assert percentile([], 95) is None
+
+
+def test_knee_is_the_last_level_that_still_scaled():
+    levels = [_level(1, 10, 100), _level(2, 19, 110), _level(4, 36, 120), _level(8, 40, 150)]
+    assert find_knee(levels) == 4
+
+    # Latency blowing up also ends scaling, even while throughput still grows
+    levels = [_level(1, 10, 100), _level(2, 20, 100), _level(4, 40, 250)]
+    assert find_knee(levels) == 2
+    assert find_knee(levels[:2]) is None
+
+
+def test_load_test_rules_disable_only_the_velocity_rules(db_path, tmp_path):
+    path = write_load_test_rules(db_path, str(tmp_path / "missing.json"))
+    with open(path, encoding="utf-8") as f:
+        rules = json.load(f)["rules"]
+
+    assert [rule["name"] for rule in rules] == [rule["name"] for rule in DEFAULT_RULES]
+    for rule in rules:
+        assert rule.get("enabled", True) == (rule["type"] != "velocity")
+
+
+def test_provisioning_is_repeatable(db, db_path):
+    users = provision_users(db_path, 3)
+    assert provision_users(db_path, 3) == users
+    for _, account_number in users:
+        assert db.get_account_details(account_number)[2] == 1_000_000
+
+
+@pytest.mark.skipif(tuple(int(part) for part in streamlit.__version__.split(".")[:2]) < (1, 37),
+                    reason="the AppTest harness targets the Streamlit version in requirements.txt")
+def test_virtual_users_complete_their_cycles(tmp_path):
+    result = subprocess.run([sys.executable, "-c", RUN_LEVEL, str(tmp_path / "loadtest.db")],
+                            cwd=str(tmp_path), env=dict(os.environ, PYTHONPATH=REPO_ROOT),
+                            capture_output=True, text=True, timeout=300, check=True)
+    level = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert level["session_errors"] == []
+    assert level["failures"] == []
+    assert {"login", "deposit", "transfer"} <= set(level["pages"])
@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+
+import metrics
+
+SLOW_CALL = "import metrics, time\nwith metrics.timed('test_slow_seconds'):\n    time.sleep(0.05)\n"
+
+
+def _run_slow_call(**env):
+    environment = {key: value for key, value in os.environ.items() if key != "BANK_SLOW_MS"}
+    environment.update(env)
+    return subprocess.run([sys.executable, "-c", SLOW_CALL], env=environment, capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), check=True)
+
+
+def test_counters_and_histograms_render_in_prometheus_format():
+    metrics.inc("test_events_total", kind="a")
+    metrics.inc("test_events_total", 2, kind="a")
+    metrics.observe("test_latency_seconds", 0.003)
+
+    text = metrics.render_prometheus()
+
+    assert "# TYPE test_events_total counter" in text
+    assert 'test_events_total{kind="a"} 3' in text
+    assert 'test_latency_seconds_bucket{le="0.0025"} 0' in text
+    assert 'test_latency_seconds_bucket{le="0.005"} 1' in text
+    assert "test_latency_seconds_count 1" in text
+
+
+def test_database_methods_are_timed_per_method(db, make_account):
+    account = make_account(0)
+    db.deposit(account, 10)
+
+    assert 'bank_db_call_seconds_count{method="deposit"}' in metrics.render_prometheus()
+
+
+def test_textfile_is_replaced_whole(tmp_path):
+    path = str(tmp_path / "bank.prom")
+    metrics.inc("test_textfile_total")
+
+    metrics.write_textfile(path)
+
+    assert "test_textfile_total 1" in open(path, encoding="utf-8").read()
+    assert not os.path.exists(f"{path}.tmp")
+
+
+def test_slow_call_log_is_off_unless_asked_for():
+    assert _run_slow_call().stderr == ""
+    assert "slow call test_slow_seconds" in _run_slow_call(BANK_SLOW_MS="1").stderr
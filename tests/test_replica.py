@@ -0,0 +1,96 @@
+import glob
+import os
+import time
+
+import pytest
+
+from replica import ORPHAN_SNAPSHOT_SECONDS, ReplicaManager
+
+
+@pytest.fixture
+def replica(db, db_path):
+    manager = ReplicaManager(db_path, max_staleness=60)
+    yield manager
+    manager.stop()
+
+
+def _snapshots(db_path):
+    base, _ = os.path.splitext(db_path)
+    return sorted(glob.glob(f"{base}.replica-*.db"))
+
+
+def _count(conn, account_number):
+    return conn.execute("SELECT COUNT(*) FROM transactions WHERE account_number = ?", (account_number,)).fetchone()[0]
+
+
+def test_snapshot_reads_see_the_primary_as_of_the_refresh(db, replica, make_account):
+    account = make_account(100)
+    replica.refresh()
+    db.deposit(account, 5)
+
+    conn = replica.connect()
+    assert _count(conn, account) == 1
+    conn.close()
+
+    replica.refresh()
+    conn = replica.connect()
+    assert _count(conn, account) == 2
+    conn.close()
+
+
+def test_long_reader_keeps_its_snapshot_across_refreshes(db, db_path, replica, make_account):
+    account = make_account(100)
+    replica.refresh()
+    report = replica.connect()
+    report.execute("BEGIN")
+    first_snapshot = replica.current_path
+
+    db.deposit(account, 5)
+    assert replica.refresh() and replica.refresh()
+
+    # The refreshes moved on; the report still reads its own file
+    assert replica.current_path != first_snapshot
+    assert _count(report, account) == 1
+    assert len(_snapshots(db_path)) == 2
+
+    report.close()
+    assert _snapshots(db_path) == [replica.current_path]
+
+
+def test_stale_snapshot_falls_back_to_the_primary(db, replica, make_account):
+    account = make_account(100)
+    replica.refresh()
+    db.deposit(account, 5)
+    replica.refreshed_at -= 120
+
+    conn = replica.connect()
+    assert _count(conn, account) == 2
+    conn.close()
+    # A caller that accepts older data still gets the snapshot
+    conn = replica.connect(max_staleness=300)
+    assert _count(conn, account) == 1
+    conn.close()
+
+
+def test_orphaned_snapshots_are_removed(db, db_path):
+    base, _ = os.path.splitext(db_path)
+    old, recent = f"{base}.replica-1-3.db", f"{base}.replica-2-5.db"
+    for path in (old, recent):
+        open(path, "wb").close()
+    stale = time.time() - ORPHAN_SNAPSHOT_SECONDS - 60
+    os.utime(old, (stale, stale))
+
+    ReplicaManager(db_path)
+
+    assert _snapshots(db_path) == [recent]
+
+
+def test_snapshot_reads_through_the_database(db, db_path, make_account):
+    account = make_account(100)
+    db.replica = ReplicaManager(db_path)
+    db.replica.refresh()
+    db.deposit(account, 5)
+
+    assert len(db.search_transactions([account], snapshot=True)) == 1
+    assert len(db.search_transactions([account], snapshot=False)) == 2
+    assert _snapshots(db_path) == [db.replica.current_path]
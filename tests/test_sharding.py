@@ -0,0 +1,135 @@
+import sqlite3
+
+import pytest
+
+from sharding import ShardedBankDatabase, shard_index
+
+
+def _accounts_on_two_shards(sharded, make_account, source_balance=1000):
+    source = make_account(source_balance, bank=sharded)
+    while True:
+        destination = make_account(0, bank=sharded)
+        if sharded.shard_for(destination) is not sharded.shard_for(source):
+            return source, destination
+
+
+def _statuses(sharded):
+    conn = sqlite3.connect(sharded.db_path)
+    statuses = [row[0] for row in conn.execute("SELECT status FROM shard_transfers ORDER BY rowid")]
+    conn.close()
+    return statuses
+
+
+def _crash_on_commit(monkeypatch, shard):
+    """The process dies when `shard` commits, and recovery does not run until the next start"""
+    def crash(conn):
+        raise RuntimeError("crashed during commit")
+    monkeypatch.setattr(shard, "_commit", crash)
+    monkeypatch.setattr(ShardedBankDatabase, "recover", lambda self: 0)
+
+
+def _balance(bank, account_number):
+    return bank.get_account_details(account_number)[2]
+
+
+def test_accounts_live_on_the_shard_their_number_routes_to(sharded, make_account, db):
+    accounts = [make_account(10, bank=sharded) for _ in range(6)]
+    for account in accounts:
+        shard = sharded.shards[shard_index(account, len(sharded.shards))]
+        assert shard.get_account_details(account)[2] == 10
+    _, user_id = db.authenticate_user("tester", "secret-pass")
+    assert sorted(account[0] for account in sharded.get_user_accounts(user_id)) == sorted(accounts)
+
+    with pytest.raises(ValueError):
+        ShardedBankDatabase(sharded.db_path, shard_count=3)
+
+
+def test_cross_shard_transfer_commits_on_both_shards(sharded, make_account):
+    source, destination = _accounts_on_two_shards(sharded, make_account)
+
+    ok, _ = sharded.transfer_money(source, destination, 300)
+    assert ok
+    assert (_balance(sharded, source), _balance(sharded, destination)) == (700, 300)
+    assert _statuses(sharded) == ["done"]
+
+    ok, message = sharded.transfer_money(source, destination, 5000)
+    assert not ok and "Insufficient" in message
+    ok, message = sharded.transfer_money(source, "ACC000000000", 5)
+    assert not ok and "not found" in message
+    assert (_balance(sharded, source), _balance(sharded, destination)) == (700, 300)
+    assert _statuses(sharded) == ["done"]
+
+
+def test_cross_shard_transfer_replays_its_idempotency_key(sharded, make_account):
+    source, destination = _accounts_on_two_shards(sharded, make_account)
+
+    first = sharded.transfer_money(source, destination, 100, idempotency_key="pay-1")
+    assert sharded.transfer_money(source, destination, 100, idempotency_key="pay-1") == first
+    assert (_balance(sharded, source), _balance(sharded, destination)) == (900, 100)
+
+    ok, message = sharded.transfer_money(source, destination, 999, idempotency_key="pay-1")
+    assert not ok and "conflict" in message
+
+
+def test_credit_lost_after_the_decision_is_redone_on_restart(sharded, make_account, monkeypatch):
+    source, destination = _accounts_on_two_shards(sharded, make_account)
+    _crash_on_commit(monkeypatch, sharded.shard_for(destination))
+    assert not sharded.transfer_money(source, destination, 300)[0]
+    monkeypatch.undo()
+    assert (_balance(sharded, source), _balance(sharded, destination)) == (700, 0)
+
+    restarted = ShardedBankDatabase(sharded.db_path)
+    assert (_balance(restarted, source), _balance(restarted, destination)) == (700, 300)
+    assert _statuses(restarted) == ["done"]
+    assert restarted.recover() == 0
+
+
+def test_lost_debit_is_redone_when_the_source_can_still_pay(sharded, make_account, monkeypatch):
+    source, destination = _accounts_on_two_shards(sharded, make_account)
+    _crash_on_commit(monkeypatch, sharded.shard_for(source))
+    assert not sharded.transfer_money(source, destination, 300)[0]
+    monkeypatch.undo()
+    assert (_balance(sharded, source), _balance(sharded, destination)) == (1000, 0)
+
+    restarted = ShardedBankDatabase(sharded.db_path)
+    assert (_balance(restarted, source), _balance(restarted, destination)) == (700, 300)
+    assert _statuses(restarted) == ["done"]
+
+
+def test_lost_debit_is_aborted_when_the_source_spent_the_money(sharded, make_account, monkeypatch):
+    source, destination = _accounts_on_two_shards(sharded, make_account)
+    _crash_on_commit(monkeypatch, sharded.shard_for(source))
+    assert not sharded.transfer_money(source, destination, 300)[0]
+    monkeypatch.undo()
+    assert sharded.withdraw(source, 800)[0]
+
+    restarted = ShardedBankDatabase(sharded.db_path)
+    assert (_balance(restarted, source), _balance(restarted, destination)) == (200, 0)
+    assert _statuses(restarted) == ["aborted"]
+
+
+def test_credit_to_a_vanished_account_is_refunded(sharded, make_account, monkeypatch):
+    source, destination = _accounts_on_two_shards(sharded, make_account)
+    destination_shard = sharded.shard_for(destination)
+    _crash_on_commit(monkeypatch, destination_shard)
+    assert not sharded.transfer_money(source, destination, 300)[0]
+    monkeypatch.undo()
+
+    conn = sqlite3.connect(destination_shard.db_path)
+    conn.execute("DELETE FROM accounts WHERE account_number = ?", (destination,))
+    conn.commit()
+    conn.close()
+
+    restarted = ShardedBankDatabase(sharded.db_path)
+    assert _balance(restarted, source) == 1000
+    assert _statuses(restarted) == ["refunded"]
+    assert restarted.recover() == 0
+
+
+def test_bulk_credit_posts_to_the_owning_shards(sharded, make_account):
+    accounts = []
+    while len(accounts) < 4 or len({shard_index(account, len(sharded.shards)) for account in accounts}) < 2:
+        accounts.append(make_account(0, bank=sharded))
+
+    sharded.bulk_credit([(account, 10 + index) for index, account in enumerate(accounts)], "Interest credit")
+    assert [_balance(sharded, account) for account in accounts] == [10 + index for index in range(len(accounts))]
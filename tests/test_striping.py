@@ -0,0 +1,131 @@
+import sqlite3
+
+from sharding import ShardedBankDatabase
+from striping import stripe_paths
+
+
+def _stripe_credit_count(db_path):
+    total = 0
+    for path in stripe_paths(db_path):
+        try:
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        except sqlite3.OperationalError:
+            continue
+        total += conn.execute("SELECT COUNT(*) FROM stripe_credits").fetchone()[0]
+        conn.close()
+    return total
+
+
+def _ledger_total(db_path, account_number):
+    conn = sqlite3.connect(db_path)
+    total = conn.execute("SELECT COUNT(*), SUM(amount) FROM transactions WHERE account_number = ?",
+                         (account_number,)).fetchone()
+    conn.close()
+    return total
+
+
+def test_striped_deposits_count_before_and_after_a_sweep(db, db_path, make_account, balance):
+    account = make_account(100)
+    assert db.enable_striping(account, 4)[0]
+
+    for key in range(8):
+        assert db.deposit(account, 10, idempotency_key=f"d{key}")[0]
+
+    assert balance(account) == 180
+    assert _stripe_credit_count(db_path) == 8
+    assert db.sweep_stripes(account) == 8
+    assert _stripe_credit_count(db_path) == 0
+    assert balance(account) == 180
+    assert _ledger_total(db_path, account) == (9, 180)
+
+
+def test_sweep_cut_short_between_files_is_finished_without_double_posting(db, db_path, make_account, balance):
+    account = make_account(0)
+    db.enable_striping(account, 1)
+    db.deposit(account, 25)
+    # Keep the stripe as it was before the sweep, as if its commit had been lost
+    stripe_path = stripe_paths(db_path)[0]
+    saved = sqlite3.connect(":memory:")
+    sqlite3.connect(stripe_path).backup(saved)
+
+    assert db.sweep_stripes(account) == 1
+    stripe = sqlite3.connect(stripe_path)
+    saved.backup(stripe)
+    stripe.close()
+
+    assert db.sweep_stripes(account) == 0
+    assert _stripe_credit_count(db_path) == 0
+    assert balance(account) == 25
+    assert _ledger_total(db_path, account) == (1, 25)
+
+
+def test_withdrawal_sweeps_first_and_cannot_overdraw(db, make_account, balance):
+    account = make_account(0)
+    db.enable_striping(account, 2)
+    db.deposit(account, 30)
+
+    assert db.withdraw(account, 20)[0]
+    assert not db.withdraw(account, 20)[0]
+    assert balance(account) == 10
+
+
+def _accounts_on_two_shards(sharded, make_account):
+    source = make_account(1000, bank=sharded)
+    while True:
+        destination = make_account(0, bank=sharded)
+        if sharded.shard_for(destination) is not sharded.shard_for(source):
+            return source, destination
+
+
+def test_cross_shard_transfer_into_a_striped_account(sharded, make_account):
+    source, destination = _accounts_on_two_shards(sharded, make_account)
+    sharded.enable_striping(destination, 2)
+
+    ok, _ = sharded.transfer_money(source, destination, 300)
+
+    assert ok
+    assert sharded.get_account_details(source)[2] == 700
+    assert sharded.get_account_details(destination)[2] == 300
+    assert sharded.sweep_stripes(destination) == 1
+    assert sharded.get_account_details(destination)[2] == 300
+
+
+def test_striped_credit_lost_after_the_decision_is_redone_by_recovery(sharded, make_account, monkeypatch):
+    source, destination = _accounts_on_two_shards(sharded, make_account)
+    sharded.enable_striping(destination, 2)
+    destination_shard = sharded.shard_for(destination)
+
+    # The process dies after the source committed and before the stripe did
+    def crash(conn):
+        raise RuntimeError("crashed before the stripe commit")
+    monkeypatch.setattr(destination_shard, "_commit", crash)
+    monkeypatch.setattr(ShardedBankDatabase, "recover", lambda self: 0)
+    assert not sharded.transfer_money(source, destination, 300)[0]
+    monkeypatch.undo()
+
+    assert sharded.get_account_details(source)[2] == 700
+    assert sharded.get_account_details(destination)[2] == 0
+
+    # Opening the database again runs recovery
+    restarted = ShardedBankDatabase(sharded.db_path)
+    assert restarted.get_account_details(destination)[2] == 300
+    assert restarted.recover() == 0
+    restarted.sweep_stripes(destination)
+    assert restarted.get_account_details(destination)[2] == 300
+    assert restarted.get_account_details(source)[2] == 700
+
+
+def test_striped_transfer_failing_before_the_decision_moves_nothing(sharded, make_account, monkeypatch):
+    source, destination = _accounts_on_two_shards(sharded, make_account)
+    sharded.enable_striping(destination, 2)
+
+    def crash(*args):
+        raise RuntimeError("crashed before the decision")
+    monkeypatch.setattr(sharded, "_log_decision", crash)
+
+    ok, message = sharded.transfer_money(source, destination, 300)
+
+    assert not ok and "crashed" in message
+    assert sharded.get_account_details(source)[2] == 1000
+    assert sharded.get_account_details(destination)[2] == 0
+    assert _stripe_credit_count(sharded.shard_for(destination).db_path) == 0